@@ -0,0 +1,154 @@
+"""
+Benchmark of the MiniLM embedding backends on the real model.
+
+Unlike ``benchmarks.run``, the model is not faked: the PyTorch model, the
+ONNX model and its int8 version are timed on the same texts. Reports the
+throughput of ingestion-sized batches, the latency of single queries and the
+parity of the ONNX vectors with the PyTorch ones.
+
+Usage, from the repository root:
+
+    python -m benchmarks.embeddings --onnx-dir path/to/onnx_models
+"""
+
+import argparse
+import sys
+
+from .fakes import make_words
+from .harness import measure
+from .harness import save_results
+
+
+def parse_args(argv=None):
+    """
+    Parse the command line.
+
+    Args:
+        argv (list): The arguments, defaults to ``sys.argv``.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--onnx-dir", required=True, help="Exported ONNX models.")
+    parser.add_argument("--output", default="benchmarks/results/embeddings.json")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument(
+        "--backends", nargs="*", default=["torch", "onnx-fp32", "onnx-int8"]
+    )
+    parser.add_argument("--batch-texts", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument(
+        "--words-per-text",
+        type=int,
+        default=90,
+        help="About the size of a 500 characters ingestion chunk.",
+    )
+    parser.add_argument("--queries", type=int, default=50)
+    return parser.parse_args(argv)
+
+
+def load_backend(name, args):
+    """
+    Load an embeddings backend.
+
+    Args:
+        name (str): "torch", "onnx-fp32" or "onnx-int8".
+        args (argparse.Namespace): The benchmark settings.
+
+    Returns:
+        Embeddings: The embeddings model, without cache.
+    """
+    from chat_mcq.utils.opensource_utils import download_hugging_face_embeddings
+
+    if name == "torch":
+        return download_hugging_face_embeddings()
+
+    return download_hugging_face_embeddings(
+        backend="onnx",
+        onnx_dir=args.onnx_dir,
+        quantize=name == "onnx-int8",
+        batch_size=args.batch_size,
+    )
+
+
+def main(argv=None):
+    """
+    Time every backend and check the parity of the ONNX ones.
+
+    Args:
+        argv (list): The command line arguments.
+
+    Returns:
+        int: 1 if an ONNX backend doesn't match the PyTorch vectors, else 0.
+    """
+    from chat_mcq.utils.onnx_embeddings import parity_check
+
+    args = parse_args(argv)
+    settings = {
+        key: value
+        for key, value in vars(args).items()
+        if key not in ("output", "onnx_dir")
+    }
+
+    # Chunks of varied lengths, like the ones of a PDF, and short queries.
+    chunks = [
+        make_words(args.words_per_text // 2 + seed % args.words_per_text, seed)
+        for seed in range(args.batch_texts)
+    ]
+    queries = [make_words(12, seed) + "?" for seed in range(args.queries)]
+
+    results = {}
+    reference = None
+    failed = []
+    for name in args.backends:
+        embeddings = load_backend(name, args)
+
+        batch = measure(
+            lambda: embeddings.embed_documents(chunks),
+            repeat=args.repeat,
+            warmup=args.warmup,
+        )
+        batch["texts_per_second"] = len(chunks) / batch["median"]
+        results[f"{name}_batch"] = batch
+
+        query = measure(
+            lambda: [embeddings.embed_query(text) for text in queries],
+            repeat=args.repeat,
+            warmup=args.warmup,
+        )
+        query["median_per_query"] = query["median"] / len(queries)
+        results[f"{name}_query"] = query
+
+        print(
+            f"{name}: {batch['texts_per_second']:.1f} chunks/s, "
+            f"{query['median_per_query'] * 1000:.2f} ms per query",
+            flush=True,
+        )
+
+        if name == "torch":
+            reference = embeddings
+        elif reference is not None:
+            parity = parity_check(embeddings, reference, chunks[:64] + queries)
+            results[f"{name}_parity"] = parity
+            print(
+                f"{name} parity: min cosine {parity['min_cosine']:.5f}, "
+                f"max abs diff {parity['max_abs_diff']:.5f}",
+                flush=True,
+            )
+            if not parity["ok"]:
+                failed.append(name)
+
+    save_results(args.output, results, settings)
+    print(f"Results saved to {args.output}")
+
+    if failed:
+        print(f"Vectors don't match PyTorch: {', '.join(failed)}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
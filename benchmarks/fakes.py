@@ -0,0 +1,250 @@
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.language_models.llms import LLM
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration
+from langchain_core.outputs import ChatResult
+
+from chat_mcq.vectorstores.local_store import LocalVectorStore
+
+# Finds the requested number of questions in the quiz generation prompt
+QUIZ_COUNT_PATTERN = re.compile(r"quiz\s+of\s+(\d+)\s+multiple choice")
+
+# Vocabulary of the generated texts
+WORDS = (
+    "energy matter force motion atom cell gene protein river mountain climate "
+    "history empire trade market number equation function graph language poem"
+).split()
+
+
+def make_words(count, seed=0):
+    """
+    Build a deterministic text of ``count`` words.
+
+    Args:
+        count (int): The number of words.
+        seed (int): Changes the word sequence.
+
+    Returns:
+        str: The words separated by spaces.
+    """
+    return " ".join(WORDS[(seed * 7 + i * 13) % len(WORDS)] for i in range(count))
+
+
+def make_quiz(count, question_words=12):
+    """
+    Build a quiz in the ``response.json`` format.
+
+    Args:
+        count (int): The number of questions.
+        question_words (int): The number of words of every question.
+
+    Returns:
+        dict: The questions by their key.
+    """
+    return {
+        str(number): {
+            "mcq": f"{make_words(question_words, number)} {number}?",
+            "options": {key: make_words(3, number + i) for i, key in enumerate("abcd")},
+            "correct": "abcd"[number % 4],
+        }
+        for number in range(1, count + 1)
+    }
+
+
+def make_pdf(pages, words_per_page=400):
+    """
+    Build a text PDF in memory, with one Helvetica text stream per page.
+
+    Args:
+        pages (int): The number of pages.
+        words_per_page (int): The number of words on every page.
+
+    Returns:
+        bytes: The PDF file.
+    """
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+
+    page_ids = []
+    for page in range(pages):
+        words = make_words(words_per_page, page).split()
+        lines = [" ".join(words[i : i + 12]) for i in range(0, len(words), 12)]
+        text = "".join(f"({line}) Tj T* " for line in lines)
+        stream = f"BT /F1 9 Tf 11 TL 40 800 Td {text}ET".encode("latin-1")
+
+        objects.append(
+            b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        )
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        pdf += b"%010d 00000 n \n" % offset
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        xref,
+    )
+    return bytes(pdf)
+
+
+class FakeChatOpenAI(BaseChatModel):
+    """
+    Stand-in for ``ChatOpenAI`` answering the MCQ prompts without the API.
+
+    The quiz prompt gets a valid quiz with the requested number of questions,
+    any other prompt a review of ``review_words`` words. Every call waits
+    ``latency`` seconds plus ``seconds_per_token`` per generated word, and
+    reports a word count based token usage so the cost callback works.
+    """
+
+    latency: float = 0.0
+    seconds_per_token: float = 0.0
+    question_words: int = 12
+    review_words: int = 50
+    model_name: str = "gpt-4o"
+
+    @property
+    def _llm_type(self):
+        return "fake-chat-openai"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        text, delay = self._respond(messages)
+        time.sleep(delay)
+        return self._result(messages, text)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        text, delay = self._respond(messages)
+        await asyncio.sleep(delay)
+        return self._result(messages, text)
+
+    def _respond(self, messages):
+        """Build the answer to the prompt and the time it takes to generate."""
+        prompt = "\n".join(str(message.content) for message in messages)
+        match = QUIZ_COUNT_PATTERN.search(prompt)
+        if match:
+            text = json.dumps(make_quiz(int(match.group(1)), self.question_words))
+        else:
+            text = make_words(self.review_words)
+
+        return text, self.latency + self.seconds_per_token * len(text.split())
+
+    def _result(self, messages, text):
+        prompt_tokens = sum(len(str(message.content).split()) for message in messages)
+        completion_tokens = len(text.split())
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=text))],
+            llm_output={
+                "token_usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+                "model_name": self.model_name,
+            },
+        )
+
+
+class FakeLlama(LLM):
+    """
+    Stand-in for the ``CTransformers`` llama model.
+
+    Generates ``answer_tokens`` tokens, waiting ``seconds_per_token`` before
+    each one and reporting it to the callbacks like a streaming model.
+    """
+
+    seconds_per_token: float = 0.0
+    answer_tokens: int = 64
+
+    @property
+    def _llm_type(self):
+        return "fake-llama"
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        tokens = []
+        for i in range(self.answer_tokens):
+            time.sleep(self.seconds_per_token)
+            token = WORDS[i % len(WORDS)] + " "
+            if run_manager:
+                run_manager.on_llm_new_token(token)
+            tokens.append(token)
+
+        return "".join(tokens)
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Stand-in for the MiniLM embeddings.
+
+    Every text gets a deterministic unit vector seeded by its hash. A call
+    waits ``seconds_per_call`` plus ``seconds_per_text`` per text, and the
+    calls run one at a time like forward passes sharing one model.
+    """
+
+    def __init__(self, dim=384, seconds_per_text=0.0, seconds_per_call=0.0):
+        self.dim = dim
+        self.seconds_per_text = seconds_per_text
+        self.seconds_per_call = seconds_per_call
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            time.sleep(self.seconds_per_call + self.seconds_per_text * len(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    def _vector(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+        vector = np.random.default_rng(seed).standard_normal(self.dim)
+        return (vector / np.linalg.norm(vector)).astype(np.float32).tolist()
+
+
+class FakePineconeStore(LocalVectorStore):
+    """
+    Stand-in for the Pinecone index: the local store plus a network round trip.
+
+    Every query and upsert waits ``round_trip`` seconds before running
+    against the in-process store.
+    """
+
+    def __init__(self, embedding, round_trip=0.0, **kwargs):
+        super().__init__(embedding, **kwargs)
+        self.round_trip = round_trip
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        time.sleep(self.round_trip)
+        return super().add_texts(texts, metadatas=metadatas, ids=ids, **kwargs)
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None):
+        time.sleep(self.round_trip)
+        return super().similarity_search_with_score_by_vector(
+            embedding, k=k, filter=filter
+        )
@@ -0,0 +1,177 @@
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime
+
+
+def summarize(samples):
+    """
+    Summarize the durations of the runs of a benchmark.
+
+    Args:
+        samples (list): The duration in seconds of every run.
+
+    Returns:
+        dict: The run count and the min, mean, median, p95, max and standard
+            deviation in seconds.
+    """
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {
+        "runs": len(samples),
+        "min": ordered[0],
+        "mean": statistics.fmean(samples),
+        "median": statistics.median(samples),
+        "p95": p95,
+        "max": ordered[-1],
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+    }
+
+
+def measure(fn, repeat=5, warmup=1):
+    """
+    Time the function over several runs.
+
+    The garbage collector is disabled while a run is timed, so a collection
+    triggered by an earlier run doesn't land on a later one.
+
+    Args:
+        fn (Callable): The function to benchmark, called without arguments.
+        repeat (int): The number of timed runs.
+        warmup (int): The number of untimed runs before.
+
+    Returns:
+        dict: The summary of the timed runs, see ``summarize``.
+    """
+    for _ in range(warmup):
+        fn()
+
+    samples = []
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - start)
+        finally:
+            gc.enable()
+
+    return summarize(samples)
+
+
+def environment():
+    """
+    Describe the machine and the code the benchmarks ran on.
+
+    Returns:
+        dict: The Python version, platform, CPU count, git commit and time.
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "commit": commit,
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+    }
+
+
+def save_results(path, results, settings):
+    """
+    Write the benchmark results as JSON.
+
+    Args:
+        path (str): The output file.
+        results (dict): The summary of every benchmark by name.
+        settings (dict): The fake latencies and sizes the benchmarks used.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    with open(path, "w") as file:
+        json.dump(
+            {"environment": environment(), "settings": settings, "results": results},
+            file,
+            indent=2,
+        )
+
+
+def load_results(path):
+    """
+    Read the benchmark results saved by ``save_results``.
+
+    Args:
+        path (str): The results file.
+
+    Returns:
+        dict: The environment, settings and results of the run.
+    """
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+def compare(results, baseline, threshold=0.1):
+    """
+    Compare the median of every benchmark with the baseline run.
+
+    Args:
+        results (dict): The summaries of the current run.
+        baseline (dict): The summaries of the baseline run.
+        threshold (float): Relative slowdown of the median counted as a
+            regression, 0.1 is 10%.
+
+    Returns:
+        tuple: One row per benchmark (name, baseline median, current median,
+            relative change), and the names of the regressed benchmarks.
+    """
+    rows = []
+    regressions = []
+    for name, summary in results.items():
+        base = baseline.get(name)
+        if base is None:
+            rows.append((name, None, summary["median"], None))
+            continue
+
+        change = (summary["median"] - base["median"]) / base["median"]
+        rows.append((name, base["median"], summary["median"], change))
+        if change > threshold:
+            regressions.append(name)
+
+    return rows, regressions
+
+
+def format_table(rows):
+    """
+    Render the comparison rows as a text table.
+
+    Args:
+        rows (list): The rows returned by ``compare``.
+
+    Returns:
+        str: The table, durations in milliseconds.
+    """
+
+    def ms(value):
+        return "-" if value is None else f"{value * 1000:.3f}"
+
+    width = max([len(row[0]) for row in rows] + [9])
+    lines = [f"{'benchmark':<{width}}  {'baseline ms':>12}  {'current ms':>12}  change"]
+    for name, base, current, change in rows:
+        delta = "new" if change is None else f"{change:+.1%}"
+        lines.append(f"{name:<{width}}  {ms(base):>12}  {ms(current):>12}  {delta}")
+
+    return "\n".join(lines)
@@ -0,0 +1,340 @@
+"""
+Offline benchmarks of the MCQ generation and chat pipelines.
+
+OpenAI, the llama model, the MiniLM embeddings and Pinecone are replaced by
+the deterministic fakes of ``benchmarks.fakes``, with configurable latency
+and output size, so the runs cost nothing and only measure this project's
+code plus the simulated waits.
+
+Usage, from the repository root:
+
+    python -m benchmarks.run --output benchmarks/results/latest.json
+    python -m benchmarks.run --baseline benchmarks/results/baseline.json
+"""
+
+import argparse
+import io
+import itertools
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.documents import Document
+from werkzeug.datastructures import FileStorage
+
+from .fakes import FakeChatOpenAI
+from .fakes import FakeEmbeddings
+from .fakes import FakeLlama
+from .fakes import FakePineconeStore
+from .fakes import make_pdf
+from .fakes import make_quiz
+from .fakes import make_words
+from .harness import compare
+from .harness import format_table
+from .harness import load_results
+from .harness import measure
+from .harness import save_results
+
+# Directory of response.json, the example quiz given to the LLM
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "chat_mcq", "data")
+
+
+def parse_args(argv=None):
+    """
+    Parse the command line.
+
+    Args:
+        argv (list): The arguments, defaults to ``sys.argv``.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--output", default="benchmarks/results/latest.json")
+    parser.add_argument("--baseline", help="Results file to compare against.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Median slowdown over the baseline counted as a regression.",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument(
+        "--only", nargs="*", help="Run the benchmarks containing these names."
+    )
+    parser.add_argument("--openai-latency", type=float, default=0.0)
+    parser.add_argument("--openai-seconds-per-token", type=float, default=0.0)
+    parser.add_argument("--llama-seconds-per-token", type=float, default=0.0)
+    parser.add_argument("--answer-tokens", type=int, default=64)
+    parser.add_argument("--embedding-seconds-per-text", type=float, default=0.0)
+    parser.add_argument("--embedding-seconds-per-call", type=float, default=0.0)
+    parser.add_argument(
+        "--burst", type=int, default=32, help="Concurrent queries of the burst."
+    )
+    parser.add_argument(
+        "--retrieval-batching",
+        action="store_true",
+        help="Batch the retrievals of the chat routes, like RETRIEVAL_BATCHING=true.",
+    )
+    parser.add_argument("--pinecone-round-trip", type=float, default=0.0)
+    parser.add_argument("--pdf-pages", type=int, default=20)
+    parser.add_argument("--words-per-page", type=int, default=400)
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--mcq-count", type=int, default=10)
+    return parser.parse_args(argv)
+
+
+def build_app(args, workdir, embeddings, docsearch):
+    """
+    Create the Flask app wired to the fakes.
+
+    Args:
+        args (argparse.Namespace): The benchmark settings.
+        workdir (str): Scratch directory for the database and uploads.
+        embeddings (Embeddings): The embeddings of the chat engine.
+        docsearch (VectorStore): The vector store of the chat engine.
+
+    Returns:
+        Flask: The application.
+    """
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+    from chat_mcq import config
+    from chat_mcq.model.llama_model import llama_qa
+    from chat_mcq.model.openai_model import mcq_generator
+
+    # Point the configuration at the scratch directory.
+    uploads = os.path.join(workdir, "uploads")
+    os.makedirs(uploads, exist_ok=True)
+    config.SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(workdir, 'mcqs.db')}"
+    config.UPLOAD_FOLDER = uploads
+    config.DATA_DIR = DATA_DIR
+    config.QA_PRELOAD = False
+    config.MCQ_CHUNK_TOKENS = None
+    config.EMBEDDING_CACHE_PATH = None
+    config.INGEST_MANIFEST_PATH = os.path.join(workdir, "manifest.json")
+    config.RETRIEVAL_BATCHING = args.retrieval_batching
+    config.ANSWER_CACHE_ENABLED = True
+
+    # Swap the OpenAI model, the llama model, the embeddings and the index.
+    chat_model = FakeChatOpenAI(
+        latency=args.openai_latency,
+        seconds_per_token=args.openai_seconds_per_token,
+        model_name=mcq_generator.OPENAI_MODEL_NAME,
+    )
+    for chain in (mcq_generator.quiz_chain, mcq_generator.review_chain):
+        chain.llm = chat_model
+        chain.verbose = False
+
+    llama_qa.get_llm = lambda: FakeLlama(
+        seconds_per_token=args.llama_seconds_per_token,
+        answer_tokens=args.answer_tokens,
+    )
+    llama_qa.get_embeddings = lambda: embeddings
+    llama_qa.get_docsearch = lambda _: docsearch
+
+    from chat_mcq.factory import create_app
+
+    return create_app()
+
+
+def benchmarks(args, workdir):
+    """
+    Build every benchmark.
+
+    Args:
+        args (argparse.Namespace): The benchmark settings.
+        workdir (str): Scratch directory for the database and uploads.
+
+    Returns:
+        dict: The function to time by benchmark name.
+    """
+    from chat_mcq.model.llama_model.batching import BatchingRetriever
+    from chat_mcq.model.llama_model.batching import RetrievalBatcher
+    from chat_mcq.utils.embedding_cache import CachedEmbeddings
+    from chat_mcq.utils.opensource_utils import text_split
+    from chat_mcq.utils.pdf_utils import iter_page_texts
+    from chat_mcq.vectorstores.local_store import LocalVectorStore
+
+    pdf = make_pdf(args.pdf_pages, args.words_per_page)
+    text = make_words(args.pdf_pages * args.words_per_page)
+    pages = [
+        Document(page_content=page, metadata={"source": "doc.pdf", "page": number})
+        for number, page in enumerate(iter_page_texts(io.BytesIO(pdf)))
+    ]
+    corpus = [make_words(80, seed) + f" {seed}" for seed in range(args.chunks)]
+
+    def embeddings_model():
+        return FakeEmbeddings(
+            seconds_per_text=args.embedding_seconds_per_text,
+            seconds_per_call=args.embedding_seconds_per_call,
+        )
+
+    warm_embeddings = CachedEmbeddings(embeddings_model(), "fake-minilm")
+    warm_embeddings.embed_documents(corpus[:1000])
+
+    local_store = LocalVectorStore.from_texts(corpus, embeddings_model())
+    pinecone_store = FakePineconeStore.from_texts(
+        corpus, embeddings_model(), round_trip=args.pinecone_round_trip
+    )
+
+    # Concurrent chat queries, searched one by one or through the batcher.
+    burst_pool = ThreadPoolExecutor(max_workers=args.burst)
+    burst_retriever = BatchingRetriever(
+        batcher=RetrievalBatcher(
+            local_store.embeddings, local_store, k=2, max_batch_size=args.burst
+        )
+    )
+    bursts = itertools.count()
+
+    def burst(retrieve):
+        def run():
+            offset = next(bursts) * args.burst
+            queries = [f"burst question {offset + i}" for i in range(args.burst)]
+            list(burst_pool.map(retrieve, queries))
+
+        return run
+
+    app = build_app(
+        args,
+        workdir,
+        CachedEmbeddings(embeddings_model(), "fake-minilm"),
+        pinecone_store,
+    )
+    client = app.test_client()
+
+    from chat_mcq.persistence import save_mcqs
+    from chat_mcq.utils.openai_utils import generate_mcqs
+    from chat_mcq.utils.openai_utils import read_file
+
+    with app.app_context():
+        quiz = make_quiz(args.mcq_count)
+        mcq_id = save_mcqs({"data": quiz, "review": "review"}, "science", "simple").id
+
+    def upload(data, filename):
+        return FileStorage(stream=io.BytesIO(data), filename=filename)
+
+    def generate():
+        with app.app_context():
+            generate_mcqs(
+                upload(text.encode(), "doc.txt"),
+                args.mcq_count,
+                "science",
+                "simple",
+                chunked=False,
+            )
+
+    def post_generate(force):
+        def run():
+            client.post(
+                "/generate_mcqs",
+                data={
+                    "file": (io.BytesIO(text.encode()), "doc.txt"),
+                    "num_mcqs": str(args.mcq_count),
+                    "subject": "science",
+                    "complexity": "simple",
+                    "force": "true" if force else "false",
+                },
+            )
+
+        return run
+
+    questions = (
+        f"question {number} about {corpus[number % len(corpus)]}"
+        for number in itertools.count()
+    )
+
+    # Concurrent chat requests through the route, the answer cache and the pool.
+    def chat_burst():
+        offset = next(bursts) * args.burst
+
+        def ask(number):
+            return app.test_client().post(
+                "/chat/get", data={"msg": f"burst question {number} about energy"}
+            )
+
+        list(burst_pool.map(ask, range(offset, offset + args.burst)))
+
+    return {
+        "read_file_pdf": lambda: read_file(upload(pdf, "doc.pdf")),
+        "read_file_txt": lambda: read_file(upload(text.encode(), "doc.txt")),
+        "text_split": lambda: text_split(pages),
+        "embedding_cold": lambda: CachedEmbeddings(
+            embeddings_model(), "fake-minilm"
+        ).embed_documents(corpus[:1000]),
+        "embedding_warm": lambda: warm_embeddings.embed_documents(corpus[:1000]),
+        "retrieval_local": lambda: local_store.similarity_search(corpus[7], k=2),
+        "retrieval_pinecone": lambda: pinecone_store.similarity_search(corpus[7], k=2),
+        "retrieval_burst": burst(
+            lambda query: local_store.similarity_search(query, k=2)
+        ),
+        "retrieval_burst_batched": burst(burst_retriever.invoke),
+        "generate_mcqs": generate,
+        "route_generate_mcqs": post_generate(force=True),
+        "route_generate_mcqs_cached": post_generate(force=False),
+        "route_chat_get": lambda: client.post(
+            "/chat/get", data={"msg": next(questions)}
+        ),
+        "route_chat_burst": chat_burst,
+        "route_chat_get_cached": lambda: client.post(
+            "/chat/get", data={"msg": "question about energy"}
+        ),
+        "route_download_csv": lambda: client.get(f"/download/{mcq_id}?format=csv").data,
+        "route_download_jsonl": lambda: client.get(
+            f"/download/{mcq_id}?format=jsonl"
+        ).data,
+        "route_download_parquet": lambda: client.get(
+            f"/download/{mcq_id}?format=parquet"
+        ).data,
+    }
+
+
+def main(argv=None):
+    """
+    Run the benchmarks, save the results and compare them with the baseline.
+
+    Args:
+        argv (list): The command line arguments.
+
+    Returns:
+        int: 1 if a benchmark regressed beyond the threshold, else 0.
+    """
+    args = parse_args(argv)
+    settings = {
+        key: value
+        for key, value in vars(args).items()
+        if key not in ("output", "baseline", "only")
+    }
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, fn in benchmarks(args, workdir).items():
+            if args.only and not any(part in name for part in args.only):
+                continue
+
+            results[name] = measure(fn, repeat=args.repeat, warmup=args.warmup)
+            print(f"{name}: median {results[name]['median'] * 1000:.3f} ms", flush=True)
+
+    save_results(args.output, results, settings)
+    print(f"Results saved to {args.output}")
+
+    if not args.baseline:
+        return 0
+
+    baseline = load_results(args.baseline)
+    if baseline["settings"] != settings:
+        print("Warning: the baseline ran with different settings.")
+
+    rows, regressions = compare(results, baseline["results"], args.threshold)
+    print(format_table(rows))
+    if regressions:
+        print(f"Regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
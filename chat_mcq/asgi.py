@@ -0,0 +1,342 @@
+"""
+Async serving mode of the app, for deployments with many slow requests in flight.
+
+Run with:
+
+    uvicorn --factory chat_mcq.asgi:create_asgi_app --workers 2
+
+``POST /generate_mcqs`` awaits the OpenAI chains through their async API and
+``POST /chat/get`` runs the llama generation on a bounded thread pool, so a
+slow request holds no thread while it waits. Every other route is served by
+the Flask app, mounted as a WSGI application.
+"""
+
+import asyncio
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+from fastapi import HTTPException
+from fastapi import Request
+from fastapi.middleware.wsgi import WSGIMiddleware
+from fastapi.responses import HTMLResponse
+from fastapi.responses import JSONResponse
+from flask import Flask
+from flask import current_app
+from starlette.formparsers import MultiPartException
+from starlette.formparsers import MultiPartParser
+from werkzeug.datastructures.file_storage import FileStorage
+
+from .factory import create_app
+from .metrics import timed
+from .question_bank import generate_mcqs_from_bank
+from .routes.mcq_generator import GENERATION_MODES
+from .routes.mcq_generator import cached_response
+from .routes.mcq_generator import lookup_generation_cache
+from .routes.mcq_generator import review_cached
+from .routes.mcq_generator import store_generation
+from .routes.question_answer import answer_question
+from .utils.openai_utils import REVIEW_STATUSES
+from .utils.openai_utils import agenerate_mcqs_from_text
+from .utils.openai_utils import error_response
+from .utils.openai_utils import read_file
+from .utils.upload_utils import UPLOAD_SIGNATURES
+from .utils.upload_utils import archive_upload
+from .utils.upload_utils import upload_extension
+
+
+def prepare_generation(file, num_mcqs, subject, complexity, force, review):
+    """
+    Look up the generation cache and extract the text of the uploaded file.
+
+    Hashing and reading the file block, this runs on the executor.
+
+    Args:
+        file (FileStorage): The uploaded file.
+        num_mcqs (int): The number of MCQs to generate.
+        subject (str): The subject of the MCQs.
+        complexity (str): The complexity of the MCQs.
+        force (bool): Skip the generation cache.
+        review (str): The review mode of the request.
+
+    Returns:
+        tuple: The cache key, the hash of the file, the response when the
+            MCQs were cached or the file couldn't be read, else None and the
+            text of the file.
+    """
+    cache_key, document_hash, mcq_entry = lookup_generation_cache(
+        file, num_mcqs, subject, complexity, force
+    )
+    if mcq_entry is not None:
+        review_cached(mcq_entry, subject, review)
+        return cache_key, document_hash, cached_response(mcq_entry), None
+
+    # Keep a copy of the upload when archiving is on.
+    if current_app.config.get("UPLOAD_ARCHIVE"):
+        with timed("upload_save"):
+            archive_upload(file, current_app.config["UPLOAD_FOLDER"])
+
+    try:
+        return cache_key, document_hash, None, read_file(file)
+    except Exception as e:
+        traceback.print_exception(type(e), e, e.__traceback__)
+        return (
+            cache_key,
+            document_hash,
+            error_response(f"Error generating MCQs. Error is {str(e)}."),
+            None,
+        )
+
+
+class UploadFormParser(MultiPartParser):
+    """
+    Multipart parser rejecting the files of an unsupported type.
+
+    The extension is checked as soon as the headers of a file part are
+    parsed, before any of its content is buffered, like ``UploadRequest``.
+    """
+
+    def on_headers_finished(self):
+        super().on_headers_finished()
+        upload = self._current_part.file
+        if upload is not None and upload_extension(upload.filename) not in (
+            UPLOAD_SIGNATURES
+        ):
+            raise HTTPException(
+                415, "Unsupported file format. Only PDF and text files are supported."
+            )
+
+
+async def limited_stream(request: Request, max_length=None):
+    """
+    Stream the body of the request, up to ``max_length`` bytes.
+
+    Args:
+        request (Request): The request to read.
+        max_length (int): Max size of the body in bytes.
+
+    Yields:
+        bytes: The chunks of the body.
+
+    Raises:
+        HTTPException: 413 as soon as the body goes over ``max_length``, for
+            the requests which didn't declare their length.
+    """
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if max_length and received > max_length:
+            raise HTTPException(413, "The uploaded file is too large.")
+        yield chunk
+
+
+async def read_upload_form(request: Request, max_length=None):
+    """
+    Parse the form of an upload with the limits of ``UploadRequest``.
+
+    A request declaring a ``Content-Length`` over ``max_length`` is rejected
+    before its body is read, the body of one without it is cut off once over
+    ``max_length``, and a file of an unsupported type is rejected before its
+    content is buffered.
+
+    Args:
+        request (Request): The request of the upload.
+        max_length (int): Max size of the request in bytes.
+
+    Returns:
+        FormData: The fields and the file of the form, to close once done.
+
+    Raises:
+        HTTPException: 400 for a malformed form, 413 for a request over
+            ``max_length``, 415 for a file of an unsupported type.
+    """
+    length = request.headers.get("content-length")
+    if max_length and length and int(length) > max_length:
+        raise HTTPException(413, "The uploaded file is too large.")
+
+    if not request.headers.get("content-type", "").startswith("multipart/form-data"):
+        return await request.form()
+
+    parser = UploadFormParser(
+        request.headers, limited_stream(request, max_length), max_files=1
+    )
+    try:
+        return await parser.parse()
+    except MultiPartException as e:
+        raise HTTPException(400, e.message)
+
+
+def check_upload(upload):
+    """
+    Reject the uploads the Flask app would refuse.
+
+    Args:
+        upload (UploadFile): The uploaded file.
+
+    Raises:
+        HTTPException: 415 for a file of an unsupported type or whose content
+            doesn't match its type.
+    """
+    extension = upload_extension(upload.filename)
+    if extension not in UPLOAD_SIGNATURES:
+        raise HTTPException(
+            415, "Unsupported file format. Only PDF and text files are supported."
+        )
+
+    signature = UPLOAD_SIGNATURES[extension]
+    head = upload.file.read(len(signature))
+    upload.file.seek(0)
+    if head != signature:
+        raise HTTPException(415, "The file content doesn't match its type.")
+
+
+def create_asgi_app(flask_app: Flask = None):
+    """
+    Create the ASGI application serving the slow routes asynchronously.
+
+    At most ``LLM_MAX_CONCURRENCY`` MCQ generations and chat answers run at
+    the same time per process, and the blocking work runs on a pool of
+    ``ASGI_EXECUTOR_WORKERS`` threads, each call in its own application
+    context.
+
+    Args:
+        flask_app (Flask): The Flask application, created when not given.
+
+    Returns:
+        FastAPI: The ASGI application.
+    """
+    flask_app = flask_app or create_app()
+    config = flask_app.config
+    executor = ThreadPoolExecutor(
+        max_workers=config.get("ASGI_EXECUTOR_WORKERS", 32),
+        thread_name_prefix="asgi",
+    )
+    llm_slots = asyncio.Semaphore(config.get("LLM_MAX_CONCURRENCY", 16))
+
+    @asynccontextmanager
+    async def lifespan(api):
+        yield
+        executor.shutdown(wait=False)
+
+    api = FastAPI(lifespan=lifespan, docs_url=None, redoc_url=None, openapi_url=None)
+
+    async def run_sync(fn, *args):
+        """Run a blocking function on the executor, in an application context."""
+
+        def run():
+            with flask_app.app_context():
+                return fn(*args)
+
+        return await asyncio.get_running_loop().run_in_executor(executor, run)
+
+    @api.post("/generate_mcqs")
+    async def generate_mcqs_async(request: Request):
+        """
+        Generate MCQs from an uploaded file, like the Flask route.
+
+        Returns:
+            JSONResponse: The generated MCQs and a status code.
+        """
+        # Retrieve the file and form data from the request.
+        form = await read_upload_form(request, config.get("MAX_CONTENT_LENGTH"))
+        try:
+            return await generate_from_form(form)
+        finally:
+            await form.close()
+
+    async def generate_from_form(form):
+        """
+        Generate MCQs from the parsed form of ``generate_mcqs_async``.
+
+        Args:
+            form (FormData): The fields and the file of the request.
+
+        Returns:
+            JSONResponse: The generated MCQs and a status code.
+        """
+        try:
+            upload = form["file"]
+            num_mcqs = int(form["num_mcqs"])
+            subject = form["subject"]
+            complexity = form["complexity"]
+        except (KeyError, ValueError):
+            raise HTTPException(400, "file, num_mcqs, subject and complexity needed.")
+
+        check_upload(upload)
+        chunked = GENERATION_MODES.get(form.get("mode", "auto"))
+        review = form.get("review") or config.get("MCQ_REVIEW_MODE", "inline")
+        if review not in REVIEW_STATUSES:
+            raise HTTPException(
+                400,
+                f"Unsupported review {review!r}, use one of {sorted(REVIEW_STATUSES)}.",
+            )
+        force = form.get("force", "false").lower() == "true"
+        reuse = form.get("reuse")
+        reuse = (
+            config.get("MCQ_REUSE_BANK") if reuse is None else reuse.lower() == "true"
+        )
+
+        # Reuse the cached MCQs, or extract the text off the event loop.
+        file = FileStorage(stream=upload.file, filename=upload.filename)
+        cache_key, document_hash, response, text = await run_sync(
+            prepare_generation, file, num_mcqs, subject, complexity, force, review
+        )
+        if response is not None:
+            return JSONResponse(response)
+
+        # Await the OpenAI chains, at most LLM_MAX_CONCURRENCY at once. The
+        # question bank top up reads the database, it runs on the executor.
+        async with llm_slots:
+            if reuse:
+                response = await run_sync(
+                    generate_mcqs_from_bank,
+                    file,
+                    num_mcqs,
+                    subject,
+                    complexity,
+                    chunked,
+                    review,
+                    text,
+                    document_hash,
+                )
+            else:
+                with flask_app.app_context():
+                    response = await agenerate_mcqs_from_text(
+                        text, num_mcqs, subject, complexity, chunked, review
+                    )
+
+        # If the MCQs were generated successfully, save them to the database.
+        if response["status_code"] == 200:
+            response["mcq_id"] = await run_sync(
+                store_generation,
+                response,
+                subject,
+                complexity,
+                cache_key,
+                document_hash,
+            )
+
+        return JSONResponse(response)
+
+    @api.post("/chat/get")
+    async def chat_async(request: Request):
+        """
+        Answer a chat message, like the Flask route.
+
+        Returns:
+            HTMLResponse: The answer of the QA system.
+        """
+        form = await request.form()
+        if "msg" not in form:
+            raise HTTPException(400, "msg needed.")
+
+        # The llama generation is CPU bound, run it on the executor.
+        async with llm_slots:
+            answer, status = await run_sync(answer_question, form["msg"])
+
+        return HTMLResponse(answer, status_code=status)
+
+    # Every other route is served by the Flask app.
+    api.mount("/", WSGIMiddleware(flask_app))
+    return api
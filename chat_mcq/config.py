@@ -16,6 +16,16 @@ SQLALCHEMY_DATABASE_URI = "sqlite:///mcqs.db"
 # Upload folder
 UPLOAD_FOLDER = r"path/to/uploads"
 
+# Keep a copy of every uploaded file in UPLOAD_FOLDER, named after its hash
+UPLOAD_ARCHIVE = os.environ.get("UPLOAD_ARCHIVE", "false").lower() == "true"
+
+# Max size in bytes of a request, larger uploads are rejected with a 413
+MAX_CONTENT_LENGTH = 20 * 1024 * 1024
+
+# Uploads larger than this many bytes are buffered in a temporary file
+# instead of memory
+UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024
+
 # Data directory
 DATA_DIR = r"path/to/data"
 
@@ -25,8 +35,218 @@ FLASK_LOGLEVEL = "INFO"
 # Flask log file
 # FLASK_LOGFILE=
 
+# Import the heavy dependencies and build the OpenAI client in the background
+# when the app starts, instead of on the first request needing them
+WARM_UP = os.environ.get("WARM_UP", "false").lower() == "true"
+
+# Seconds create_app() may take, checked by "flask profile-startup" and
+# tests/test_startup.py
+STARTUP_TIME_BUDGET = 2.0
+
 # Pinecone index name
 PINECONE_INDEX_NAME = ""
 
 # Model path where pre trained opensource model is stored
 OPEN_SOURCE_PRETRAINED_MODEL_PATH = r"\model\llama-2-7b-chat.ggmlv3.q4_0.bin"
+
+# Number of llama QA instances kept warm per process.
+# Every instance holds its own copy of the model weights in memory.
+QA_POOL_SIZE = int(os.environ.get("QA_POOL_SIZE", 1))
+
+# Seconds a chat request waits for a free QA instance, None waits forever
+QA_POOL_TIMEOUT = 120
+
+# Load the QA models in the background when the app starts
+QA_PRELOAD = os.environ.get("QA_PRELOAD", "false").lower() == "true"
+
+# URL of the model server started with "flask model-server", e.g.
+# http://127.0.0.1:8600. When set, the web workers send the llama generations
+# and MiniLM embeddings to it instead of loading the models themselves, so
+# QA_POOL_SIZE can be raised without loading more copies of the weights.
+MODEL_SERVER_URL = os.environ.get("MODEL_SERVER_URL")
+
+# Interface and port of the model server, keep it on a local interface
+MODEL_SERVER_HOST = "127.0.0.1"
+MODEL_SERVER_PORT = 8600
+
+# Number of model server processes, each with its own copy of the models.
+# None starts one per MODEL_SERVER_THREADS CPU cores.
+MODEL_SERVER_REPLICAS = None
+
+# CPU threads of the llama generation in every replica
+MODEL_SERVER_THREADS = 4
+
+# Max number of requests waiting for a free replica, the next ones get a 503
+MODEL_SERVER_QUEUE_SIZE = 256
+
+# Seconds a model server request may wait and run before it fails
+MODEL_SERVER_TIMEOUT = 120
+
+# Vector store backend, "pinecone" or "local"
+VECTOR_STORE_BACKEND = os.environ.get("VECTOR_STORE_BACKEND", "pinecone")
+
+# Directory of the local vector store
+LOCAL_VECTOR_STORE_DIR = r"path/to/vector_store"
+
+# Number of vectors from which the local store searches an HNSW graph
+# instead of scanning the whole matrix
+LOCAL_VECTOR_STORE_HNSW_THRESHOLD = 50000
+
+# HNSW search breadth, higher is more accurate but slower
+LOCAL_VECTOR_STORE_HNSW_EF_SEARCH = 64
+
+# Manifest of the ingested files and chunk hashes, used by script.py to only
+# re-embed what changed
+INGEST_MANIFEST_PATH = r"path/to/ingest_manifest.json"
+
+# Number of processes parsing the PDFs during ingestion, defaults to the CPUs
+PDF_EXTRACT_WORKERS = None
+
+# SQLite file caching the MiniLM vectors, shared by ingestion and chat, e.g.
+# EMBEDDING_CACHE_PATH=path/to/embeddings_cache.db in the .env. Unset, the
+# embeddings are always recomputed.
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH")
+
+# Number of vectors kept in the in-memory tier of the embedding cache
+EMBEDDING_CACHE_MEMORY_SIZE = 10000
+
+# Backend computing the MiniLM embeddings: "torch" runs sentence-transformers,
+# "onnx" runs the model exported to ONNX with onnxruntime, without torch
+EMBEDDINGS_BACKEND = os.environ.get("EMBEDDINGS_BACKEND", "torch")
+
+# Directory the MiniLM model is exported to on the first use of the ONNX backend
+ONNX_MODEL_DIR = r"path/to/onnx_models"
+
+# Use the ONNX model with its weights quantized to int8, faster on CPU.
+# Check the vectors still match the PyTorch ones with "flask export-embeddings".
+ONNX_QUANTIZE = True
+
+# Max number of texts per ONNX forward pass
+EMBEDDINGS_BATCH_SIZE = 32
+
+# Answer repeated questions from a semantic cache instead of running the llama
+# model. Off by default: a question similar enough to a cached one gets its
+# answer, even when it asks something slightly different.
+ANSWER_CACHE_ENABLED = os.environ.get("ANSWER_CACHE_ENABLED", "false").lower() == "true"
+
+# Min cosine similarity between two questions to reuse the cached answer
+ANSWER_CACHE_THRESHOLD = 0.92
+
+# Seconds a cached answer stays valid
+ANSWER_CACHE_TTL = 24 * 60 * 60
+
+# Max number of cached answers, the least recently used are evicted first
+ANSWER_CACHE_MAX_SIZE = 5000
+
+# Number of MCQ generation jobs running at the same time per process
+MCQ_JOB_WORKERS = 4
+
+# Texts longer than this many tokens are split into sections of this size and
+# their MCQs are generated concurrently. Set to None to always use one prompt.
+MCQ_CHUNK_TOKENS = 6000
+
+# Max number of sections generated at the same time
+MCQ_CHUNK_CONCURRENCY = 4
+
+# Max number of MCQ generations and chat answers in flight per process in the
+# async app of chat_mcq.asgi, the next requests wait for a free slot
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 16))
+
+# Threads of the async app running the blocking work: the llama generation,
+# the file parsing and the database queries
+ASGI_EXECUTOR_WORKERS = 32
+
+# Default review of the generated quizzes, overridden by the "review" form field:
+# "inline" waits for the review, "background" returns the quiz and attaches the
+# review to the stored quiz later, "skip" doesn't review. Defaults to "inline",
+# the response existing clients expect.
+MCQ_REVIEW_MODE = os.environ.get("MCQ_REVIEW_MODE", "inline")
+
+# Quizzes with more questions are reviewed in batches of this many questions,
+# at most MCQ_CHUNK_CONCURRENCY at once. Set to None to review in one prompt.
+MCQ_REVIEW_BATCH_SIZE = 10
+
+# Reuse the questions stored for the same document, subject and complexity and
+# only generate the missing ones, overridden by the "reuse" form field
+MCQ_REUSE_BANK = os.environ.get("MCQ_REUSE_BANK", "false").lower() == "true"
+
+# Max number of times the LLM is asked for the questions missing from a question
+# bank quiz, once the generated questions repeating the quiz are dropped
+MCQ_BANK_TOP_UP_ATTEMPTS = 3
+
+# Max number of cached MCQ generations, the least recently used are evicted first
+MCQ_CACHE_MAX_ENTRIES = 10000
+
+# Seconds a cached MCQ generation can be reused
+MCQ_CACHE_MAX_AGE = 30 * 24 * 60 * 60
+
+# Pragmas applied to every new SQLite connection. WAL lets the readers work on
+# a snapshot while a write is in progress, and busy_timeout (ms) makes writers
+# wait for the lock instead of failing with "database is locked".
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "busy_timeout": 5000,
+    "synchronous": "NORMAL",
+    "cache_size": -20000,
+    "temp_store": "MEMORY",
+}
+
+# Hand the new quizzes to a writer thread that commits them in groups,
+# one transaction for all the quizzes saved at about the same time
+MCQ_WRITE_BEHIND = os.environ.get("MCQ_WRITE_BEHIND", "false").lower() == "true"
+
+# Max number of quizzes committed in one transaction
+MCQ_WRITE_BATCH_SIZE = 64
+
+# Seconds the writer waits for more quizzes before committing a group
+MCQ_WRITE_MAX_DELAY = 0.05
+
+# Max number of quizzes waiting for the writer, saving falls back to a direct
+# commit when the queue stays full
+MCQ_WRITE_QUEUE_SIZE = 1000
+
+# Seconds a request waits for a free queue slot and for its group commit
+MCQ_WRITE_TIMEOUT = 30
+
+# Embed and search the chat queries arriving at the same time in one batch.
+# Pays off when many chat requests retrieve at once, a query arriving alone
+# waits RETRIEVAL_BATCH_MAX_WAIT more.
+RETRIEVAL_BATCHING = os.environ.get("RETRIEVAL_BATCHING", "false").lower() == "true"
+
+# Max number of chat queries retrieved in one batch
+RETRIEVAL_BATCH_MAX_SIZE = 32
+
+# Seconds the first query of a batch waits for more queries
+RETRIEVAL_BATCH_MAX_WAIT = 0.005
+
+# Retrieval of the chat context: "vector" searches the vector store, "lexical"
+# the BM25 index, "hybrid" both, fused with reciprocal rank fusion
+RETRIEVAL_MODE = os.environ.get("RETRIEVAL_MODE", "vector")
+
+# Directory of the BM25 index of the chunks, built by script.py.
+# Set to None to not build it.
+BM25_INDEX_DIR = r"path/to/bm25_index"
+
+# In hybrid mode, skip the embedding and vector search when the best BM25
+# match scores at least this share of the max score the question can reach.
+# Set to None to always fuse both rankings. The answer cache then looks these
+# questions up by their text instead of their embedding, so with
+# ANSWER_CACHE_ENABLED too the fast path still skips MiniLM, but only exact
+# repeats of a fast path question hit the cache.
+HYBRID_FAST_PATH_CONFIDENCE = 0.6
+
+# Seconds the hybrid retrieval waits for the vector search before answering
+# from the BM25 index alone
+HYBRID_VECTOR_TIMEOUT = 2.0
+
+# Reciprocal rank fusion constant, higher flattens the weight of the top ranks
+HYBRID_RRF_K = 60
+
+# Max number of context tokens in the llama prompt, measured with the model's
+# tokenizer. The retrieved candidates are reranked, de-overlapped and packed
+# into this budget. Off by default, the top 2 chunks are stuffed as they are;
+# set it in the .env to turn the packing on, e.g. CONTEXT_TOKEN_BUDGET=512.
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET") or 0) or None
+
+# Number of candidate chunks retrieved for the context packing
+CONTEXT_CANDIDATES = 8
@@ -1,4 +1,17 @@
 from flask_sqlalchemy import SQLAlchemy
 
+from .group_commit import GroupCommitWriter
+from .job_runner import JobRunner
+from .model.llama_model.qa_engine import QAEngine
+
 # DB Sqlalchemy extension
 db = SQLAlchemy()
+
+# Process wide pool of warm llama QA objects
+qa_engine = QAEngine()
+
+# Worker pool for the background MCQ generation jobs
+job_runner = JobRunner()
+
+# Writer thread committing the new quizzes in groups
+group_commit_writer = GroupCommitWriter()
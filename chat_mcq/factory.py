@@ -1,9 +1,16 @@
 import logging
+import sys
+import threading
+import time
 
+import click
 from flask import Flask
 from flask.logging import default_handler
 
 from .extensions import db
+from .extensions import group_commit_writer
+from .extensions import job_runner
+from .extensions import qa_engine
 
 
 def create_app():
@@ -13,16 +20,62 @@ def create_app():
     Returns:
         Flask: The configured Flask application instance.
     """
+    from .utils.upload_utils import UploadRequest
+
     app = Flask(__name__)
+    app.request_class = UploadRequest
     app.config.from_object("chat_mcq.config")
 
-    configure_logging(app)
-    configure_extensions(app)
-    register_blueprints(app)
+    # Time every step, see the profile-startup command.
+    timings = app.extensions["startup_timings"] = {}
+    for step in (
+        configure_logging,
+        configure_extensions,
+        register_blueprints,
+        register_commands,
+    ):
+        start = time.perf_counter()
+        step(app)
+        timings[step.__name__] = time.perf_counter() - start
+
+    # Build the clients skipped at startup in the background.
+    if app.config.get("WARM_UP"):
+        threading.Thread(
+            target=warm_up, args=(app,), name="app-warm-up", daemon=True
+        ).start()
 
     return app
 
 
+def warm_up(app: Flask):
+    """
+    Import the heavy dependencies and build the clients the app creates lazily.
+
+    The OpenAI model and the MCQ chains, LangChain, pypdf and the text splitter
+    are otherwise loaded by the first request needing them. The llama models
+    are preloaded by the QA engine when ``QA_PRELOAD`` is set.
+
+    Args:
+        app (Flask): The Flask application instance.
+    """
+    start = time.perf_counter()
+    try:
+        # Import the modules the first requests would otherwise load.
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+        from langchain_community.callbacks import get_openai_callback
+
+        from .model.llama_model import streaming
+        from .model.openai_model.mcq_generator import get_generate_evaluate_chain
+        from .utils import pdf_utils
+
+        get_generate_evaluate_chain()
+    except Exception:
+        app.logger.exception("Failed to warm up the app.")
+        return
+
+    app.logger.info(f"App warmed up in {round(time.perf_counter() - start, 2)}s.")
+
+
 def configure_logging(app: Flask):
     """
     Configure logging for the Flask application.
@@ -51,12 +104,24 @@ def configure_extensions(app: Flask):
     Args:
         app (Flask): The Flask application instance.
     """
+    from .migrations import create_question_search
+    from .migrations import upgrade_schema
     from .models import MCQ
+    from .models import GenerationJob
+    from .models import Option
+    from .models import Question
+    from .persistence import configure_sqlite
 
     db.init_app(app)
+    qa_engine.init_app(app)
+    job_runner.init_app(app)
+    group_commit_writer.init_app(app)
 
     with app.app_context():
+        configure_sqlite(db.engine, app.config.get("SQLITE_PRAGMAS"))
         db.create_all()
+        upgrade_schema()
+        app.extensions["question_search"] = create_question_search()
 
 
 def register_blueprints(app: Flask):
@@ -68,8 +133,110 @@ def register_blueprints(app: Flask):
     """
     from .routes.entry import entry_page
     from .routes.mcq_generator import mcq_generator
+    from .routes.metrics import metrics
     from .routes.question_answer import question_answer
+    from .routes.questions import questions
 
     app.register_blueprint(entry_page)
     app.register_blueprint(mcq_generator)
+    app.register_blueprint(metrics)
     app.register_blueprint(question_answer)
+    app.register_blueprint(questions)
+
+
+def register_commands(app: Flask):
+    """
+    Register the CLI commands with the Flask application.
+
+    Args:
+        app (Flask): The Flask application instance.
+    """
+
+    @app.cli.command("migrate-questions")
+    @click.option("--batch-size", default=500, help="Quizzes per transaction.")
+    def migrate_questions(batch_size):
+        """Copy the quizzes stored as JSON blobs into the question tables."""
+        from .migrations import migrate_question_blobs
+
+        migrated = migrate_question_blobs(batch_size, logger=app.logger)
+        click.echo(f"Migrated {migrated} quizzes.")
+
+    @app.cli.command("profile-startup")
+    @click.option("--top", default=15, help="Number of packages listed.")
+    @click.option(
+        "--budget",
+        type=float,
+        default=None,
+        help="Seconds create_app() may take, defaults to STARTUP_TIME_BUDGET.",
+    )
+    def profile_startup_command(top, budget):
+        """Time the imports and init steps of create_app() from a cold start."""
+        from .startup import profile_startup
+
+        result = profile_startup()
+        if budget is None:
+            budget = app.config.get("STARTUP_TIME_BUDGET")
+
+        click.echo(f"create_app() {result['total']:.3f}s, budget {budget}s")
+        click.echo(f"  {'import chat_mcq.factory':<32} {result['import']:.3f}s")
+        for step, seconds in result["steps"].items():
+            click.echo(f"  {step:<32} {seconds:.3f}s")
+
+        click.echo("Import time by package:")
+        for package, seconds in result["packages"][:top]:
+            click.echo(f"  {package:<32} {seconds:.3f}s")
+
+        if budget and result["total"] > budget:
+            click.echo(f"create_app() is over the {budget}s startup budget.")
+            sys.exit(1)
+
+    @app.cli.command("model-server")
+    @click.option("--host", default=None, help="Defaults to MODEL_SERVER_HOST.")
+    @click.option(
+        "--port", type=int, default=None, help="Defaults to MODEL_SERVER_PORT."
+    )
+    @click.option(
+        "--replicas",
+        type=int,
+        default=None,
+        help="Model replicas, defaults to MODEL_SERVER_REPLICAS or the CPU cores.",
+    )
+    def model_server_command(host, port, replicas):
+        """Serve the llama and MiniLM models to the web workers."""
+        from .model_server.server import serve
+
+        serve(
+            dict(app.config),
+            host=host or app.config.get("MODEL_SERVER_HOST", "127.0.0.1"),
+            port=port or app.config.get("MODEL_SERVER_PORT", 8600),
+            replicas=replicas,
+        )
+
+    @app.cli.command("export-embeddings")
+    @click.option("--fp32", is_flag=True, help="Don't quantize the weights to int8.")
+    def export_embeddings_command(fp32):
+        """Export MiniLM to ONNX and check its vectors against PyTorch."""
+        from .utils.onnx_embeddings import OnnxEmbeddings
+        from .utils.onnx_embeddings import parity_check
+        from .utils.opensource_utils import EMBEDDINGS_OPEN_SOURCE_MODEL
+        from .utils.opensource_utils import download_hugging_face_embeddings
+
+        embeddings = OnnxEmbeddings(
+            EMBEDDINGS_OPEN_SOURCE_MODEL,
+            app.config["ONNX_MODEL_DIR"],
+            quantize=not fp32,
+            batch_size=app.config.get("EMBEDDINGS_BATCH_SIZE", 32),
+        )
+        click.echo(
+            f"Exported {EMBEDDINGS_OPEN_SOURCE_MODEL} to {app.config['ONNX_MODEL_DIR']}"
+        )
+
+        result = parity_check(embeddings, download_hugging_face_embeddings())
+        click.echo(
+            f"Parity with PyTorch on {result['texts']} texts: min cosine "
+            f"{result['min_cosine']:.5f}, mean cosine {result['mean_cosine']:.5f}, "
+            f"max abs diff {result['max_abs_diff']:.5f}"
+        )
+        if not result["ok"]:
+            click.echo("The ONNX vectors don't match the PyTorch ones.")
+            sys.exit(1)
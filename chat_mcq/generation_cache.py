@@ -0,0 +1,118 @@
+import hashlib
+import json
+from datetime import datetime
+from datetime import timedelta
+
+from flask import current_app
+
+from .extensions import db
+from .model.openai_model.mcq_generator import OPENAI_MODEL_NAME
+from .models import GenerationCache
+
+
+def hash_stream(stream):
+    """
+    Compute the SHA-256 of a file stream and rewind it for the next reader.
+
+    Args:
+        stream: The seekable binary stream of the upload.
+
+    Returns:
+        str: The hex digest of the content.
+    """
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for block in iter(lambda: stream.read(1 << 20), b""):
+        digest.update(block)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def generation_cache_key(content_hash, mcq_count, subject, tone, response_json):
+    """
+    Build the cache key of an MCQ generation.
+
+    Args:
+        content_hash (str): The hash of the uploaded file.
+        mcq_count (int): The number of MCQs to generate.
+        subject (str): The subject of the MCQs.
+        tone (str): The tone of the MCQs.
+        response_json (dict): The example response given to the LLM.
+
+    Returns:
+        str: The hash of every input that changes the generated MCQs.
+    """
+    response_json_hash = hashlib.sha256(
+        json.dumps(response_json, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    key = json.dumps(
+        [content_hash, mcq_count, subject, tone, response_json_hash, OPENAI_MODEL_NAME]
+    )
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def get_cached_mcqs(key):
+    """
+    Look up the MCQs generated before for the same key.
+
+    Args:
+        key (str): The key built by ``generation_cache_key``.
+
+    Returns:
+        MCQ: The stored MCQ entry, None on a miss or an expired entry.
+    """
+    entry = db.session.get(GenerationCache, key)
+    if entry is None:
+        return None
+
+    max_age = current_app.config.get("MCQ_CACHE_MAX_AGE")
+    if max_age and entry.created_at < datetime.utcnow() - timedelta(seconds=max_age):
+        db.session.delete(entry)
+        db.session.commit()
+        return None
+
+    entry.hits += 1
+    entry.last_used_at = datetime.utcnow()
+    db.session.commit()
+    return entry.mcq
+
+
+def store_cached_mcqs(key, mcq_entry):
+    """
+    Remember the MCQ entry generated for the key and evict old entries.
+
+    Args:
+        key (str): The key built by ``generation_cache_key``.
+        mcq_entry (MCQ): The stored MCQ entry.
+    """
+    db.session.merge(GenerationCache(key=key, mcq_id=mcq_entry.id))
+    db.session.commit()
+    evict_generation_cache()
+
+
+def evict_generation_cache():
+    """
+    Drop the cache entries older than ``MCQ_CACHE_MAX_AGE`` seconds and the least
+    recently used ones beyond ``MCQ_CACHE_MAX_ENTRIES``.
+
+    The MCQ rows themselves are kept, only their cache entries are removed.
+    """
+    max_age = current_app.config.get("MCQ_CACHE_MAX_AGE")
+    if max_age:
+        cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+        GenerationCache.query.filter(GenerationCache.created_at < cutoff).delete()
+
+    max_entries = current_app.config.get("MCQ_CACHE_MAX_ENTRIES")
+    if max_entries:
+        stale = (
+            db.session.query(GenerationCache.key)
+            .order_by(GenerationCache.last_used_at.desc())
+            .offset(max_entries)
+            .all()
+        )
+        if stale:
+            GenerationCache.query.filter(
+                GenerationCache.key.in_([key for key, in stale])
+            ).delete(synchronize_session=False)
+
+    db.session.commit()
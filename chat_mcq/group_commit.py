@@ -0,0 +1,185 @@
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from flask import Flask
+
+
+class GroupCommitWriter:
+    """
+    Writer thread inserting the rows of many requests in shared transactions.
+
+    The rows are queued by the request threads and committed by one thread
+    in groups of up to ``MCQ_WRITE_BATCH_SIZE``, so concurrent saves share a
+    single lock acquisition and fsync instead of contending for the SQLite
+    write lock. Every submitted row gets a future resolving to its primary
+    key once its group is committed. A row whose future is cancelled before
+    the writer takes it is skipped. The queue is bounded, and what is left in
+    it is flushed when the process exits.
+    """
+
+    def __init__(self, app: Flask = None):
+        self.app = None
+        self.enabled = False
+        self._queue = None
+        self._thread = None
+        self._exit_registered = False
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        """
+        Bind the writer to the Flask application and start its thread if enabled.
+
+        The writer is process wide, binding it again flushes and stops the
+        thread of the previous app first.
+
+        Args:
+            app (Flask): The Flask application instance.
+        """
+        self.close()
+
+        self.app = app
+        self.enabled = app.config.get("MCQ_WRITE_BEHIND", False)
+        self.batch_size = app.config.get("MCQ_WRITE_BATCH_SIZE", 64)
+        self.max_delay = app.config.get("MCQ_WRITE_MAX_DELAY", 0.05)
+        self.timeout = app.config.get("MCQ_WRITE_TIMEOUT", 30)
+        self._queue = queue.Queue(maxsize=app.config.get("MCQ_WRITE_QUEUE_SIZE", 1000))
+        app.extensions["group_commit_writer"] = self
+
+        if self.enabled:
+            self._thread = threading.Thread(
+                target=self._run, name="group-commit", daemon=True
+            )
+            self._thread.start()
+            if not self._exit_registered:
+                atexit.register(self.close)
+                self._exit_registered = True
+
+    def submit(self, row):
+        """
+        Queue the row for the next group commit.
+
+        Args:
+            row: The new, unsaved model instance.
+
+        Returns:
+            Future: Resolves to the primary key of the row once it is committed.
+
+        Raises:
+            queue.Full: No queue slot was freed within ``MCQ_WRITE_TIMEOUT``.
+        """
+        future = Future()
+        self._queue.put((row, future), timeout=self.timeout)
+        return future
+
+    def close(self):
+        """Commit the queued rows and stop the writer thread."""
+        if not self.enabled:
+            return
+
+        self.enabled = False
+        self._queue.put(None)
+        self._thread.join(self.timeout)
+
+    def _run(self):
+        """Collect the queued rows into groups and commit them."""
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            # Wait a little for the rows of concurrent requests.
+            batch = [item]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+
+                if item is None:
+                    stopping = True
+                    break
+
+                batch.append(item)
+
+            self._commit(batch)
+
+    def _commit(self, batch):
+        """
+        Insert the rows of the batch in one transaction.
+
+        The rows whose future was cancelled are skipped. When the transaction
+        fails the rows are committed one by one, with the primary keys of the
+        failed flush forgotten, so a bad row only fails its own future.
+
+        Args:
+            batch (list): The queued rows with their futures.
+        """
+        from .extensions import db
+
+        batch = [
+            (row, future)
+            for row, future in batch
+            if future.set_running_or_notify_cancel()
+        ]
+        if not batch:
+            return
+
+        with self.app.app_context():
+            try:
+                db.session.add_all([row for row, _ in batch])
+                db.session.flush()
+                ids = [row.id for row, _ in batch]
+                db.session.commit()
+
+            except Exception:
+                db.session.rollback()
+                self.app.logger.exception(
+                    f"Group commit of {len(batch)} rows failed, retrying one by one."
+                )
+
+                for row, future in batch:
+                    try:
+                        _reset_keys(row)
+                        db.session.add(row)
+                        db.session.flush()
+                        row_id = row.id
+                        db.session.commit()
+                    except Exception as e:
+                        db.session.rollback()
+                        future.set_exception(e)
+                    else:
+                        future.set_result(row_id)
+
+            else:
+                for (_, future), row_id in zip(batch, ids):
+                    future.set_result(row_id)
+
+
+def _reset_keys(row):
+    """
+    Forget the primary keys a rolled back flush assigned to the row.
+
+    The rollback expunges the rows but leaves their ids, the next flush would
+    insert them with these ids. The rows cascaded from it, e.g. the questions
+    and options of a quiz, are reset too.
+
+    Args:
+        row: The model instance to insert again.
+    """
+    from sqlalchemy import inspect
+
+    state = inspect(row)
+    objects = [(row, state.mapper)] + [
+        (obj, mapper)
+        for obj, mapper, _, _ in state.mapper.cascade_iterator("save-update", state)
+    ]
+    for obj, mapper in objects:
+        for column in mapper.primary_key:
+            setattr(obj, mapper.get_property_by_column(column).key, None)
@@ -0,0 +1,62 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Flask
+
+
+class JobRunner:
+    """
+    Worker pool running slow work outside of the request threads.
+
+    Every task runs inside an application context of the bound app, so it
+    can use the config, the logger and the database like a view does. The
+    database session of the task is removed when its context is torn down.
+    """
+
+    def __init__(self, app: Flask = None):
+        self.app = None
+        self.executor = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        """
+        Bind the runner to the Flask application and start its workers.
+
+        The runner is process wide, binding it again shuts the workers of the
+        previous app down once their queued tasks are done.
+
+        Args:
+            app (Flask): The Flask application instance.
+        """
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+
+        self.app = app
+        self.executor = ThreadPoolExecutor(
+            max_workers=app.config.get("MCQ_JOB_WORKERS", 4),
+            thread_name_prefix="mcq-job",
+        )
+        app.extensions["job_runner"] = self
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Schedule the function on the worker pool.
+
+        Args:
+            fn (Callable): The function to run.
+            *args: Positional arguments of the function.
+            **kwargs: Keyword arguments of the function.
+
+        Returns:
+            Future: The future of the function result.
+        """
+        # A task queued before the runner is bound to another app still runs
+        # in the context of its own app.
+        app = self.app
+
+        def run():
+            with app.app_context():
+                return fn(*args, **kwargs)
+
+        return self.executor.submit(run)
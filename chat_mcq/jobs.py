@@ -0,0 +1,165 @@
+import traceback
+import uuid
+from datetime import datetime
+
+from .extensions import db
+from .extensions import job_runner
+from .generation_cache import store_cached_mcqs
+from .models import MCQ
+from .models import GenerationJob
+from .persistence import save_mcqs
+from .question_bank import generate_mcqs_from_bank
+from .utils.openai_utils import generate_mcqs_from_text
+from .utils.openai_utils import review_quiz
+
+
+def create_generation_job(num_mcqs, subject, complexity, filename=None):
+    """
+    Persist a new queued generation job.
+
+    Args:
+        num_mcqs (int): The number of MCQs to generate.
+        subject (str): The subject of the MCQs.
+        complexity (str): The complexity of the MCQs.
+        filename (str): The name of the uploaded file.
+
+    Returns:
+        GenerationJob: The queued job.
+    """
+    job = GenerationJob(
+        id=uuid.uuid4().hex,
+        status="queued",
+        num_mcqs=num_mcqs,
+        subject=subject,
+        complexity=complexity,
+        filename=filename,
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def run_generation_job(
+    job_id,
+    text,
+    chunked=None,
+    cache_key=None,
+    review_mode="inline",
+    document_hash=None,
+    reuse=False,
+):
+    """
+    Generate the MCQs of a queued job and record the outcome on the job.
+
+    With the "background" review mode the job is done as soon as the quiz is
+    stored, and the review is queued as a separate task. With ``reuse`` the
+    questions stored for the same document are reused and only the missing
+    ones are generated, see ``generate_mcqs_from_bank``.
+
+    Args:
+        job_id (str): The id of the job.
+        text (str): The text extracted from the uploaded file.
+        chunked (bool): Generate section by section, defaults to deciding
+            by the size of the text.
+        cache_key (str): The generation cache key to store the MCQs under.
+        review_mode (str): "inline", "background" or "skip".
+        document_hash (str): The hash of the uploaded file, stored with the
+            MCQs for the question bank.
+        reuse (bool): Top up the questions of the question bank.
+    """
+
+    job = db.session.get(GenerationJob, job_id)
+    job.status = "running"
+    job.started_at = datetime.utcnow()
+    db.session.commit()
+
+    try:
+        if reuse:
+            response = generate_mcqs_from_bank(
+                None,
+                job.num_mcqs,
+                job.subject,
+                job.complexity,
+                chunked,
+                review_mode,
+                text,
+                document_hash,
+            )
+        else:
+            response = generate_mcqs_from_text(
+                text, job.num_mcqs, job.subject, job.complexity, chunked, review_mode
+            )
+
+        usage = (response or {}).get("usage", {})
+        job.prompt_tokens = usage.get("prompt_tokens")
+        job.completion_tokens = usage.get("completion_tokens")
+        job.total_tokens = usage.get("total_tokens")
+        job.total_cost = usage.get("total_cost")
+
+        if response and response["status_code"] == 200:
+            mcq_entry = save_mcqs(response, job.subject, job.complexity, document_hash)
+            if cache_key:
+                store_cached_mcqs(cache_key, mcq_entry)
+            job.mcq_id = mcq_entry.id
+            job.status = "done"
+        else:
+            job.status = "failed"
+
+        job.message = (response or {}).get("message", "Quiz wasn't generated!")
+
+    except Exception as e:
+        traceback.print_exception(type(e), e, e.__traceback__)
+        db.session.rollback()
+        job = db.session.get(GenerationJob, job_id)
+        job.status = "failed"
+        job.message = f"Error generating MCQs. Error is {str(e)}."
+
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+
+    if job.mcq is not None:
+        schedule_review(job.mcq, job.subject, job.id)
+
+
+def schedule_review(mcq_entry, subject, job_id=None):
+    """
+    Queue the review of a stored quiz whose review is pending.
+
+    Args:
+        mcq_entry (MCQ): The stored quiz.
+        subject (str): The subject of the MCQs.
+        job_id (str): The generation job to add the review's token usage to.
+    """
+    if mcq_entry.review_status == "pending":
+        job_runner.submit(run_review_job, mcq_entry.id, subject, job_id)
+
+
+def run_review_job(mcq_id, subject, job_id=None):
+    """
+    Review a stored quiz and attach the review to it.
+
+    Args:
+        mcq_id (int): The ID of the MCQ entry in the database.
+        subject (str): The subject of the MCQs.
+        job_id (str): The generation job to add the review's token usage to.
+    """
+    mcq_entry = db.session.get(MCQ, mcq_id)
+
+    try:
+        review, usage = review_quiz(mcq_entry.as_dict(), subject)
+        mcq_entry.review = review
+        mcq_entry.review_status = "done"
+
+        job = db.session.get(GenerationJob, job_id) if job_id else None
+        if job is not None:
+            for name in ("prompt_tokens", "completion_tokens", "total_tokens"):
+                setattr(job, name, (getattr(job, name) or 0) + usage[name])
+            job.total_cost = (job.total_cost or 0) + usage["total_cost"]
+
+    except Exception as e:
+        traceback.print_exception(type(e), e, e.__traceback__)
+        db.session.rollback()
+        mcq_entry = db.session.get(MCQ, mcq_id)
+        mcq_entry.review_status = "failed"
+
+    db.session.commit()
@@ -0,0 +1,263 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds of the latency histogram buckets, from a cache hit
+# to a long LLM generation
+DEFAULT_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    120,
+)
+
+
+def _format_labels(labelnames, values, extra=()):
+    """Render the label set of a sample, e.g. ``{stage="upload_save"}``."""
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+
+    escaped = (
+        (
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value):
+    """Render a sample value, Prometheus spells infinity "+Inf"."""
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonic counter with one value per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        """
+        Add the amount to the counter of the label set.
+
+        Args:
+            amount (float): The non negative increment.
+            **labels: The value of every label of the counter.
+        """
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        """
+        Snapshot the counter.
+
+        Yields:
+            tuple: The sample name, its labels and its value.
+        """
+        with self._lock:
+            values = dict(self._values)
+
+        for key, value in sorted(values.items()):
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Histogram:
+    """Histogram with fixed buckets and one series per label set."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, **labels):
+        """
+        Record one observation.
+
+        Only the bucket the value falls in is incremented, the cumulative
+        counts are computed when the metrics are rendered.
+
+        Args:
+            value (float): The observed value.
+            **labels: The value of every label of the histogram.
+        """
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        """
+        Snapshot the histogram.
+
+        Yields:
+            tuple: The sample name, its labels and its value.
+        """
+        with self._lock:
+            series = {
+                key: (list(counts), total, count)
+                for key, (counts, total, count) in self._series.items()
+            }
+
+        for key, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(
+                    self.labelnames, key, [("le", _format_value(bound))]
+                )
+                yield f"{self.name}_bucket", labels, cumulative
+
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+class Registry:
+    """Collection of the metrics served by the ``/metrics`` endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def counter(self, name, documentation, labelnames=()):
+        """
+        Get or create a counter.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): The help text of the metric.
+            labelnames (tuple): The label names of the metric.
+
+        Returns:
+            Counter: The registered counter.
+        """
+        return self._register(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """
+        Get or create a histogram.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): The help text of the metric.
+            labelnames (tuple): The label names of the metric.
+            buckets (tuple): The upper bounds of the buckets.
+
+        Returns:
+            Histogram: The registered histogram.
+        """
+        return self._register(Histogram, name, documentation, labelnames, buckets)
+
+    def render(self):
+        """
+        Render every metric in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics page.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+    def _register(self, cls, name, *args):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, *args)
+            return self._metrics[name]
+
+
+# Process wide registry
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "chat_mcq_stage_duration_seconds",
+    "Duration of every stage of the MCQ generation and chat pipelines.",
+    ["stage"],
+)
+
+LLM_TOKENS = REGISTRY.counter(
+    "chat_mcq_llm_tokens_total",
+    "Tokens sent to and generated by the OpenAI models.",
+    ["model", "type"],
+)
+
+LLM_COST = REGISTRY.counter(
+    "chat_mcq_llm_cost_usd_total",
+    "Cost in USD of the OpenAI calls.",
+    ["model"],
+)
+
+
+@contextmanager
+def timed(stage):
+    """
+    Record the duration of the block in the stage latency histogram.
+
+    The duration is recorded even when the block raises.
+
+    Args:
+        stage (str): The name of the stage.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+def record_usage(model, usage):
+    """
+    Add the token usage of OpenAI calls to the counters.
+
+    Args:
+        model (str): The name of the OpenAI model.
+        usage (dict): The usage returned by ``usage_from_callback``.
+    """
+    LLM_TOKENS.inc(usage.get("prompt_tokens") or 0, model=model, type="prompt")
+    LLM_TOKENS.inc(usage.get("completion_tokens") or 0, model=model, type="completion")
+    LLM_COST.inc(usage.get("total_cost") or 0, model=model)
@@ -0,0 +1,183 @@
+import json
+
+from sqlalchemy import inspect
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from .extensions import db
+
+
+def upgrade_schema():
+    """
+    Add the columns and indexes missing from tables created by an older version.
+
+    ``db.create_all`` only creates missing tables, so the nullable columns
+    added to existing models since are added here with ``ALTER TABLE``. The
+    existing rows get NULL in the new columns.
+    """
+    inspector = inspect(db.engine)
+
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                connection.execute(
+                    text(
+                        f'ALTER TABLE "{table.name}" '
+                        f'ADD COLUMN "{column.name}" {column_type}'
+                    )
+                )
+
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
+
+# SQLite FTS5 index of the question text, an external content table over
+# "questions" kept in sync by the triggers below
+QUESTION_SEARCH_TABLE = "questions_fts"
+
+QUESTION_SEARCH_TRIGGERS = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS questions_fts_insert AFTER INSERT ON questions
+    BEGIN
+        INSERT INTO {QUESTION_SEARCH_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS questions_fts_delete AFTER DELETE ON questions
+    BEGIN
+        INSERT INTO {QUESTION_SEARCH_TABLE}({QUESTION_SEARCH_TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS questions_fts_update AFTER UPDATE OF text ON questions
+    BEGIN
+        INSERT INTO {QUESTION_SEARCH_TABLE}({QUESTION_SEARCH_TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO {QUESTION_SEARCH_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+)
+
+
+def create_question_search():
+    """
+    Create the full-text index of the question text on SQLite.
+
+    The index is filled by triggers on every insert, update and delete of a
+    question, so the bulk inserts and the group commit writer keep it in sync
+    without any change. When the index is first created, the questions
+    stored before are indexed.
+
+    Returns:
+        bool: True if the index is available, False on other databases or
+            when SQLite was built without FTS5.
+    """
+    if db.engine.dialect.name != "sqlite":
+        return False
+
+    with db.engine.begin() as connection:
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": QUESTION_SEARCH_TABLE},
+        ).first()
+
+        if not exists:
+            try:
+                connection.execute(
+                    text(
+                        f"CREATE VIRTUAL TABLE {QUESTION_SEARCH_TABLE} USING fts5("
+                        "text, content='questions', content_rowid='id', "
+                        "tokenize='unicode61 remove_diacritics 2')"
+                    )
+                )
+            except OperationalError:
+                return False
+
+        for trigger in QUESTION_SEARCH_TRIGGERS:
+            connection.execute(text(trigger))
+
+        # Index the questions stored before the index existed.
+        if not exists:
+            connection.execute(
+                text(
+                    f"INSERT INTO {QUESTION_SEARCH_TABLE}({QUESTION_SEARCH_TABLE}) "
+                    "VALUES ('rebuild')"
+                )
+            )
+
+    return True
+
+
+def migrate_question_blobs(batch_size=500, logger=None):
+    """
+    Copy the questions of the quizzes stored as JSON blobs into the question tables.
+
+    The quizzes are processed in batches of ``batch_size``, each committed on
+    its own, so the migration can be interrupted and run again. The subject
+    and complexity of a quiz are taken from its generation job when it has one.
+
+    Args:
+        batch_size (int): Number of quizzes migrated per transaction.
+        logger (logging.Logger): Logger reporting the progress.
+
+    Returns:
+        int: The number of migrated quizzes.
+    """
+    from .models import MCQ
+    from .models import GenerationJob
+    from .models import Question
+    from .persistence import build_questions
+
+    migrated = 0
+    last_id = 0
+    while True:
+        # Quizzes without any normalized question, by ascending ID.
+        batch = db.session.scalars(
+            db.select(MCQ)
+            .where(MCQ.id > last_id, ~db.exists().where(Question.mcq_id == MCQ.id))
+            .order_by(MCQ.id)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            return migrated
+
+        jobs = {
+            job.mcq_id: job
+            for job in db.session.scalars(
+                db.select(GenerationJob).where(
+                    GenerationJob.mcq_id.in_([mcq_entry.id for mcq_entry in batch])
+                )
+            )
+        }
+
+        for mcq_entry in batch:
+            try:
+                data = json.loads(mcq_entry.mcqs)
+            except ValueError:
+                if logger:
+                    logger.warning(f"Skipping quiz {mcq_entry.id}, invalid JSON.")
+                continue
+
+            job = jobs.get(mcq_entry.id)
+            if job is not None:
+                mcq_entry.subject = mcq_entry.subject or job.subject
+                mcq_entry.complexity = mcq_entry.complexity or job.complexity
+
+            mcq_entry.questions = build_questions(data)
+            migrated += 1
+
+        last_id = batch[-1].id
+        db.session.commit()
+        db.session.expunge_all()
+
+        if logger:
+            logger.info(f"Migrated {migrated} quizzes, up to ID {last_id}.")
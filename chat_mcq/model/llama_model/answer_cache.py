@@ -0,0 +1,205 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def index_version(manifest_path):
+    """
+    Cheap token identifying the ingested index, it changes on every re-ingest.
+
+    Args:
+        manifest_path (str): The path of the ingestion manifest.
+
+    Returns:
+        int: The modification time of the manifest, 0 if it doesn't exist.
+    """
+    try:
+        return os.stat(manifest_path).st_mtime_ns
+    except (OSError, TypeError):
+        return 0
+
+
+class SemanticAnswerCache:
+    """
+    Cache of answers looked up by the meaning of the question.
+
+    The normalized embeddings of the answered questions are kept in one
+    matrix, so a lookup is a single matrix-vector product. A question whose
+    cosine similarity with a cached one reaches ``threshold`` gets the cached
+    answer. Every answer is also indexed by the exact text of its question,
+    so a repeated question is found without embedding it, and answers stored
+    without an embedding are only found that way. Entries expire after
+    ``ttl`` seconds, the least recently used are evicted beyond ``max_size``,
+    and everything is dropped when the index version changes.
+    """
+
+    def __init__(self, threshold=0.92, ttl=86400, max_size=5000):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_size = max_size
+
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._entries = []
+        self._questions = OrderedDict()
+        self._version = None
+        self._stats = {"hits": 0, "misses": 0}
+
+    def lookup_question(self, question, version=None):
+        """
+        Find the cached answer of the same question, without its embedding.
+
+        A miss isn't counted, the caller goes on with ``lookup``.
+
+        Args:
+            question (str): The user's question.
+            version: The current index version, a change clears the cache.
+
+        Returns:
+            dict: The cached answer and sources, None on a miss.
+        """
+        key = self._question_key(question)
+        now = time.time()
+
+        with self._lock:
+            self._check_version(version)
+            entry = self._questions.get(key)
+            if entry is None:
+                return None
+            if now - entry["created"] > self.ttl:
+                del self._questions[key]
+                return None
+
+            entry["last_used"] = now
+            self._questions.move_to_end(key)
+            self._stats["hits"] += 1
+            return dict(entry["answer"], similarity=1.0)
+
+    def lookup(self, vector, version=None):
+        """
+        Find the cached answer of the most similar question.
+
+        Args:
+            vector (list): The embedding of the question, None to only count
+                the miss of ``lookup_question``.
+            version: The current index version, a change clears the cache.
+
+        Returns:
+            dict: The cached answer and sources, None on a miss.
+        """
+        query = None if vector is None else self._normalize(vector)
+        now = time.time()
+
+        with self._lock:
+            self._check_version(version)
+            self._expire(now)
+
+            if self._entries and query is not None:
+                scores = self._vectors[: len(self._entries)] @ query
+                row = int(np.argmax(scores))
+                if scores[row] >= self.threshold:
+                    entry = self._entries[row]
+                    entry["last_used"] = now
+                    self._stats["hits"] += 1
+                    return dict(entry["answer"], similarity=float(scores[row]))
+
+            self._stats["misses"] += 1
+            return None
+
+    def store(self, vector, answer, version=None, question=None):
+        """
+        Cache the answer of the question.
+
+        Args:
+            vector (list): The embedding of the question, None to only index
+                the answer by the text of the question.
+            answer (dict): The JSON serializable answer and sources.
+            version: The index version the answer was generated from.
+            question (str): The user's question, for ``lookup_question``.
+        """
+        now = time.time()
+
+        with self._lock:
+            self._check_version(version)
+            self._expire(now)
+
+            entry = {"answer": answer, "created": now, "last_used": now}
+            if question is not None:
+                key = self._question_key(question)
+                self._questions[key] = entry
+                self._questions.move_to_end(key)
+                while len(self._questions) > self.max_size:
+                    self._questions.popitem(last=False)
+
+            if vector is None:
+                return
+
+            query = self._normalize(vector)
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_size, len(query)), dtype=np.float32)
+
+            if len(self._entries) >= self.max_size:
+                oldest = min(
+                    range(len(self._entries)),
+                    key=lambda row: self._entries[row]["last_used"],
+                )
+                self._remove(oldest)
+
+            self._vectors[len(self._entries)] = query
+            self._entries.append(entry)
+
+    def invalidate(self):
+        """Drop every cached answer."""
+        with self._lock:
+            self._entries = []
+            self._questions.clear()
+
+    def stats(self):
+        """
+        Report the hit and miss counters of the cache.
+
+        Returns:
+            dict: The hits, misses, number of cached answers with an
+                embedding, and of questions indexed by their text.
+        """
+        with self._lock:
+            return dict(
+                self._stats,
+                entries=len(self._entries),
+                questions=len(self._questions),
+            )
+
+    def _check_version(self, version):
+        """Clear the cache when the index was re-ingested."""
+        if version != self._version:
+            self._entries = []
+            self._questions.clear()
+            self._version = version
+
+    def _expire(self, now):
+        """Remove the entries older than the TTL."""
+        for row in reversed(range(len(self._entries))):
+            if now - self._entries[row]["created"] > self.ttl:
+                self._remove(row)
+
+    def _remove(self, row):
+        """Remove an entry by moving the last one into its row."""
+        last = len(self._entries) - 1
+        if row != last:
+            self._vectors[row] = self._vectors[last]
+            self._entries[row] = self._entries[last]
+        self._entries.pop()
+
+    @staticmethod
+    def _question_key(question):
+        """Ignore the case and spacing of the question."""
+        return " ".join(question.lower().split())
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
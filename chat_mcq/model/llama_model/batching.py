@@ -0,0 +1,125 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from typing import Optional
+
+from langchain_core.retrievers import BaseRetriever
+
+from ...metrics import REGISTRY
+
+BATCH_SIZE = REGISTRY.histogram(
+    "chat_mcq_retrieval_batch_size",
+    "Number of chat queries embedded and searched together.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+
+
+class RetrievalBatcher:
+    """
+    Scheduler embedding and searching the concurrent chat queries together.
+
+    The queries submitted within ``max_wait`` seconds of the first one, up to
+    ``max_batch_size``, are embedded with a single ``embed_documents`` call
+    and searched with a single batched similarity search when the vector
+    store supports it. Stores without batch search get the queries of the
+    batch searched concurrently, so their network round trips overlap. A
+    query arriving alone only waits ``max_wait`` more than before.
+    """
+
+    def __init__(self, embeddings, docsearch, k=2, max_batch_size=32, max_wait=0.005):
+        self.embeddings = embeddings
+        self.docsearch = docsearch
+        self.k = k
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self._queue = queue.Queue()
+        self._executor = None
+        self._thread = threading.Thread(
+            target=self._run, name="retrieval-batcher", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, query: str):
+        """
+        Queue the query for the next batch.
+
+        Args:
+            query (str): The user's question.
+
+        Returns:
+            Future: Resolves to the retrieved documents, best match first.
+        """
+        future = Future()
+        self._queue.put((query, future))
+        return future
+
+    def _run(self):
+        """Collect the queued queries into batches and retrieve them."""
+        while True:
+            batch = [self._queue.get()]
+
+            # Wait a little for the queries of concurrent requests.
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(
+                        self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                    )
+                except queue.Empty:
+                    break
+
+            BATCH_SIZE.observe(len(batch))
+            try:
+                results = self._retrieve([query for query, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            else:
+                for (_, future), documents in zip(batch, results):
+                    future.set_result(documents)
+
+    def _retrieve(self, queries):
+        """
+        Embed the queries in one pass and search them.
+
+        Args:
+            queries (list): The questions of the batch.
+
+        Returns:
+            list: The retrieved documents of every query.
+        """
+        vectors = self.embeddings.embed_documents(queries)
+
+        if hasattr(self.docsearch, "batch_similarity_search_with_score_by_vector"):
+            hits = self.docsearch.batch_similarity_search_with_score_by_vector(
+                vectors, k=self.k
+            )
+            return [[doc for doc, _ in query_hits] for query_hits in hits]
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_batch_size, thread_name_prefix="retrieval"
+            )
+
+        return list(
+            self._executor.map(
+                lambda vector: self.docsearch.similarity_search_by_vector(
+                    vector, k=self.k
+                ),
+                vectors,
+            )
+        )
+
+
+class BatchingRetriever(BaseRetriever):
+    """Retriever handing its queries to a shared ``RetrievalBatcher``."""
+
+    batcher: Any
+    timeout: Optional[float] = None
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        return self.batcher.submit(query).result(timeout=self.timeout)
@@ -0,0 +1,208 @@
+import re
+from typing import Any
+from typing import Callable
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from ...utils.text_utils import STOPWORDS
+
+# Number of chunks retrieved when the context isn't packed
+DEFAULT_K = 2
+
+# Min word level Jaccard similarity for two passages to count as duplicates
+DUPLICATE_THRESHOLD = 0.9
+
+# Shortest and longest shared text trimmed between two chunks of a source,
+# the splitter overlaps consecutive chunks by up to 20 characters
+MIN_OVERLAP = 8
+MAX_OVERLAP = 200
+
+
+def candidate_count(config):
+    """
+    Number of chunks to retrieve for one question.
+
+    Args:
+        config (dict): The application config.
+
+    Returns:
+        int: ``CONTEXT_CANDIDATES`` when the context is packed into a token
+            budget, else the top 2 chunks.
+    """
+    if config.get("CONTEXT_TOKEN_BUDGET"):
+        return config.get("CONTEXT_CANDIDATES", 8)
+    return DEFAULT_K
+
+
+def token_counter(llm):
+    """
+    Build the function counting tokens with the tokenizer of the model.
+
+    Args:
+        llm (LLM): The model the prompt is sent to.
+
+    Returns:
+        Callable: Counts the tokens of a text. Falls back to four characters
+            per token when the model doesn't expose its tokenizer.
+    """
+    client = getattr(llm, "client", None)
+    if client is not None and hasattr(client, "tokenize"):
+        return lambda text: len(client.tokenize(text))
+
+    return lambda text: max(1, len(text) // 4)
+
+
+def _terms(text):
+    """Lowercase the text and keep its words, without the stopwords."""
+    return set(re.findall(r"\w+", text.lower())) - STOPWORDS
+
+
+def rerank(query, documents):
+    """
+    Order the candidates by their retrieval rank and their coverage of the question.
+
+    Both signals are in [0, 1] and weighted equally. The coverage is the share
+    of the question's words found in the passage, which promotes passages
+    containing the exact names and terms asked about.
+
+    Args:
+        query (str): The user's question.
+        documents (list): The candidates, best vector match first.
+
+    Returns:
+        list: The candidates, best first.
+    """
+    query_terms = _terms(query)
+    scored = []
+    for rank, doc in enumerate(documents):
+        rank_score = 1 - rank / len(documents)
+        coverage = 0.0
+        if query_terms:
+            coverage = len(query_terms & _terms(doc.page_content)) / len(query_terms)
+        scored.append((0.5 * rank_score + 0.5 * coverage, rank, doc))
+
+    scored.sort(key=lambda item: (-item[0], item[1]))
+    return [doc for _, _, doc in scored]
+
+
+def strip_overlap(kept, text):
+    """
+    Remove from the text what it shares with the start or end of a kept passage.
+
+    Args:
+        kept (str): A passage already in the context.
+        text (str): The next passage of the same source.
+
+    Returns:
+        str: The text without the shared prefix or suffix.
+    """
+    limit = min(len(kept), len(text), MAX_OVERLAP)
+    for size in range(limit, MIN_OVERLAP - 1, -1):
+        # The text continues the kept passage.
+        if kept.endswith(text[:size]):
+            return text[size:].strip()
+
+        # The text precedes the kept passage.
+        if kept.startswith(text[-size:]):
+            return text[:-size].strip()
+
+    return text
+
+
+def _is_duplicate(text, packed):
+    """Whether the text is contained in, or nearly the same as, a kept passage."""
+    words = set(text.lower().split())
+    for doc in packed:
+        if text in doc.page_content:
+            return True
+
+        kept_words = set(doc.page_content.lower().split())
+        union = words | kept_words
+        if union and len(words & kept_words) / len(union) >= DUPLICATE_THRESHOLD:
+            return True
+
+    return False
+
+
+def _truncate(text, count_tokens, budget):
+    """Cut the text at a word boundary so that it fits in the budget."""
+    while text and count_tokens(text) > budget:
+        cut = max(1, int(len(text) * budget / count_tokens(text) * 0.95))
+        text = text[:cut].rsplit(" ", 1)[0] if " " in text[:cut] else text[:cut]
+    return text
+
+
+def pack_context(query, documents, count_tokens, budget):
+    """
+    Select the passages sent to the model within a token budget.
+
+    The candidates are reranked, the text shared with the already selected
+    chunks of the same source is trimmed, duplicates are dropped, and the
+    passages are added best first while they fit. The best passage is
+    truncated when it alone exceeds the budget.
+
+    Args:
+        query (str): The user's question.
+        documents (list): The retrieved candidates, best vector match first.
+        count_tokens (Callable): Counts the tokens of a text.
+        budget (int): Max number of context tokens.
+
+    Returns:
+        list: The packed passages, best first.
+    """
+    packed = []
+    used = 0
+    for doc in rerank(query, documents):
+        text = doc.page_content.strip()
+        for kept in packed:
+            if text and kept.metadata.get("source") == doc.metadata.get("source"):
+                text = strip_overlap(kept.page_content, text)
+
+        if not text or _is_duplicate(text, packed):
+            continue
+
+        tokens = count_tokens(text)
+        if used + tokens > budget:
+            if packed:
+                continue
+            text = _truncate(text, count_tokens, budget)
+            tokens = count_tokens(text)
+
+        packed.append(Document(page_content=text, metadata=doc.metadata))
+        used += tokens
+        if used >= budget:
+            break
+
+    return packed
+
+
+class ContextPackingRetriever(BaseRetriever):
+    """Retriever packing the candidates of another retriever into a token budget."""
+
+    retriever: Any
+    count_tokens: Callable[[str], int]
+    budget: int
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        documents = self.retriever.invoke(query)
+        return pack_context(query, documents, self.count_tokens, self.budget)
+
+
+def pack_retrieved(retriever, query, documents):
+    """
+    Pack documents retrieved outside of a QA object like its retriever would.
+
+    Args:
+        retriever (BaseRetriever): The retriever of the QA object.
+        query (str): The user's question.
+        documents (list): The candidates of ``QAEngine.retrieve``.
+
+    Returns:
+        list: The packed passages when the retriever packs the context, else
+            the documents unchanged.
+    """
+    if isinstance(retriever, ContextPackingRetriever):
+        return pack_context(query, documents, retriever.count_tokens, retriever.budget)
+
+    return documents
@@ -0,0 +1,136 @@
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError
+from functools import lru_cache
+from typing import Any
+from typing import Optional
+
+from langchain_core.retrievers import BaseRetriever
+
+from ...metrics import REGISTRY
+from ...metrics import timed
+
+# Retrieval modes of the chat context
+RETRIEVAL_MODES = ("vector", "lexical", "hybrid")
+
+RETRIEVAL_PATHS = REGISTRY.counter(
+    "chat_mcq_retrieval_path_total",
+    "Chat retrievals by the indexes that answered them.",
+    ["path"],
+)
+
+
+@lru_cache(maxsize=1)
+def vector_executor():
+    """Threads running the vector searches of the hybrid retrievals."""
+    return ThreadPoolExecutor(max_workers=32, thread_name_prefix="hybrid-vector")
+
+
+def reciprocal_rank_fusion(rankings, k, rrf_k=60):
+    """
+    Merge several rankings of documents with reciprocal rank fusion.
+
+    Every document scores ``1 / (rrf_k + rank)`` in every ranking it appears
+    in, so the scales of the BM25 and cosine scores don't matter.
+
+    Args:
+        rankings (list): The lists of documents, best first.
+        k (int): Number of documents to return.
+        rrf_k (int): Dampens the weight of the first ranks.
+
+    Returns:
+        list: The fused documents, best first.
+    """
+    scores = {}
+    documents = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = doc.page_content
+            scores[key] = scores.get(key, 0.0) + 1 / (rrf_k + rank)
+            documents.setdefault(key, doc)
+
+    ordered = sorted(scores, key=lambda key: -scores[key])
+    return [documents[key] for key in ordered[:k]]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever combining the BM25 index with the vector search.
+
+    In "lexical" mode only the BM25 index is searched, and in "vector" mode
+    only the vector retriever. In "hybrid" mode both rankings are fused with
+    reciprocal rank fusion, except when the best BM25 match reaches
+    ``fast_path_confidence``: the question then names the terms of a chunk
+    and the embedding and vector search are skipped. The vector search gets
+    ``vector_timeout`` seconds, after which, or when it fails, the BM25
+    ranking is used alone.
+    """
+
+    lexical: Any
+    vector: Any
+    mode: str = "hybrid"
+    k: int = 2
+    rrf_k: int = 60
+    fast_path_confidence: Optional[float] = None
+    vector_timeout: Optional[float] = None
+
+    def skips_embedding(self, query):
+        """
+        Tell if the question is retrieved without the embedding model.
+
+        Lets the caller skip embedding the question for other purposes, e.g.
+        the answer cache lookup, when the retrieval doesn't need it either.
+
+        Args:
+            query (str): The user's question.
+
+        Returns:
+            bool: True in "lexical" mode, and in "hybrid" mode when the
+                question takes the fast path.
+        """
+        if self.mode != "hybrid":
+            return self.mode == "lexical"
+
+        hits, confidence = self.lexical.search(query, k=self.k)
+        return self._fast_path(hits, confidence)
+
+    def _fast_path(self, hits, confidence):
+        """Tell if the BM25 ranking is confident enough to be used alone."""
+        return (
+            self.fast_path_confidence is not None
+            and confidence >= self.fast_path_confidence
+            and len(hits) >= self.k
+        )
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        if self.mode == "vector":
+            RETRIEVAL_PATHS.inc(path="vector")
+            return self.vector.invoke(query)
+
+        # BM25 takes a few milliseconds, it decides if the vector search runs.
+        with timed("lexical_search"):
+            hits, confidence = self.lexical.search(query, k=self.k)
+        lexical = [doc for doc, _ in hits]
+
+        if self.mode == "lexical":
+            RETRIEVAL_PATHS.inc(path="lexical")
+            return lexical
+
+        if self._fast_path(hits, confidence):
+            RETRIEVAL_PATHS.inc(path="lexical_fast_path")
+            return lexical
+
+        # Answer from BM25 alone when the vector search is slow or down.
+        future = vector_executor().submit(self.vector.invoke, query)
+        try:
+            vector = future.result(timeout=self.vector_timeout)
+        except TimeoutError:
+            RETRIEVAL_PATHS.inc(path="vector_timeout")
+            return lexical
+        except Exception:
+            if not lexical:
+                raise
+            RETRIEVAL_PATHS.inc(path="vector_error")
+            return lexical
+
+        RETRIEVAL_PATHS.inc(path="hybrid")
+        return reciprocal_rank_fusion([lexical, vector], self.k, self.rrf_k)
@@ -2,9 +2,18 @@ from flask import current_app
 from langchain.chains import RetrievalQA
 from langchain.prompts import PromptTemplate
 from langchain_community.llms import CTransformers
-from langchain_community.vectorstores import Pinecone as PC
 
+from ...utils.embedding_cache import CachedEmbeddings
 from ...utils.opensource_utils import download_hugging_face_embeddings
+from ...utils.opensource_utils import embeddings_cache_key
+from ...utils.opensource_utils import embeddings_options
+from ...utils.vectorstore_utils import get_vector_store
+from ...vectorstores.bm25_index import BM25Index
+from .context import ContextPackingRetriever
+from .context import candidate_count
+from .context import token_counter
+from .hybrid import RETRIEVAL_MODES
+from .hybrid import HybridRetriever
 
 # Template for generating responses using the provided context and question
 prompt_template = """
@@ -19,44 +28,194 @@ Helpful answer:
 """
 
 
-def get_qa_object():
+def get_embeddings():
     """
-    Creates and returns a QA object for processing questions and answers.
+    Loads the embeddings model, behind the vector cache if one is configured.
 
-    This function downloads the embeddings model, retrieves the Pinecone index,
-    and initializes the QA object using the specified LLM and prompt template.
+    When ``MODEL_SERVER_URL`` is set, the texts are embedded by the model
+    server instead of a model loaded in this process.
 
     Returns:
-        RetrievalQA: The QA object for processing questions and answers.
+        Embeddings: The embeddings model used to embed the queries.
     """
+    config = current_app.config
+    if config.get("MODEL_SERVER_URL"):
+        from ...model_server.client import ModelServerEmbeddings
+        from ...model_server.client import model_server_client
+
+        embeddings = ModelServerEmbeddings(client=model_server_client(config))
+        if config.get("EMBEDDING_CACHE_PATH"):
+            embeddings = CachedEmbeddings(
+                embeddings,
+                embeddings_cache_key(
+                    config.get("EMBEDDINGS_BACKEND", "torch"),
+                    config.get("ONNX_QUANTIZE", True),
+                ),
+                path=config["EMBEDDING_CACHE_PATH"],
+                memory_size=config.get("EMBEDDING_CACHE_MEMORY_SIZE", 10000),
+            )
+        return embeddings
+
     # Download the embeddings from the Hugging Face open-source model
-    embeddings = download_hugging_face_embeddings()
+    return download_hugging_face_embeddings(
+        cache_path=config.get("EMBEDDING_CACHE_PATH"),
+        cache_memory_size=config.get("EMBEDDING_CACHE_MEMORY_SIZE", 10000),
+        **embeddings_options(config),
+    )
+
+
+def get_docsearch(embeddings):
+    """
+    Connects to the existing vector index using the provided embeddings.
+
+    Args:
+        embeddings (Embeddings): The embeddings model used to embed queries.
+
+    Returns:
+        VectorStore: The vector store holding the ingested text chunks.
+    """
+    # Open the backend selected in the application configuration
+    return get_vector_store(embeddings, current_app.config)
+
+
+def load_llm(config, threads=None):
+    """
+    Loads the open source llama model used to generate the answers.
+
+    Args:
+        config (dict): The application config.
+        threads (int): Number of CPU threads of the generation, defaults to
+            the ctransformers choice.
+
+    Returns:
+        CTransformers: The LLM running on the CPU.
+    """
+    model_config = {"max_new_tokens": 1024, "temperature": 0.8}
+    if threads:
+        model_config["threads"] = threads
+
+    # Initialize the LLM using CTransformers for CPU environment
+    return CTransformers(
+        model=config["OPEN_SOURCE_PRETRAINED_MODEL_PATH"],
+        model_type="llama",
+        config=model_config,
+    )
+
+
+def get_llm():
+    """
+    Loads the LLM used to generate the answers.
+
+    Returns:
+        LLM: The llama model of the model server when ``MODEL_SERVER_URL`` is
+            set, else the llama model loaded in this process.
+    """
+    config = current_app.config
+    if config.get("MODEL_SERVER_URL"):
+        from ...model_server.client import ModelServerLLM
+        from ...model_server.client import model_server_client
+
+        return ModelServerLLM(client=model_server_client(config))
+
+    return load_llm(config)
 
-    # Get the Pinecone index name from the application configuration
-    index_name = current_app.config["PINECONE_INDEX_NAME"]
 
-    # Load the Pinecone index using the embeddings
-    docsearch = PC.from_existing_index(index_name, embeddings)
+def get_retriever(docsearch, vector_retriever=None):
+    """
+    Creates the retriever of the ``RETRIEVAL_MODE`` config.
+
+    Args:
+        docsearch (VectorStore): The vector store used for retrieval.
+        vector_retriever (BaseRetriever): Retriever to use instead of searching
+            the vector store directly, e.g. a ``BatchingRetriever``.
 
+    Returns:
+        BaseRetriever: The vector retriever, or a ``HybridRetriever`` over it
+            and the BM25 index in "lexical" and "hybrid" modes.
+
+    Raises:
+        ValueError: If the configured mode is unknown.
+    """
+    config = current_app.config
+    k = candidate_count(config)
+    vector_retriever = vector_retriever or docsearch.as_retriever(
+        search_kwargs={"k": k}
+    )
+
+    mode = config.get("RETRIEVAL_MODE", "vector")
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(
+            f"Unsupported retrieval mode {mode!r}, use one of {RETRIEVAL_MODES}."
+        )
+    if mode == "vector":
+        return vector_retriever
+
+    # Open the BM25 index built by script.py next to the vectors
+    return HybridRetriever(
+        lexical=BM25Index.load(config["BM25_INDEX_DIR"]),
+        vector=vector_retriever,
+        mode=mode,
+        k=k,
+        rrf_k=config.get("HYBRID_RRF_K", 60),
+        fast_path_confidence=config.get("HYBRID_FAST_PATH_CONFIDENCE"),
+        vector_timeout=config.get("HYBRID_VECTOR_TIMEOUT"),
+    )
+
+
+def build_qa(llm, docsearch, retriever=None):
+    """
+    Creates the RetrievalQA chain from an already loaded LLM and vector store.
+
+    Args:
+        llm (LLM): The LLM used to answer the question.
+        docsearch (VectorStore): The vector store used for retrieval.
+        retriever (BaseRetriever): Retriever to use instead of the one of
+            ``get_retriever``.
+
+    When ``CONTEXT_TOKEN_BUDGET`` is set, ``CONTEXT_CANDIDATES`` chunks are
+    retrieved and packed into that many tokens of the model's tokenizer.
+
+    Returns:
+        RetrievalQA: The QA object for processing questions and answers.
+    """
     # Create the prompt template for the QA system
     PROMPT = PromptTemplate(
         template=prompt_template, input_variables=["context", "question"]
     )
 
-    # Initialize the LLM using CTransformers for CPU environment
-    llm = CTransformers(
-        model=current_app.config["OPEN_SOURCE_PRETRAINED_MODEL_PATH"],
-        model_type="llama",
-        config={"max_new_tokens": 1024, "temperature": 0.8},
-    )
+    # Retrieve the candidates and pack them into the context token budget
+    config = current_app.config
+    retriever = retriever or get_retriever(docsearch)
+    if config.get("CONTEXT_TOKEN_BUDGET"):
+        retriever = ContextPackingRetriever(
+            retriever=retriever,
+            count_tokens=token_counter(llm),
+            budget=config["CONTEXT_TOKEN_BUDGET"],
+        )
 
     # Create the QA object using the LLM and retriever
     qa = RetrievalQA.from_chain_type(
         llm=llm,
         chain_type="stuff",
-        retriever=docsearch.as_retriever(search_kwargs={"k": 2}),
+        retriever=retriever,
         return_source_documents=True,
         chain_type_kwargs={"prompt": PROMPT},
     )
 
     return qa
+
+
+def get_qa_object():
+    """
+    Creates and returns a QA object for processing questions and answers.
+
+    This function downloads the embeddings model, opens the vector index,
+    and initializes the QA object using the specified LLM and prompt template.
+
+    Prefer the process wide ``qa_engine`` for serving requests, it keeps the
+    loaded models warm instead of rebuilding them on every call.
+
+    Returns:
+        RetrievalQA: The QA object for processing questions and answers.
+    """
+    return build_qa(get_llm(), get_docsearch(get_embeddings()))
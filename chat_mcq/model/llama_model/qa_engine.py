@@ -0,0 +1,390 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Flask
+
+from .answer_cache import SemanticAnswerCache
+from .answer_cache import index_version
+
+# Put in the idle queue when a build fails, the waiter getting it builds the
+# missing instance instead of waiting for a release that won't come
+_RETRY = object()
+
+
+class QAEngineBusy(Exception):
+    """Raised when no QA instance became free within the wait timeout."""
+
+
+class QAEngine:
+    """
+    Process wide pool of warm RetrievalQA objects.
+
+    The embeddings model and the vector index connection are loaded once and
+    shared, while every pool slot owns its own llama model so that at most
+    ``QA_POOL_SIZE`` generations run at the same time. Requests that find
+    every slot busy wait in a queue until one is released. The state is
+    "cold" until an instance is loaded, "warming" while the first one loads,
+    "warm" once one is ready and "failed" when no instance could be loaded.
+    """
+
+    def __init__(self, app: Flask = None):
+        self.app = None
+        self.size = 1
+        self.timeout = None
+
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._reset()
+
+        if app is not None:
+            self.init_app(app)
+
+    def _reset(self):
+        """Drop the loaded instances and shared models, back to the cold state."""
+        self.state = "cold"
+        self.error = None
+        self._idle = queue.Queue()
+        self._created = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._embeddings = None
+        self._docsearch = None
+        self._retriever = None
+        self.answer_cache = None
+
+    def init_app(self, app: Flask):
+        """
+        Bind the engine to the Flask application and optionally preload it.
+
+        The engine is process wide, binding it again drops the instances of
+        the previous app.
+
+        Args:
+            app (Flask): The Flask application instance.
+        """
+        with self._lock, self._load_lock:
+            self._reset()
+
+        self.app = app
+        self.size = max(1, int(app.config.get("QA_POOL_SIZE", 1)))
+        self.timeout = app.config.get("QA_POOL_TIMEOUT")
+        app.extensions["qa_engine"] = self
+
+        if app.config.get("ANSWER_CACHE_ENABLED"):
+            self.answer_cache = SemanticAnswerCache(
+                threshold=app.config.get("ANSWER_CACHE_THRESHOLD", 0.92),
+                ttl=app.config.get("ANSWER_CACHE_TTL", 86400),
+                max_size=app.config.get("ANSWER_CACHE_MAX_SIZE", 5000),
+            )
+
+        # Load the models in the background so the worker can serve the
+        # other pages while the weights are being read.
+        if app.config.get("QA_PRELOAD"):
+            threading.Thread(
+                target=self.warm_up, name="qa-engine-warm-up", daemon=True
+            ).start()
+
+    def warm_up(self):
+        """Load the shared retriever and fill every slot of the pool."""
+        while True:
+            with self._lock:
+                if self._created >= self.size:
+                    return
+                self._created += 1
+
+            try:
+                qa = self._build()
+            except Exception as e:
+                self._build_failed(e)
+                self.app.logger.exception("Failed to warm up the QA engine.")
+                return
+
+            self._idle.put(qa)
+
+    @contextmanager
+    def acquire(self, timeout: float = None):
+        """
+        Borrow a QA object from the pool for the duration of the block.
+
+        Args:
+            timeout (float): Seconds to wait for a free instance. Defaults to
+                the ``QA_POOL_TIMEOUT`` config, ``None`` waits forever.
+
+        Yields:
+            RetrievalQA: A ready to use QA object.
+
+        Raises:
+            QAEngineBusy: If no instance became free within the timeout.
+        """
+        # Give the instance back to its own pool, even if the engine was bound
+        # to another app meanwhile.
+        idle = self._idle
+        qa = self._checkout(self.timeout if timeout is None else timeout)
+        try:
+            yield qa
+        finally:
+            with self._lock:
+                if idle is self._idle:
+                    self._in_use -= 1
+            idle.put(qa)
+
+    def retrieve(self, query: str, callbacks: list = None):
+        """
+        Retrieve the candidate documents of the question.
+
+        Runs on the retriever shared by every instance, before an instance is
+        borrowed, so the queries of concurrent requests reach the retrieval
+        batcher together instead of one per free pool slot. Pack the result
+        with ``pack_retrieved`` and the retriever of the borrowed instance.
+
+        Args:
+            query (str): The user's question.
+            callbacks (list): LangChain callback handlers of the retrieval.
+
+        Returns:
+            list: The retrieved documents, best match first.
+        """
+        self._load_shared()
+        return self._retriever.invoke(query, config={"callbacks": callbacks or []})
+
+    def cached_answer(self, query: str):
+        """
+        Look up the answer of a previously asked, similar enough question.
+
+        The same question is first looked up by its text. The question is
+        then only embedded for the similarity lookup when its retrieval needs
+        the embedding too, so the BM25 fast path and the "lexical" mode never
+        run the embedding model: their questions are only matched by text.
+
+        Args:
+            query (str): The user's question.
+
+        Returns:
+            tuple: The cached answer (None on a miss or when the cache is
+                disabled), and the embedding of the question to pass to
+                ``remember_answer``, None when it wasn't computed.
+        """
+        if self.answer_cache is None:
+            return None, None
+
+        version = index_version(self.app.config.get("INGEST_MANIFEST_PATH"))
+        cached = self.answer_cache.lookup_question(query, version)
+        if cached is not None:
+            return cached, None
+
+        if self.skips_embedding(query):
+            return self.answer_cache.lookup(None, version), None
+
+        vector = self.embeddings.embed_query(query)
+        return self.answer_cache.lookup(vector, version), vector
+
+    def skips_embedding(self, query: str):
+        """
+        Tell if the question is retrieved without the embedding model.
+
+        Args:
+            query (str): The user's question.
+
+        Returns:
+            bool: True when the shared retriever answers it from BM25 alone.
+        """
+        from .hybrid import HybridRetriever
+
+        self._load_shared()
+        if not isinstance(self._retriever, HybridRetriever):
+            return False
+
+        return self._retriever.skips_embedding(query)
+
+    def remember_answer(self, query: str, vector, answer: str, sources: list):
+        """
+        Store a generated answer in the semantic answer cache.
+
+        Args:
+            query (str): The user's question.
+            vector (list): The embedding returned by ``cached_answer``, None
+                to only cache the answer by the text of the question.
+            answer (str): The generated answer.
+            sources (list): The serialized source documents of the answer.
+        """
+        if self.answer_cache is None:
+            return
+
+        version = index_version(self.app.config.get("INGEST_MANIFEST_PATH"))
+        self.answer_cache.store(
+            vector,
+            {"result": answer, "source_documents": sources},
+            version,
+            question=query,
+        )
+
+    @property
+    def embeddings(self):
+        """The shared embeddings model, loaded on first use."""
+        self._load_shared()
+        return self._embeddings
+
+    def status(self):
+        """
+        Report the warm/cold state and the load of the pool.
+
+        Returns:
+            dict: The state of the engine.
+        """
+        embedding_cache = None
+        if hasattr(self._embeddings, "stats"):
+            embedding_cache = self._embeddings.stats()
+
+        answer_cache = None
+        if self.answer_cache is not None:
+            answer_cache = self.answer_cache.stats()
+
+        model_server = None
+        if self.app.config.get("MODEL_SERVER_URL"):
+            from ...model_server.client import model_server_client
+
+            model_server = model_server_client(self.app.config).health()
+
+        with self._lock:
+            return {
+                "answer_cache": answer_cache,
+                "embedding_cache": embedding_cache,
+                "model_server": model_server,
+                "state": self.state,
+                "error": self.error,
+                "pool_size": self.size,
+                "instances_loaded": self._created,
+                "available": self._idle.qsize(),
+                "in_use": self._in_use,
+                "waiting": self._waiting,
+            }
+
+    def _checkout(self, timeout):
+        """Take an idle instance, build a new one, or wait for a release."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                qa = self._idle.get_nowait()
+            except queue.Empty:
+                qa = None
+
+            if qa is None:
+                with self._lock:
+                    grow = self._created < self.size
+                    if grow:
+                        self._created += 1
+                    else:
+                        self._waiting += 1
+
+                if grow:
+                    try:
+                        qa = self._build()
+                    except Exception as e:
+                        self._build_failed(e)
+                        raise
+                else:
+                    remaining = None
+                    if deadline is not None:
+                        remaining = max(deadline - time.monotonic(), 0)
+                    try:
+                        qa = self._idle.get(timeout=remaining)
+                    except queue.Empty:
+                        raise QAEngineBusy(
+                            f"All {self.size} QA instances are busy, try again later."
+                        )
+                    finally:
+                        with self._lock:
+                            self._waiting -= 1
+
+            # A build failed, its slot is free again.
+            if qa is not _RETRY:
+                break
+
+        with self._lock:
+            self._in_use += 1
+        return qa
+
+    def _build_failed(self, error):
+        """
+        Free the slot of an instance that failed to build.
+
+        The engine is "failed" when no instance is loaded, and a waiter is
+        woken up to build the instance again.
+
+        Args:
+            error (Exception): The error of the build.
+        """
+        with self._lock:
+            self._created -= 1
+            self.error = str(error)
+            if not self._created:
+                self.state = "failed"
+            wake = self._waiting > 0
+
+        if wake:
+            self._idle.put(_RETRY)
+
+    def _load_shared(self):
+        """
+        Load the embeddings, the vector store and the retriever shared by
+        every instance.
+        """
+        from .batching import BatchingRetriever
+        from .batching import RetrievalBatcher
+        from .context import candidate_count
+        from .llama_qa import get_docsearch
+        from .llama_qa import get_embeddings
+        from .llama_qa import get_retriever
+
+        if self._docsearch is not None:
+            return
+
+        with self._load_lock:
+            if self._docsearch is None:
+                with self.app.app_context():
+                    embeddings = get_embeddings()
+                    docsearch = get_docsearch(embeddings)
+
+                # Embed and search the queries of concurrent requests together.
+                if self.app.config.get("RETRIEVAL_BATCHING"):
+                    batcher = RetrievalBatcher(
+                        embeddings,
+                        docsearch,
+                        k=candidate_count(self.app.config),
+                        max_batch_size=self.app.config.get(
+                            "RETRIEVAL_BATCH_MAX_SIZE", 32
+                        ),
+                        max_wait=self.app.config.get("RETRIEVAL_BATCH_MAX_WAIT", 0.005),
+                    )
+                    self._retriever = BatchingRetriever(batcher=batcher)
+
+                # Search the BM25 index too in the lexical and hybrid modes.
+                with self.app.app_context():
+                    self._retriever = get_retriever(docsearch, self._retriever)
+
+                self._embeddings = embeddings
+                self._docsearch = docsearch
+
+    def _build(self):
+        """Build one more QA object, loading the shared parts on first use."""
+        from .llama_qa import build_qa
+        from .llama_qa import get_llm
+
+        start_time = time.time()
+        with self._lock:
+            if self.state in ("cold", "failed"):
+                self.state = "warming"
+
+        self._load_shared()
+        with self.app.app_context():
+            qa = build_qa(get_llm(), self._docsearch, self._retriever)
+
+        with self._lock:
+            self.state = "warm"
+            self.error = None
+        self.app.logger.info(
+            f"{round(time.time() - start_time, 2)}s time taken to load a QA instance."
+        )
+        return qa
@@ -0,0 +1,185 @@
+import json
+import queue
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from ...metrics import STAGE_SECONDS
+from ...metrics import timed
+from .context import pack_retrieved
+
+# Seconds between keep-alive comments while nothing else is sent. Writing to
+# the socket is the only way to notice that the client went away.
+KEEPALIVE_INTERVAL = 15
+
+
+class GenerationCancelled(Exception):
+    """Raised inside the LLM callback to stop generating for a gone client."""
+
+
+class TokenQueueHandler(BaseCallbackHandler):
+    """Callback handler pushing every generated token onto a queue."""
+
+    # Let GenerationCancelled propagate out of the LLM instead of being logged.
+    raise_error = True
+
+    def __init__(self):
+        self.events = queue.Queue()
+        self.cancelled = threading.Event()
+
+    def on_llm_new_token(self, token: str, **kwargs):
+        if self.cancelled.is_set():
+            raise GenerationCancelled()
+
+        self.events.put(("token", token))
+
+
+class StageTimingHandler(BaseCallbackHandler):
+    """
+    LangChain callback handler timing the retriever and LLM runs of a chain.
+
+    Used for chains like ``RetrievalQA`` whose steps can't be wrapped in
+    ``timed`` from the outside.
+    """
+
+    def __init__(self, retriever_stage="vector_search", llm_stage="llama_generation"):
+        self.retriever_stage = retriever_stage
+        self.llm_stage = llm_stage
+        self._starts = {}
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self._starts[run_id] = time.perf_counter()
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._finish(run_id, self.retriever_stage)
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, self.retriever_stage)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._starts[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._finish(run_id, self.llm_stage)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, self.llm_stage)
+
+    def _finish(self, run_id, stage):
+        start = self._starts.pop(run_id, None)
+        if start is not None:
+            STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+def format_sse(event: str, data):
+    """
+    Format one Server-Sent Event.
+
+    Args:
+        event (str): The event name.
+        data: JSON serializable payload of the event.
+
+    Returns:
+        str: The event ready to be written to the response.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def serialize_documents(documents):
+    """
+    Convert the retrieved documents to JSON serializable dicts.
+
+    Args:
+        documents (list): The documents returned by the retriever.
+
+    Returns:
+        list: The page content and metadata of every document.
+    """
+    return [
+        {"page_content": doc.page_content, "metadata": doc.metadata}
+        for doc in documents
+    ]
+
+
+def stream_answer(engine, msg: str):
+    """
+    Answer the message and yield the result as Server-Sent Events.
+
+    The retrieved source documents are sent first as a ``sources`` event,
+    followed by one ``token`` event per generated token and a final ``done``
+    event with the full answer. When the client disconnects the generator is
+    closed, which cancels the generation at the next token and releases the
+    QA instance back to the pool.
+
+    Args:
+        engine (QAEngine): The pool to borrow the QA object from.
+        msg (str): The user's question.
+
+    Yields:
+        str: The formatted Server-Sent Events.
+    """
+    handler = TokenQueueHandler()
+
+    def generate():
+        try:
+            # Answer from the cache if a similar question was answered before.
+            cached, vector = engine.cached_answer(msg)
+            if cached:
+                handler.events.put(("sources", cached["source_documents"]))
+                handler.events.put(("done", cached["result"]))
+                return
+
+            # Retrieve before borrowing a QA object, so concurrent
+            # retrievals are batched instead of queuing for a pool slot.
+            with timed("vector_search"):
+                documents = engine.retrieve(msg)
+
+            with engine.acquire() as qa:
+                # Send the sources before the slow generation starts.
+                documents = pack_retrieved(qa.retriever, msg, documents)
+                sources = serialize_documents(documents)
+                handler.events.put(("sources", sources))
+
+                if handler.cancelled.is_set():
+                    return
+
+                with timed("llama_generation"):
+                    result = qa.combine_documents_chain.invoke(
+                        {"input_documents": documents, "question": msg},
+                        config={"callbacks": [handler]},
+                    )
+                handler.events.put(("done", result["output_text"]))
+
+            engine.remember_answer(msg, vector, result["output_text"], sources)
+
+        except GenerationCancelled:
+            engine.app.logger.info(f"Generation cancelled for query: {msg}")
+
+        except Exception as e:
+            engine.app.logger.exception("Failed to stream the answer.")
+            handler.events.put(("error", str(e)))
+
+        finally:
+            handler.events.put(None)
+
+    threading.Thread(target=generate, name="qa-stream", daemon=True).start()
+
+    try:
+        while True:
+            try:
+                item = handler.events.get(timeout=KEEPALIVE_INTERVAL)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+
+            if item is None:
+                break
+
+            event, data = item
+            yield format_sse(event, data)
+
+    finally:
+        # Runs on normal completion as well as on GeneratorExit when the
+        # client disconnects.
+        handler.cancelled.set()
@@ -1,23 +1,36 @@
-# imporing necessary packages packages from langchain
-from langchain.chains import LLMChain
-from langchain.chains import SequentialChain
-from langchain.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
-
-# Initializing the openai GPT-4o model.
-llm = ChatOpenAI(
-    # LLM model
-    model="gpt-4o",
-    # Temparature defines the creativity.
-    # The higher the number, higher the creativity.
-    temperature=0.7,
-    # Number of max tokens that the model can accept
-    max_tokens=None,
-    # Timeout if the response is not generated
-    timeout=None,
-    # Max no. of retries
-    max_retries=2,
-)
+# The langchain packages are imported and the OpenAI client is built on first
+# use, they take seconds the app shouldn't spend at startup
+from functools import lru_cache
+
+# OpenAI model generating and reviewing the MCQs
+OPENAI_MODEL_NAME = "gpt-4o"
+
+
+@lru_cache(maxsize=1)
+def get_llm():
+    """
+    Build the OpenAI chat model shared by the MCQ chains on first use.
+
+    Returns:
+        ChatOpenAI: The GPT-4o model.
+    """
+    from langchain_openai import ChatOpenAI
+
+    # Initializing the openai GPT-4o model.
+    return ChatOpenAI(
+        # LLM model
+        model=OPENAI_MODEL_NAME,
+        # Temparature defines the creativity.
+        # The higher the number, higher the creativity.
+        temperature=0.7,
+        # Number of max tokens that the model can accept
+        max_tokens=None,
+        # Timeout if the response is not generated
+        timeout=None,
+        # Max no. of retries
+        max_retries=2,
+    )
+
 
 # The prompt to generate the MCQs based on the provided text.
 template = """
@@ -25,6 +38,7 @@ Text:{text}
 You are an expert MCQ maker. Given the above text, it is your job to \
 create a quiz  of {number} multiple choice questions for {subject} students in {tone} tone.
 Make sure the questions are not repeated and check all the questions to be conforming the text as well.
+{exclude}
 Make sure to format your response like  RESPONSE_JSON below  and use it as a guide. \
 Ensure to make {number} MCQs.
 Make sure that response matches the same structure as I provided below. It must not have any other text apart from the structure, not even `json` to indicate it is a json response. This is because, I will load the response with json.loads in the python, so hope you get it. The correct_answer key must contains the correct option value i.e. a, b, c, or, d.
@@ -33,18 +47,6 @@ Make sure that response matches the same structure as I provided below. It must
 
 """
 
-# Input variables and creating the template for the user input
-quiz_generation_prompt = PromptTemplate(
-    input_variables=["text", "number", "subject", "tone", "response_json"],
-    template=template,
-)
-
-# Create the chain for the user input
-# We are storing the output in the quiz variable after the operation
-quiz_chain = LLMChain(
-    llm=llm, prompt=quiz_generation_prompt, output_key="quiz", verbose=True
-)
-
 # Once the quiz is generated by the llm, ask llm to analyze it again and
 # chek the grammer, complexity etc.
 template2 = """
@@ -58,21 +60,100 @@ Quiz_MCQs:
 Check from an expert English Writer of the above quiz:
 """
 
-# Generating prompt template for analyzing the quiz by llm
-quiz_evaluation_prompt = PromptTemplate(
-    input_variables=["subject", "quiz"], template=template2
-)
 
-# Creating the chain for the prompt template
-review_chain = LLMChain(
-    llm=llm, prompt=quiz_evaluation_prompt, output_key="review", verbose=True
-)
+@lru_cache(maxsize=1)
+def get_quiz_chain():
+    """
+    Build the chain generating the quiz on first use.
+
+    Returns:
+        LLMChain: The chain storing the generated quiz in its "quiz" output.
+    """
+    from langchain.chains import LLMChain
+    from langchain.prompts import PromptTemplate
+
+    # Input variables and creating the template for the user input
+    # "exclude" lists the questions the quiz must not repeat, see
+    # ``exclusion_prompt``, empty for a new quiz
+    quiz_generation_prompt = PromptTemplate(
+        input_variables=[
+            "text",
+            "number",
+            "subject",
+            "tone",
+            "response_json",
+            "exclude",
+        ],
+        template=template,
+    )
+
+    # Create the chain for the user input
+    # We are storing the output in the quiz variable after the operation
+    return LLMChain(
+        llm=get_llm(), prompt=quiz_generation_prompt, output_key="quiz", verbose=True
+    )
+
+
+@lru_cache(maxsize=1)
+def get_review_chain():
+    """
+    Build the chain reviewing the quiz on first use.
+
+    Returns:
+        LLMChain: The chain storing the review in its "review" output.
+    """
+    from langchain.chains import LLMChain
+    from langchain.prompts import PromptTemplate
+
+    # Generating prompt template for analyzing the quiz by llm
+    quiz_evaluation_prompt = PromptTemplate(
+        input_variables=["subject", "quiz"], template=template2
+    )
+
+    # Creating the chain for the prompt template
+    return LLMChain(
+        llm=get_llm(), prompt=quiz_evaluation_prompt, output_key="review", verbose=True
+    )
+
+
+@lru_cache(maxsize=1)
+def get_generate_evaluate_chain():
+    """
+    Build the chain running the quiz and review chains in sequence on first use.
+
+    Returns:
+        SequentialChain: The chain returning the "quiz" and the "review".
+    """
+    from langchain.chains import SequentialChain
+
+    # This is an Overall Chain where we run the two chains in Sequence
+    return SequentialChain(
+        chains=[get_quiz_chain(), get_review_chain()],
+        input_variables=[
+            "text",
+            "number",
+            "subject",
+            "tone",
+            "response_json",
+            "exclude",
+        ],
+        output_variables=["quiz", "review"],
+        verbose=True,
+    )
+
+
+# Accessors of the objects this module used to build at import time
+_LAZY_ATTRIBUTES = {
+    "llm": get_llm,
+    "quiz_chain": get_quiz_chain,
+    "review_chain": get_review_chain,
+    "generate_evaluate_chain": get_generate_evaluate_chain,
+}
+
 
+def __getattr__(name):
+    """Build the model and chains on the first access to their old names."""
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
 
-# This is an Overall Chain where we run the two chains in Sequence
-generate_evaluate_chain = SequentialChain(
-    chains=[quiz_chain, review_chain],
-    input_variables=["text", "number", "subject", "tone", "response_json"],
-    output_variables=["quiz", "review"],
-    verbose=True,
-)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,188 @@
+import json
+from functools import lru_cache
+from typing import Any
+from typing import List
+from typing import Optional
+
+import requests
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+
+
+class ModelServerError(RuntimeError):
+    """Raised when the model server rejects or fails a request."""
+
+
+class ModelServerClient:
+    """
+    Client of the local model server, shared by the threads of a web worker.
+
+    Args:
+        url (str): The base URL of the model server.
+        timeout (float): Seconds a request may take, sent to the server so
+            it stops working on a request nobody waits for anymore.
+    """
+
+    def __init__(self, url, timeout=120):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def generate(self, prompt, stop=None, on_token=None):
+        """
+        Generate the completion of a prompt with the llama model.
+
+        Args:
+            prompt (str): The prompt to complete.
+            stop (list): Stop the generation at any of these strings.
+            on_token (Callable): Called with every token while it is generated.
+                An exception raised by it closes the connection, which
+                cancels the generation on the server.
+
+        Returns:
+            str: The generated text.
+        """
+        payload = {"prompt": prompt, "stop": stop, "stream": on_token is not None}
+        if on_token is None:
+            return self._post("generate", payload)
+
+        with self._request("generate", payload, stream=True) as response:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+
+                message = json.loads(line)
+                if "token" in message:
+                    on_token(message["token"])
+                elif "error" in message:
+                    raise ModelServerError(message["error"])
+                else:
+                    return message["result"]
+
+        raise ModelServerError("The model server closed the stream.")
+
+    def embed(self, texts):
+        """
+        Embed texts with the MiniLM model.
+
+        Args:
+            texts (list): The texts to embed.
+
+        Returns:
+            list: One vector per text.
+        """
+        return self._post("embed", {"texts": list(texts)})
+
+    def tokenize(self, text):
+        """
+        Tokenize a text with the tokenizer of the llama model.
+
+        Args:
+            text (str): The text to tokenize.
+
+        Returns:
+            list: The token ids of the text.
+        """
+        return self._post("tokenize", {"text": text})
+
+    def health(self):
+        """
+        Get the state of the model server.
+
+        Returns:
+            dict: The health report of the server, with "status" "down" when
+                it can't be reached.
+        """
+        try:
+            return self.session.get(f"{self.url}/health", timeout=5).json()
+        except (requests.RequestException, ValueError) as e:
+            return {"status": "down", "error": str(e)}
+
+    def _request(self, kind, payload, stream=False):
+        """Send a request, raising ModelServerError when it failed."""
+        payload = dict(payload, timeout=self.timeout)
+        try:
+            response = self.session.post(
+                f"{self.url}/{kind}",
+                json=payload,
+                stream=stream,
+                # Leave the server the time to answer with its own timeout.
+                timeout=self.timeout + 5,
+            )
+        except requests.RequestException as e:
+            raise ModelServerError(f"The model server can't be reached: {e}") from e
+
+        if response.status_code != 200:
+            try:
+                error = response.json().get("error")
+            except ValueError:
+                error = response.text
+            response.close()
+            raise ModelServerError(f"{response.status_code}: {error}")
+
+        return response
+
+    def _post(self, kind, payload):
+        """Send a request and return its result."""
+        with self._request(kind, payload) as response:
+            return response.json()["result"]
+
+
+@lru_cache(maxsize=None)
+def get_client(url, timeout):
+    """Get the client of a model server, created once per process."""
+    return ModelServerClient(url, timeout)
+
+
+def model_server_client(config):
+    """
+    Get the client of the model server configured in the app.
+
+    Args:
+        config (dict): The application config.
+
+    Returns:
+        ModelServerClient: The client of ``MODEL_SERVER_URL``.
+    """
+    return get_client(
+        config["MODEL_SERVER_URL"], config.get("MODEL_SERVER_TIMEOUT", 120)
+    )
+
+
+class ModelServerLLM(LLM):
+    """
+    LLM generating with the llama model of the model server.
+
+    The tokens are streamed from the server to the callbacks of the run, so
+    streaming and cancellation work as with the model loaded in process.
+    """
+
+    client: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "model_server"
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        on_token = run_manager.on_llm_new_token if run_manager else None
+        return self.client.generate(prompt, stop=stop, on_token=on_token)
+
+
+class ModelServerEmbeddings(Embeddings):
+    """Embeddings computed by the MiniLM model of the model server."""
+
+    def __init__(self, client: ModelServerClient):
+        self.client = client
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.client.embed(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.client.embed([text])[0]
@@ -0,0 +1,456 @@
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two checks of the replica processes
+MONITOR_INTERVAL = 1.0
+
+
+def replica_count(config):
+    """
+    Number of model replicas to start.
+
+    Args:
+        config (dict): The application config.
+
+    Returns:
+        int: ``MODEL_SERVER_REPLICAS``, defaults to one replica per
+            ``MODEL_SERVER_THREADS`` CPU cores.
+    """
+    if config.get("MODEL_SERVER_REPLICAS"):
+        return int(config["MODEL_SERVER_REPLICAS"])
+
+    threads = config.get("MODEL_SERVER_THREADS") or 1
+    return max(1, (os.cpu_count() or 1) // threads)
+
+
+class GenerationExpired(Exception):
+    """Raised inside a replica when a request is cancelled or past its deadline."""
+
+
+def run_replica(index, config, requests, results, cancels):
+    """
+    Load the models and serve the queued requests, runs in a replica process.
+
+    The weights are memory mapped once per replica. The replica takes the
+    next request from the queue shared with the other replicas, so a free
+    replica always picks up the oldest waiting request.
+
+    Args:
+        index (int): The number of the replica.
+        config (dict): The application config.
+        requests (multiprocessing.Queue): The queued (id, kind, payload,
+            deadline) requests.
+        results (multiprocessing.Queue): The (kind, id, value) messages sent
+            back to the server.
+        cancels (multiprocessing.Queue): The (id, deadline) of the requests
+            whose client went away, running on this replica or still queued.
+    """
+    from ..model.llama_model.llama_qa import load_llm
+    from ..utils.opensource_utils import download_hugging_face_embeddings
+    from ..utils.opensource_utils import embeddings_options
+
+    llm = load_llm(config, threads=config.get("MODEL_SERVER_THREADS"))
+    embeddings = download_hugging_face_embeddings(**embeddings_options(config))
+    results.put(("ready", None, index))
+
+    # The deadline of every cancelled request, past it the request expires
+    # anyway and its id is dropped.
+    cancelled = {}
+
+    def check(request_id, deadline):
+        while True:
+            try:
+                cancelled_id, cancelled_deadline = cancels.get_nowait()
+            except queue.Empty:
+                break
+            cancelled[cancelled_id] = cancelled_deadline
+
+        now = time.time()
+        for cancelled_id in [
+            cancelled_id
+            for cancelled_id, cancelled_deadline in cancelled.items()
+            if cancelled_deadline < now
+        ]:
+            del cancelled[cancelled_id]
+
+        if cancelled.pop(request_id, None) is not None:
+            raise GenerationExpired("The request was cancelled.")
+        if deadline and time.time() > deadline:
+            raise GenerationExpired("The request timed out.")
+
+    while True:
+        request_id, kind, payload, deadline = requests.get()
+        try:
+            check(request_id, deadline)
+            results.put(("start", request_id, index))
+
+            if kind == "generate":
+                text = []
+                for token in llm.client(
+                    payload["prompt"], stop=payload.get("stop"), stream=True
+                ):
+                    check(request_id, deadline)
+                    text.append(token)
+                    results.put(("token", request_id, token))
+                value = "".join(text)
+
+            elif kind == "embed":
+                value = embeddings.embed_documents(payload["texts"])
+
+            elif kind == "tokenize":
+                value = llm.client.tokenize(payload["text"])
+
+            else:
+                raise ValueError(f"Unknown request {kind!r}.")
+
+        except Exception as e:
+            results.put(("error", request_id, str(e)))
+        else:
+            results.put(("done", request_id, value))
+
+
+class ModelServer:
+    """
+    Local server sharing the llama and MiniLM models between the web workers.
+
+    ``replicas`` processes each load the models once and take the generation,
+    embedding and tokenization requests from a shared queue. Requests wait
+    in the queue when every replica is busy, are rejected when it holds
+    ``queue_size`` requests, and fail once their timeout is over. A replica
+    that dies is restarted.
+
+    The replicas are spawned, not forked: the server runs the HTTP, dispatch
+    and monitor threads, and a fork could copy a lock one of them holds.
+    """
+
+    def __init__(self, config, replicas=None, queue_size=256, timeout=120):
+        self.config = dict(config)
+        self.replicas = replicas or replica_count(config)
+        self.timeout = timeout
+
+        context = multiprocessing.get_context("spawn")
+        self._context = context
+        self._requests = context.Queue(maxsize=queue_size)
+        self._results = context.Queue()
+        self._cancels = [context.Queue() for _ in range(self.replicas)]
+        self._processes = [None] * self.replicas
+        self._ready = set()
+
+        self._ids = itertools.count()
+        self._pending = {}
+        self._owners = {}
+        self._deadlines = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def start(self):
+        """Start the replicas and the threads dispatching their messages."""
+        for index in range(self.replicas):
+            self._start_replica(index)
+
+        threading.Thread(
+            target=self._dispatch, name="model-server-dispatch", daemon=True
+        ).start()
+        threading.Thread(
+            target=self._monitor, name="model-server-monitor", daemon=True
+        ).start()
+
+    def submit(self, kind, payload, timeout=None):
+        """
+        Queue a request for the next free replica.
+
+        Args:
+            kind (str): "generate", "embed" or "tokenize".
+            payload (dict): The arguments of the request.
+            timeout (float): Seconds the request may take, from now on.
+
+        Returns:
+            tuple: The request id, and the queue receiving its messages.
+
+        Raises:
+            queue.Full: When the request queue is full.
+        """
+        request_id = next(self._ids)
+        messages = queue.Queue()
+        deadline = time.time() + (timeout or self.timeout)
+
+        with self._lock:
+            self._pending[request_id] = messages
+            self._deadlines[request_id] = deadline
+        try:
+            self._requests.put_nowait((request_id, kind, payload, deadline))
+        except queue.Full:
+            self.forget(request_id)
+            raise
+
+        return request_id, messages
+
+    def cancel(self, request_id):
+        """
+        Stop a request whose client went away.
+
+        A running request is stopped at its next token. A request still in
+        the queue is announced to every replica, as any of them may take it,
+        and the one that does skips it.
+
+        Args:
+            request_id (int): The id returned by ``submit``.
+        """
+        with self._lock:
+            owner = self._owners.get(request_id)
+            deadline = self._deadlines.get(request_id)
+        if deadline is None:
+            return
+
+        owners = [owner] if owner is not None else range(self.replicas)
+        for index in owners:
+            self._cancels[index].put((request_id, deadline))
+        self.forget(request_id)
+
+    def forget(self, request_id):
+        """Drop the messages of a finished request."""
+        with self._lock:
+            self._pending.pop(request_id, None)
+            self._owners.pop(request_id, None)
+            self._deadlines.pop(request_id, None)
+
+    def health(self):
+        """
+        Report the state of the replicas and of the queue.
+
+        Returns:
+            dict: "ok" when every replica is loaded, "loading" before the
+                first one is, else "degraded", with the replica counts and the
+                number of queued and running requests.
+        """
+        alive = sum(
+            process is not None and process.is_alive() for process in self._processes
+        )
+        with self._lock:
+            ready = len(self._ready)
+            in_flight = len(self._pending)
+
+        if ready == self.replicas and alive == self.replicas:
+            status = "ok"
+        elif not ready:
+            status = "loading"
+        else:
+            status = "degraded"
+
+        try:
+            queued = self._requests.qsize()
+        except NotImplementedError:
+            queued = None
+
+        return {
+            "status": status,
+            "replicas": self.replicas,
+            "alive": alive,
+            "ready": ready,
+            "queued": queued,
+            "in_flight": in_flight,
+            "uptime": round(time.time() - self.started_at, 1),
+        }
+
+    def _start_replica(self, index):
+        """Start, or restart, the process of a replica."""
+        process = self._context.Process(
+            target=run_replica,
+            args=(
+                index,
+                self.config,
+                self._requests,
+                self._results,
+                self._cancels[index],
+            ),
+            name=f"model-replica-{index}",
+            daemon=True,
+        )
+        process.start()
+        self._processes[index] = process
+
+    def _dispatch(self):
+        """Route the messages of the replicas to the waiting requests."""
+        while True:
+            kind, request_id, value = self._results.get()
+            with self._lock:
+                if kind == "ready":
+                    self._ready.add(value)
+                    continue
+                if kind == "start":
+                    self._owners[request_id] = value
+
+                messages = self._pending.get(request_id)
+
+            # The request timed out or its client went away.
+            if messages is not None:
+                messages.put((kind, value))
+
+    def _monitor(self):
+        """Restart the replicas that died, e.g. killed for lack of memory."""
+        while True:
+            time.sleep(MONITOR_INTERVAL)
+            for index, process in enumerate(self._processes):
+                if process.is_alive():
+                    continue
+
+                logger.warning(
+                    f"Model replica {index} exited with code {process.exitcode}, "
+                    "restarting it."
+                )
+                with self._lock:
+                    self._ready.discard(index)
+                self._start_replica(index)
+
+
+class ModelServerHandler(BaseHTTPRequestHandler):
+    """
+    JSON over HTTP interface of the ``ModelServer``.
+
+    ``POST /generate`` takes a prompt and answers with the generated text, or
+    streams one JSON line per token when "stream" is true. ``POST /embed``
+    embeds a list of texts, ``POST /tokenize`` tokenizes a text for the
+    llama model, and ``GET /health`` reports the state of the replicas.
+    """
+
+    protocol_version = "HTTP/1.1"
+    server_version = "ChatMCQModelServer"
+
+    @property
+    def model_server(self):
+        return self.server.model_server
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self._send_json({"error": "Not found."}, 404)
+
+        health = self.model_server.health()
+        self._send_json(health, 200 if health["status"] != "loading" else 503)
+
+    def do_POST(self):
+        kind = self.path.strip("/")
+        if kind not in ("generate", "embed", "tokenize"):
+            return self._send_json({"error": "Not found."}, 404)
+
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._send_json({"error": "Invalid JSON."}, 400)
+
+        timeout = payload.pop("timeout", None) or self.model_server.timeout
+        try:
+            request_id, messages = self.model_server.submit(kind, payload, timeout)
+        except queue.Full:
+            return self._send_json({"error": "The model server queue is full."}, 503)
+
+        try:
+            if kind == "generate" and payload.get("stream"):
+                self._stream(request_id, messages, timeout)
+            else:
+                self._respond(messages, timeout)
+        finally:
+            self.model_server.forget(request_id)
+
+    def _next(self, messages, deadline):
+        """Wait for the next message of the request until its deadline."""
+        return messages.get(timeout=max(deadline - time.monotonic(), 0))
+
+    def _respond(self, messages, timeout):
+        """Send the result of the request once it is done."""
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                kind, value = self._next(messages, deadline)
+                if kind == "done":
+                    return self._send_json({"result": value})
+                if kind == "error":
+                    return self._send_json({"error": value}, 500)
+        except queue.Empty:
+            self._send_json({"error": "The request timed out."}, 504)
+
+    def _stream(self, request_id, messages, timeout):
+        """Send every generated token as a JSON line while it is generated."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                try:
+                    kind, value = self._next(messages, deadline)
+                except queue.Empty:
+                    kind, value = "error", "The request timed out."
+                    self.model_server.cancel(request_id)
+
+                if kind == "start":
+                    continue
+                if kind == "token":
+                    line = {"token": value}
+                elif kind == "done":
+                    line = {"result": value}
+                else:
+                    line = {"error": value}
+
+                self.wfile.write(json.dumps(line).encode() + b"\n")
+                self.wfile.flush()
+                if kind != "token":
+                    return
+
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away, stop generating for it.
+            self.model_server.cancel(request_id)
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(config, host="127.0.0.1", port=8600, replicas=None):
+    """
+    Start the replicas and serve the model requests until interrupted.
+
+    Args:
+        config (dict): The application config.
+        host (str): The interface to listen on, keep it local.
+        port (int): The port to listen on.
+        replicas (int): Number of model replicas, see ``replica_count``.
+    """
+    model_server = ModelServer(
+        config,
+        replicas=replicas,
+        queue_size=config.get("MODEL_SERVER_QUEUE_SIZE", 256),
+        timeout=config.get("MODEL_SERVER_TIMEOUT", 120),
+    )
+    model_server.start()
+
+    httpd = ThreadingHTTPServer((host, port), ModelServerHandler)
+    httpd.daemon_threads = True
+    httpd.model_server = model_server
+    logger.info(
+        f"Model server listening on http://{host}:{port} "
+        f"with {model_server.replicas} replicas."
+    )
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
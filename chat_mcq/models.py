@@ -1,11 +1,198 @@
+import json
+from datetime import datetime
+
 from .extensions import db
 
 
+def _timestamp(value):
+    return value.isoformat() + "Z" if value else None
+
+
 class MCQ(db.Model):
-    """MCQ model."""
+    """MCQ model, one generated quiz."""
 
     __tablename__ = "mcqs"
 
     id = db.Column(db.Integer, primary_key=True)
+    # The quiz as a JSON blob, also stored as question rows, see ``save_mcqs``
     mcqs = db.Column(db.Text, nullable=False)
     review = db.Column(db.Text, nullable=False)
+    # "pending", "done", "skipped" or "failed", NULL for quizzes reviewed inline
+    # before the review could run in the background
+    review_status = db.Column(db.String(16))
+    subject = db.Column(db.String(255), index=True)
+    complexity = db.Column(db.String(32), index=True)
+    # SHA-256 of the uploaded file, the question bank is looked up by it
+    document_hash = db.Column(db.String(64), index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    questions = db.relationship(
+        "Question",
+        back_populates="quiz",
+        order_by="Question.position",
+        cascade="all, delete-orphan",
+    )
+
+    def as_dict(self):
+        """
+        Rebuild the quiz in the ``response.json`` format.
+
+        Reads the normalized questions, and falls back to the JSON blob for the
+        quizzes that weren't migrated yet.
+
+        Returns:
+            dict: The questions of the quiz by their key.
+        """
+        if not self.questions:
+            return json.loads(self.mcqs)
+
+        return {question.key: question.as_mcq() for question in self.questions}
+
+    def review_dict(self):
+        """
+        Serialize the review of the quiz.
+
+        Returns:
+            dict: The review and its status, empty while it is pending.
+        """
+        return {"review": self.review, "review_status": self.review_status or "done"}
+
+
+class Question(db.Model):
+    """One question of a quiz."""
+
+    __tablename__ = "questions"
+    __table_args__ = (db.Index("ix_questions_mcq_id_position", "mcq_id", "position"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    mcq_id = db.Column(db.Integer, db.ForeignKey("mcqs.id"), nullable=False)
+    position = db.Column(db.Integer, nullable=False)
+    key = db.Column(db.String(16), nullable=False)
+    text = db.Column(db.Text, nullable=False)
+    correct = db.Column(db.String(16), nullable=False)
+    # The stored question this one was reused from, NULL when it was generated
+    origin_id = db.Column(db.Integer, db.ForeignKey("questions.id"))
+
+    quiz = db.relationship("MCQ", back_populates="questions")
+    origin = db.relationship("Question", remote_side=[id])
+    options = db.relationship(
+        "Option",
+        back_populates="question",
+        order_by="Option.position",
+        cascade="all, delete-orphan",
+        lazy="selectin",
+    )
+
+    def as_mcq(self):
+        """
+        Serialize the question like one entry of ``response.json``.
+
+        Returns:
+            dict: The question, its options and the correct option.
+        """
+        return {
+            "mcq": self.text,
+            "options": {option.key: option.text for option in self.options},
+            "correct": self.correct,
+        }
+
+    def to_dict(self):
+        """
+        Serialize the question for the question bank API.
+
+        Returns:
+            dict: The question with its options and the quiz it belongs to.
+        """
+        return dict(
+            self.as_mcq(),
+            id=self.id,
+            mcq_id=self.mcq_id,
+            key=self.key,
+            origin_id=self.origin_id,
+            subject=self.quiz.subject,
+            complexity=self.quiz.complexity,
+            created_at=_timestamp(self.quiz.created_at),
+        )
+
+
+class Option(db.Model):
+    """One option of a question."""
+
+    __tablename__ = "options"
+
+    id = db.Column(db.Integer, primary_key=True)
+    question_id = db.Column(
+        db.Integer, db.ForeignKey("questions.id"), nullable=False, index=True
+    )
+    position = db.Column(db.Integer, nullable=False)
+    key = db.Column(db.String(16), nullable=False)
+    text = db.Column(db.Text, nullable=False)
+
+    question = db.relationship("Question", back_populates="options")
+
+
+class GenerationJob(db.Model):
+    """Background MCQ generation job."""
+
+    __tablename__ = "generation_jobs"
+
+    id = db.Column(db.String(32), primary_key=True)
+    status = db.Column(db.String(16), nullable=False, default="queued", index=True)
+    message = db.Column(db.Text)
+    num_mcqs = db.Column(db.Integer, nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    complexity = db.Column(db.String(32), nullable=False)
+    filename = db.Column(db.String(255))
+    mcq_id = db.Column(db.Integer, db.ForeignKey("mcqs.id"))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    prompt_tokens = db.Column(db.Integer)
+    completion_tokens = db.Column(db.Integer)
+    total_tokens = db.Column(db.Integer)
+    total_cost = db.Column(db.Float)
+
+    mcq = db.relationship("MCQ")
+
+    def to_dict(self):
+        """
+        Serialize the job for the status endpoint.
+
+        Returns:
+            dict: The state, timings and token usage of the job.
+        """
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "message": self.message,
+            "num_mcqs": self.num_mcqs,
+            "subject": self.subject,
+            "complexity": self.complexity,
+            "filename": self.filename,
+            "mcq_id": self.mcq_id,
+            "created_at": _timestamp(self.created_at),
+            "started_at": _timestamp(self.started_at),
+            "finished_at": _timestamp(self.finished_at),
+            "usage": {
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "total_tokens": self.total_tokens,
+                "total_cost": self.total_cost,
+            },
+        }
+
+
+class GenerationCache(db.Model):
+    """Cached MCQ generation, keyed by the document and the generation parameters."""
+
+    __tablename__ = "generation_cache"
+
+    key = db.Column(db.String(64), primary_key=True)
+    mcq_id = db.Column(db.Integer, db.ForeignKey("mcqs.id"), nullable=False)
+    created_at = db.Column(
+        db.DateTime, nullable=False, default=datetime.utcnow, index=True
+    )
+    last_used_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    hits = db.Column(db.Integer, nullable=False, default=0)
+
+    mcq = db.relationship("MCQ")
@@ -0,0 +1,129 @@
+import json
+import queue
+from concurrent import futures
+
+from sqlalchemy import event
+
+from .extensions import db
+from .extensions import group_commit_writer
+from .metrics import timed
+from .models import MCQ
+from .models import Option
+from .models import Question
+
+
+def configure_sqlite(engine, pragmas):
+    """
+    Apply the pragmas to every new connection of a SQLite engine.
+
+    Engines of other databases are left untouched.
+
+    Args:
+        engine (Engine): The SQLAlchemy engine.
+        pragmas (dict): The pragma values by name.
+    """
+    if engine.dialect.name != "sqlite" or not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def build_questions(data, provenance=None):
+    """
+    Convert the generated quiz into question and option rows.
+
+    Entries the LLM returned in an unexpected shape are skipped.
+
+    Args:
+        data (dict): The quiz in the ``response.json`` format.
+        provenance (dict): The origin of every question by key, the questions
+            reused from the question bank point to their stored original.
+
+    Returns:
+        list: The unsaved Question rows with their options.
+    """
+    provenance = provenance or {}
+    questions = []
+    for key, value in data.items():
+        if not isinstance(value, dict) or "mcq" not in value:
+            continue
+
+        options = value.get("options") or {}
+        questions.append(
+            Question(
+                position=len(questions),
+                key=str(key),
+                text=value["mcq"],
+                correct=str(value.get("correct", "")),
+                origin_id=provenance.get(key, {}).get("question_id"),
+                options=[
+                    Option(position=position, key=str(option_key), text=str(text))
+                    for position, (option_key, text) in enumerate(options.items())
+                ],
+            )
+        )
+
+    return questions
+
+
+def save_mcqs(response, subject=None, complexity=None, document_hash=None):
+    """
+    Store the generated MCQs and their review in the database.
+
+    The quiz is stored as normalized question and option rows, inserted in
+    bulk with the quiz. The JSON blob is still written: the column is NOT
+    NULL in the existing databases, which SQLite can't relax without
+    rebuilding the table, the ETag of the downloads is computed from it, and
+    an older version rolled back to only reads the blob.
+
+    When ``MCQ_WRITE_BEHIND`` is on, the quiz is committed by the group
+    commit writer together with the quizzes of concurrent requests. It is
+    saved directly if the writer's queue stays full, or if the writer didn't
+    take it within ``MCQ_WRITE_TIMEOUT``.
+
+    Args:
+        response (dict): The successful response of the MCQ generation.
+        subject (str): The subject of the MCQs.
+        complexity (str): The complexity of the MCQs.
+        document_hash (str): The hash of the uploaded file the MCQs are from.
+
+    Returns:
+        MCQ: The stored MCQ entry.
+    """
+    mcq_entry = MCQ(
+        mcqs=json.dumps(response["data"]),
+        review=response["review"],
+        review_status=response.get("review_status"),
+        subject=subject,
+        complexity=complexity,
+        document_hash=document_hash,
+        questions=build_questions(response["data"], response.get("provenance")),
+    )
+
+    with timed("db_commit"):
+        if group_commit_writer.enabled:
+            try:
+                future = group_commit_writer.submit(mcq_entry)
+            except queue.Full:
+                pass
+            else:
+                try:
+                    mcq_id = future.result(timeout=group_commit_writer.timeout)
+                except futures.TimeoutError:
+                    # Save it directly if the writer didn't take it yet, else
+                    # wait for the commit in progress, saving it again would
+                    # store it twice.
+                    if not future.cancel():
+                        mcq_id = future.result()
+                        return db.session.get(MCQ, mcq_id)
+                else:
+                    return db.session.get(MCQ, mcq_id)
+
+        db.session.add(mcq_entry)
+        db.session.commit()
+    return mcq_entry
@@ -0,0 +1,250 @@
+import re
+import traceback
+
+from flask import current_app
+
+from .extensions import db
+from .metrics import timed
+from .models import MCQ
+from .models import Question
+from .utils.openai_utils import error_response
+from .utils.openai_utils import generate_mcqs_from_text
+from .utils.openai_utils import quiz_response
+from .utils.openai_utils import read_file
+from .utils.openai_utils import review_quiz
+from .utils.upload_utils import upload_hash
+
+# Token usage of a quiz assembled without calling the LLM
+NO_USAGE = {
+    "prompt_tokens": 0,
+    "completion_tokens": 0,
+    "total_tokens": 0,
+    "total_cost": 0.0,
+}
+
+
+def add_usage(usage, other):
+    """
+    Sum the token usage of two LLM calls.
+
+    Args:
+        usage (dict): The token usage so far.
+        other (dict): The token usage of the next call.
+
+    Returns:
+        dict: The summed tokens and cost.
+    """
+    return {name: usage[name] + other[name] for name in NO_USAGE}
+
+
+def question_fingerprint(text):
+    """
+    Normalize a question so rewordings in case, spacing and punctuation match.
+
+    Args:
+        text (str): The text of the question.
+
+    Returns:
+        str: The lowercase words of the question.
+    """
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+def find_bank_questions(document_hash, subject, complexity, limit):
+    """
+    Find the stored questions generated before from the same document.
+
+    The questions of the oldest quizzes come first, and questions repeated
+    across quizzes, including the reused copies, are only returned once.
+
+    Args:
+        document_hash (str): The hash of the uploaded file.
+        subject (str): The subject of the MCQs.
+        complexity (str): The complexity of the MCQs.
+        limit (int): Max number of questions to return.
+
+    Returns:
+        list: The distinct stored Question rows.
+    """
+    query = (
+        db.select(Question)
+        .join(Question.quiz)
+        .where(
+            MCQ.document_hash == document_hash,
+            MCQ.subject == subject,
+            MCQ.complexity == complexity,
+        )
+        .order_by(MCQ.id, Question.position)
+    )
+
+    questions = []
+    seen = set()
+    with timed("question_bank_lookup"):
+        for question in db.session.scalars(query):
+            fingerprint = question_fingerprint(question.text)
+            if fingerprint in seen:
+                continue
+
+            seen.add(fingerprint)
+            questions.append(question)
+            if len(questions) == limit:
+                break
+
+    return questions
+
+
+def assemble_quiz(bank_questions, generated, num_mcqs):
+    """
+    Merge the reused questions and the generated ones into one quiz.
+
+    Generated questions duplicating a reused one, or in an unexpected shape,
+    are dropped.
+
+    Args:
+        bank_questions (list): The stored Question rows to reuse.
+        generated (dict): The quiz generated for the shortfall, in the
+            ``response.json`` format.
+        num_mcqs (int): Max number of questions of the quiz.
+
+    Returns:
+        tuple: The quiz in the ``response.json`` format, numbered from 1, and
+            the provenance of every question by key: "bank" with the quiz
+            and question it was first stored as, or "generated".
+    """
+    data = {}
+    provenance = {}
+    seen = set()
+
+    def add(mcq, origin):
+        key = str(len(data) + 1)
+        data[key] = mcq
+        provenance[key] = origin
+        seen.add(question_fingerprint(mcq["mcq"]))
+
+    for question in bank_questions[:num_mcqs]:
+        original = question.origin or question
+        add(
+            question.as_mcq(),
+            {"source": "bank", "mcq_id": original.mcq_id, "question_id": original.id},
+        )
+
+    for value in generated.values():
+        if len(data) == num_mcqs:
+            break
+        if not isinstance(value, dict) or "mcq" not in value:
+            continue
+        if question_fingerprint(value["mcq"]) in seen:
+            continue
+
+        add(value, {"source": "generated"})
+
+    return data, provenance
+
+
+def generate_mcqs_from_bank(
+    file,
+    num_mcqs,
+    subject,
+    complexity,
+    chunked=None,
+    review_mode="inline",
+    text=None,
+    document_hash=None,
+):
+    """
+    Reuse the stored questions of the document and generate only the shortfall.
+
+    The questions stored for the same document, subject and complexity are
+    taken first, and the LLM is only asked for the missing ones, so a
+    document quizzed before costs a small generation or none at all. The
+    questions already in the quiz are listed in the prompt as exclusions, and
+    the generation is repeated for the questions still missing after the
+    duplicates are dropped, at most ``MCQ_BANK_TOP_UP_ATTEMPTS`` times. The
+    review covers the assembled quiz.
+
+    Args:
+        file (FileStorage): The uploaded file, None when ``text`` and
+            ``document_hash`` are given.
+        num_mcqs (int): The number of MCQs to generate.
+        subject (str): The subject of the MCQs.
+        complexity (str): The complexity of the MCQs.
+        chunked (bool): Generate section by section, see ``generate_mcqs``.
+        review_mode (str): "inline", "background" or "skip".
+        text (str): The text of the file when it was already extracted.
+        document_hash (str): The hash of the file when it was already computed.
+
+    Returns:
+        dict: The same response as ``generate_mcqs``, with the provenance of
+            every question, the number of reused ones, and the number of
+            ``requested`` and ``returned`` ones.
+    """
+    if document_hash is None:
+        document_hash = upload_hash(file)
+
+    bank_questions = find_bank_questions(document_hash, subject, complexity, num_mcqs)
+    data, provenance = assemble_quiz(bank_questions, {}, num_mcqs)
+    current_app.logger.info(
+        f"Reusing {len(bank_questions)} stored MCQs, generating "
+        f"{num_mcqs - len(data)}."
+    )
+
+    # Read the file once, every top up generates from the same text.
+    if text is None and len(data) < num_mcqs:
+        try:
+            text = read_file(file)
+        except Exception as e:
+            traceback.print_exception(type(e), e, e.__traceback__)
+            return error_response(f"Error generating MCQs. Error is {str(e)}.")
+
+    # Ask the LLM for the missing questions only, excluding the ones already
+    # in the quiz, until no question is missing. The review comes after.
+    generated = {}
+    usage = dict(NO_USAGE)
+    attempts = current_app.config.get("MCQ_BANK_TOP_UP_ATTEMPTS", 3)
+    for attempt in range(attempts):
+        shortfall = num_mcqs - len(data)
+        if shortfall <= 0:
+            break
+
+        exclude = [mcq["mcq"] for mcq in data.values()]
+        response = generate_mcqs_from_text(
+            text, shortfall, subject, complexity, chunked, "skip", exclude
+        )
+        if response["status_code"] != 200:
+            # Keep the questions of the previous attempts, if any.
+            if not generated:
+                return response
+            break
+
+        usage = add_usage(usage, response["usage"])
+        for key, value in response["data"].items():
+            generated[f"{attempt}-{key}"] = value
+        data, provenance = assemble_quiz(bank_questions, generated, num_mcqs)
+
+    review = ""
+    if review_mode == "inline":
+        try:
+            review, review_usage = review_quiz(data, subject)
+        except Exception as e:
+            traceback.print_exception(type(e), e, e.__traceback__)
+            return error_response(f"Error generating MCQs. Error is {str(e)}.")
+
+        usage = add_usage(usage, review_usage)
+
+    response = quiz_response(data, review, review_mode, usage)
+    response["provenance"] = provenance
+    response["reused"] = len(bank_questions)
+    response["requested"] = num_mcqs
+    response["returned"] = len(data)
+    if len(data) < num_mcqs:
+        response["message"] = (
+            f"Only {len(data)} of the {num_mcqs} MCQs could be created without "
+            "repeating a question."
+        )
+        current_app.logger.warning(
+            f"Question bank quiz short of {num_mcqs - len(data)} MCQs."
+        )
+    elif not generated:
+        response["message"] = "Quiz assembled from the question bank!"
+
+    return response
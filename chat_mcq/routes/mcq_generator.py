@@ -1,20 +1,158 @@
-import csv
-import json
-import os
+import hashlib
+import traceback
 
 from flask import Blueprint
+from flask import Response
+from flask import abort
 from flask import current_app
 from flask import jsonify
 from flask import request
-from flask import send_file
+from flask import stream_with_context
+from flask import url_for
 from werkzeug.utils import secure_filename
 
 from ..extensions import db
+from ..extensions import job_runner
+from ..generation_cache import generation_cache_key
+from ..generation_cache import get_cached_mcqs
+from ..generation_cache import store_cached_mcqs
+from ..jobs import create_generation_job
+from ..jobs import run_generation_job
+from ..jobs import schedule_review
+from ..metrics import timed
 from ..models import MCQ
+from ..models import GenerationJob
+from ..persistence import save_mcqs
+from ..question_bank import generate_mcqs_from_bank
+from ..utils.export_utils import EXPORT_FORMATS
+from ..utils.export_utils import iter_zip
+from ..utils.openai_utils import REVIEW_STATUSES
+from ..utils.openai_utils import error_response
 from ..utils.openai_utils import generate_mcqs
+from ..utils.openai_utils import load_response_json
+from ..utils.openai_utils import read_file
+from ..utils.upload_utils import archive_upload
+from ..utils.upload_utils import upload_hash
 
 mcq_generator = Blueprint("mcq_generator", __name__)
 
+# Generation modes accepted in the "mode" form field, "auto" picks by text size
+GENERATION_MODES = {"auto": None, "chunked": True, "single": False}
+
+
+def cached_response(mcq_entry):
+    """
+    Build the generation response from MCQs generated before.
+
+    Args:
+        mcq_entry (MCQ): The cached MCQ entry.
+
+    Returns:
+        dict: The same response as a fresh generation, flagged as cached.
+    """
+    return dict(
+        mcq_entry.review_dict(),
+        data=mcq_entry.as_dict(),
+        message="Quiz loaded from the cache!",
+        status_code=200,
+        mcq_id=mcq_entry.id,
+        cached=True,
+    )
+
+
+def review_mode():
+    """
+    Read the review mode from the "review" form field.
+
+    Returns:
+        str: "inline", "background" or "skip", defaults to the
+            ``MCQ_REVIEW_MODE`` config.
+    """
+    mode = request.form.get("review") or current_app.config.get(
+        "MCQ_REVIEW_MODE", "inline"
+    )
+    if mode not in REVIEW_STATUSES:
+        abort(
+            400, f"Unsupported review {mode!r}, use one of {sorted(REVIEW_STATUSES)}."
+        )
+
+    return mode
+
+
+def review_cached(mcq_entry, subject, mode):
+    """
+    Queue the review of a cached quiz that was generated without one.
+
+    Args:
+        mcq_entry (MCQ): The cached MCQ entry.
+        subject (str): The subject of the MCQs.
+        mode (str): The review mode of the request.
+    """
+    if mode != "skip" and mcq_entry.review_status in ("skipped", "failed"):
+        mcq_entry.review_status = "pending"
+        db.session.commit()
+        schedule_review(mcq_entry, subject)
+
+
+def lookup_generation_cache(file, num_mcqs, subject, complexity, force=False):
+    """
+    Find the MCQs generated before for the same upload and parameters.
+
+    Args:
+        file (FileStorage): The uploaded file.
+        num_mcqs (int): The number of MCQs to generate.
+        subject (str): The subject of the MCQs.
+        complexity (str): The complexity of the MCQs.
+        force (bool): Skip the lookup, the MCQs are generated again.
+
+    Returns:
+        tuple: The cache key, the hash of the uploaded file, and the cached
+            MCQ entry or None.
+    """
+    document_hash = upload_hash(file)
+    cache_key = generation_cache_key(
+        document_hash, num_mcqs, subject, complexity, load_response_json()
+    )
+    if force:
+        return cache_key, document_hash, None
+
+    return cache_key, document_hash, get_cached_mcqs(cache_key)
+
+
+def reuse_bank():
+    """
+    Read from the "reuse" form field whether the question bank is used.
+
+    Returns:
+        bool: The form value, defaults to the ``MCQ_REUSE_BANK`` config.
+    """
+    value = request.form.get("reuse")
+    if value is None:
+        return bool(current_app.config.get("MCQ_REUSE_BANK"))
+
+    return value.lower() == "true"
+
+
+def store_generation(response, subject, complexity, cache_key, document_hash=None):
+    """
+    Save newly generated MCQs, cache them and queue their review.
+
+    Args:
+        response (dict): The successful response of the MCQ generation.
+        subject (str): The subject of the MCQs.
+        complexity (str): The complexity of the MCQs.
+        cache_key (str): The generation cache key to store the MCQs under.
+        document_hash (str): The hash of the uploaded file, which adds the
+            MCQs to the question bank of the document.
+
+    Returns:
+        int: The ID of the stored MCQ entry.
+    """
+    mcq_entry = save_mcqs(response, subject, complexity, document_hash)
+    store_cached_mcqs(cache_key, mcq_entry)
+    schedule_review(mcq_entry, subject)
+    return mcq_entry.id
+
 
 @mcq_generator.route("/generate_mcqs", methods=["POST"])
 def generate_mcqs_route():
@@ -23,6 +161,10 @@ def generate_mcqs_route():
 
     This route accepts a file upload and form data to generate a specified number of MCQs
     based on the subject and complexity provided. The generated MCQs are stored in the database.
+    Unless the "review" form field is "inline", the MCQs are returned without
+    waiting for their review, see ``/mcqs/<mcq_id>/review``. When the "reuse"
+    form field is "true", the questions stored for the same document are
+    reused and only the missing ones are generated.
 
     Returns:
         JSON: A response containing the generated MCQs and a status code.
@@ -32,66 +174,241 @@ def generate_mcqs_route():
     num_mcqs = int(request.form["num_mcqs"])
     subject = request.form["subject"]
     complexity = request.form["complexity"]
+    chunked = GENERATION_MODES.get(request.form.get("mode", "auto"))
+    review = review_mode()
+    force = request.form.get("force", "false").lower() == "true"
+
+    # Reuse the MCQs generated before for the same document and parameters.
+    cache_key, document_hash, mcq_entry = lookup_generation_cache(
+        file, num_mcqs, subject, complexity, force
+    )
+    if mcq_entry is not None:
+        review_cached(mcq_entry, subject, review)
+        return jsonify(cached_response(mcq_entry))
 
-    # Secure the filename and save the file to the upload folder.
-    filename = secure_filename(file.filename)
-    filepath = os.path.join(current_app.config["UPLOAD_FOLDER"], filename)
-    file.save(filepath)
+    # Keep a copy of the upload when archiving is on.
+    if current_app.config.get("UPLOAD_ARCHIVE"):
+        with timed("upload_save"):
+            archive_upload(file, current_app.config["UPLOAD_FOLDER"])
 
-    # Generate MCQs using the utility function.
-    response = generate_mcqs(
+    # Generate MCQs using the utility function, or top up the stored ones.
+    generate = generate_mcqs_from_bank if reuse_bank() else generate_mcqs
+    response = generate(
         file,
         num_mcqs,
         subject,
         complexity,
+        chunked,
+        review,
     )
 
-    # If the MCQs were generated successfully, save them to the database.
+    # If the MCQs were generated successfully, save them to the database and
+    # queue their review.
     if response["status_code"] == 200:
-        mcqs = response["data"]
-        review = response["review"]
-        mcq_entry = MCQ(mcqs=json.dumps(mcqs), review=review)
-        db.session.add(mcq_entry)
-        db.session.commit()
+        response["mcq_id"] = store_generation(
+            response, subject, complexity, cache_key, document_hash
+        )
 
     return jsonify(response)
 
 
+@mcq_generator.route("/generate_mcqs/jobs", methods=["POST"])
+def create_job_route():
+    """
+    Handle the route for queuing the generation of MCQs from an uploaded file.
+
+    The file is read right away, the generation runs on the job worker pool and
+    the route returns the job ID without waiting for the LLM. The "reuse" form
+    field tops up the question bank like in ``/generate_mcqs``.
+
+    Returns:
+        JSON: The job ID and the URL to poll its status, with a 202 status code.
+    """
+    # Retrieve the file and form data from the request.
+    file = request.files["file"]
+    num_mcqs = int(request.form["num_mcqs"])
+    subject = request.form["subject"]
+    complexity = request.form["complexity"]
+    chunked = GENERATION_MODES.get(request.form.get("mode", "auto"))
+    review = review_mode()
+    force = request.form.get("force", "false").lower() == "true"
+
+    # Answer right away when the same generation is cached.
+    cache_key, document_hash, mcq_entry = lookup_generation_cache(
+        file, num_mcqs, subject, complexity, force
+    )
+    if mcq_entry is not None:
+        review_cached(mcq_entry, subject, review)
+        return jsonify(cached_response(mcq_entry))
+
+    # Keep a copy of the upload when archiving is on.
+    if current_app.config.get("UPLOAD_ARCHIVE"):
+        with timed("upload_save"):
+            archive_upload(file, current_app.config["UPLOAD_FOLDER"])
+
+    # The upload is gone once the request ends, extract the text now.
+    try:
+        text = read_file(file)
+    except Exception as e:
+        traceback.print_exception(type(e), e, e.__traceback__)
+        return jsonify(error_response(f"Error generating MCQs. Error is {str(e)}."))
+
+    job = create_generation_job(
+        num_mcqs, subject, complexity, secure_filename(file.filename)
+    )
+    job_runner.submit(
+        run_generation_job,
+        job.id,
+        text,
+        chunked,
+        cache_key,
+        review,
+        document_hash,
+        reuse_bank(),
+    )
+
+    return (
+        jsonify(
+            {
+                "job_id": job.id,
+                "status": job.status,
+                "status_url": url_for("mcq_generator.job_status", job_id=job.id),
+                "status_code": 202,
+            }
+        ),
+        202,
+    )
+
+
+@mcq_generator.route("/jobs/<job_id>")
+def job_status(job_id):
+    """
+    Handle the route for polling a generation job.
+
+    Args:
+        job_id (str): The ID of the job.
+
+    Returns:
+        JSON: The state, timings and token usage of the job, with the MCQs
+            and the review once it is done. The review may still be pending
+            after the job is done.
+    """
+    job = db.get_or_404(GenerationJob, job_id)
+    response = job.to_dict()
+
+    if job.status == "done" and job.mcq is not None:
+        response["data"] = job.mcq.as_dict()
+        response.update(job.mcq.review_dict())
+
+    return jsonify(response)
+
+
+@mcq_generator.route("/mcqs/<int:mcq_id>/review")
+def review_status(mcq_id):
+    """
+    Handle the route for polling the review of stored MCQs.
+
+    Args:
+        mcq_id (int): The ID of the MCQ entry in the database.
+
+    Returns:
+        JSON: The review and its status.
+    """
+    mcq_entry = db.get_or_404(MCQ, mcq_id)
+    return jsonify(dict(mcq_entry.review_dict(), mcq_id=mcq_entry.id))
+
+
+def export_format():
+    """
+    Read the export format from the "format" query parameter.
+
+    Returns:
+        tuple: The file extension, mimetype and encoder of the format.
+    """
+    name = request.args.get("format", "csv").lower()
+    if name not in EXPORT_FORMATS:
+        abort(400, f"Unsupported format {name!r}, use one of {sorted(EXPORT_FORMATS)}.")
+
+    return EXPORT_FORMATS[name]
+
+
 @mcq_generator.route("/download/<int:mcq_id>")
 def download(mcq_id):
     """
-    Handle the route for downloading MCQs as a CSV file.
+    Handle the route for downloading MCQs as a CSV, JSON Lines or Parquet file.
 
-    This route retrieves the MCQs from the database based on the provided MCQ ID
-    and generates a CSV file for download.
+    The file is encoded while it is streamed, nothing is written to disk. The
+    ETag is derived from the stored MCQs, so a repeated download of unchanged
+    MCQs gets a 304 without encoding the file again.
 
     Args:
         mcq_id (int): The ID of the MCQ entry in the database.
 
     Returns:
-        Response: A Flask response object to send the CSV file as an attachment.
+        Response: A streamed response sending the file as an attachment.
     """
+    extension, mimetype, encode = export_format()
+
     # Retrieve the MCQ entry from the database.
-    mcq_entry = MCQ.query.get_or_404(mcq_id)
-    mcqs = json.loads(mcq_entry.mcqs)
-    filepath = f"mcqs_{mcq_id}.csv"
-
-    # Write the MCQs to a CSV file.
-    with open(filepath, "w", newline="") as csvfile:
-        fieldnames = ["MCQ", "Choices", "Correct"]
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-
-        writer.writeheader()
-        for key, value in mcqs.items():
-            writer.writerow(
-                {
-                    "MCQ": value["mcq"],
-                    "Choices": " || ".join(
-                        [f"{k} => {v}" for k, v in value["options"].items()]
-                    ),
-                    "Correct": value["correct"],
-                }
-            )
-
-    # Send the CSV file as an attachment.
-    return send_file(filepath, as_attachment=True)
+    mcq_entry = db.get_or_404(MCQ, mcq_id)
+    etag = hashlib.sha256(f"{extension}:{mcq_entry.mcqs}".encode()).hexdigest()
+
+    # Stream the file, the encoder only runs if the client's copy is stale.
+    response = Response(encode(mcq_entry.as_dict()), mimetype=mimetype)
+    response.headers["Content-Disposition"] = (
+        f"attachment; filename=mcqs_{mcq_id}.{extension}"
+    )
+    response.set_etag(etag)
+    if mcq_entry.created_at is not None:
+        response.last_modified = mcq_entry.created_at
+
+    return response.make_conditional(request)
+
+
+@mcq_generator.route("/download/bulk")
+def download_bulk():
+    """
+    Handle the route for downloading many MCQ entries in one zip archive.
+
+    The IDs are given as a comma separated "ids" query parameter. Every entry
+    is loaded and encoded while the archive is streamed, so only one of them
+    is held in memory at a time.
+
+    Returns:
+        Response: A streamed zip archive with one file per MCQ entry.
+    """
+    extension, _, encode = export_format()
+
+    # Parse the requested IDs.
+    try:
+        mcq_ids = [
+            int(mcq_id)
+            for value in request.args.getlist("ids")
+            for mcq_id in value.split(",")
+            if mcq_id.strip()
+        ]
+    except ValueError:
+        abort(400, "The ids must be comma separated integers.")
+
+    if not mcq_ids:
+        abort(400, "No MCQ IDs given.")
+
+    # Fail before streaming if any of the entries doesn't exist.
+    found = set(db.session.scalars(db.select(MCQ.id).where(MCQ.id.in_(mcq_ids))))
+    missing = [mcq_id for mcq_id in mcq_ids if mcq_id not in found]
+    if missing:
+        abort(404, f"MCQ entries not found: {missing}.")
+
+    def entries():
+        for mcq_id in dict.fromkeys(mcq_ids):
+            mcq_entry = db.session.get(MCQ, mcq_id)
+            yield f"mcqs_{mcq_id}.{extension}", encode(mcq_entry.as_dict())
+            db.session.expunge(mcq_entry)
+
+    response = Response(
+        stream_with_context(iter_zip(entries())), mimetype="application/zip"
+    )
+    response.headers["Content-Disposition"] = (
+        f"attachment; filename=mcqs_{extension}.zip"
+    )
+    return response
@@ -0,0 +1,17 @@
+from flask import Blueprint
+from flask import Response
+
+from ..metrics import REGISTRY
+
+metrics = Blueprint("metrics", __name__)
+
+
+@metrics.route("/metrics")
+def index():
+    """
+    Serve the metrics of the process in the Prometheus text format.
+
+    Returns:
+        Response: The stage latency histograms and the token and cost counters.
+    """
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
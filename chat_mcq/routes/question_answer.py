@@ -1,11 +1,15 @@
 import time
 
 from flask import Blueprint
+from flask import Response
 from flask import current_app
+from flask import jsonify
 from flask import render_template
 from flask import request
+from flask import stream_with_context
 
-from ..model.llama_model.llama_qa import get_qa_object
+from ..extensions import qa_engine
+from ..model.llama_model.qa_engine import QAEngineBusy
 
 # Create a Blueprint named 'question_answer'
 question_answer = Blueprint("question_answer", __name__)
@@ -25,6 +29,71 @@ def index():
     return render_template("chat.html")
 
 
+def answer_question(msg):
+    """
+    Answer a chat message from the answer cache or with a pooled QA object.
+
+    Shared by the sync route and the async route of ``chat_mcq.asgi``, the
+    caller must provide the application context.
+
+    Args:
+        msg (str): The user's question.
+
+    Returns:
+        tuple: The answer, or the busy message, and the HTTP status code.
+    """
+    # The LangChain modules are only imported on the first chat request.
+    from ..model.llama_model.context import pack_retrieved
+    from ..model.llama_model.streaming import StageTimingHandler
+    from ..model.llama_model.streaming import serialize_documents
+
+    # Record the start time for processing the query
+    start_time = time.time()
+
+    # Log the received query
+    current_app.logger.info(f"Query received: {msg}")
+
+    # Answer from the cache if a similar enough question was answered before
+    cached, vector = qa_engine.cached_answer(msg)
+    if cached:
+        current_app.logger.info(
+            f"{round(time.time() - start_time, 4)}s time taken to answer from the cache "
+            f"(similarity {round(cached['similarity'], 3)}): {cached['result']}"
+        )
+        return str(cached["result"]), 200
+
+    # Retrieve before borrowing a QA object, concurrent retrievals are batched
+    handler = StageTimingHandler()
+    documents = qa_engine.retrieve(msg, callbacks=[handler])
+
+    # Borrow a warm QA object from the pool and answer from the documents
+    try:
+        with qa_engine.acquire() as qa:
+            documents = pack_retrieved(qa.retriever, msg, documents)
+            result = qa.combine_documents_chain.invoke(
+                {"input_documents": documents, "question": msg},
+                config={"callbacks": [handler]},
+            )
+    except QAEngineBusy as e:
+        current_app.logger.warning(str(e))
+        return str(e), 503
+    answer = result["output_text"]
+
+    # Remember the answer for the next similar question
+    qa_engine.remember_answer(msg, vector, answer, serialize_documents(documents))
+
+    # Record the end time after processing the query
+    end_time = time.time()
+
+    # Log the time taken to process the query and the result
+    current_app.logger.info(
+        f"{round(end_time - start_time, 2)}s time taken to process the output: {answer}"
+    )
+
+    # Return the result from the QA system as a string
+    return str(answer), 200
+
+
 @question_answer.route("/chat/get", methods=["POST"])
 def chat():
     """
@@ -43,25 +112,43 @@ def chat():
     # Extract the message from the form
     msg = request.form["msg"]
 
-    # Get the QA object for processing the query
-    qa = get_qa_object()
+    return answer_question(msg)
 
-    # Record the start time for processing the query
-    start_time = time.time()
 
-    # Log the received query
-    current_app.logger.info(f"Query received: {msg}")
+@question_answer.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """
+    Streams the answer to a chat message as Server-Sent Events.
 
-    # Process the query using the QA system
-    result = qa({"query": msg})
+    The source documents are sent first in a ``sources`` event, then every
+    generated token in a ``token`` event and finally the whole answer in a
+    ``done`` event. Generation is cancelled if the client disconnects.
 
-    # Record the end time after processing the query
-    end_time = time.time()
+    Returns:
+        Response: The ``text/event-stream`` response.
+    """
+    # The LangChain modules are only imported on the first chat request.
+    from ..model.llama_model.streaming import stream_answer
 
-    # Log the time taken to process the query and the result
-    current_app.logger.info(
-        f"{round(end_time - start_time, 2)}s time taken to process the output: {result['result']}"
+    # Extract the message from the form
+    msg = request.form["msg"]
+
+    # Log the received query
+    current_app.logger.info(f"Streaming query received: {msg}")
+
+    return Response(
+        stream_with_context(stream_answer(qa_engine, msg)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
-    # Return the result from the QA system as a string
-    return str(result["result"])
+
+@question_answer.route("/chat/status")
+def status():
+    """
+    Reports whether the QA models are loaded and how busy the pool is.
+
+    Returns:
+        JSON: The warm/cold state, pool usage and queue depth of the QA engine.
+    """
+    return jsonify(qa_engine.status())
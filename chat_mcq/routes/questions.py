@@ -0,0 +1,147 @@
+import re
+from datetime import datetime
+
+from flask import Blueprint
+from flask import abort
+from flask import current_app
+from flask import jsonify
+from flask import request
+from sqlalchemy import column
+from sqlalchemy import table
+from sqlalchemy.orm import contains_eager
+
+from ..extensions import db
+from ..migrations import QUESTION_SEARCH_TABLE
+from ..models import MCQ
+from ..models import Question
+
+questions = Blueprint("questions", __name__)
+
+# Max number of questions returned by one page of the listing
+MAX_PER_PAGE = 100
+
+
+def parse_datetime(name):
+    """
+    Read an ISO 8601 datetime from the query string.
+
+    Args:
+        name (str): The name of the query parameter.
+
+    Returns:
+        datetime: The parsed value, None if the parameter is missing.
+    """
+    value = request.args.get(name)
+    if not value:
+        return None
+
+    try:
+        return datetime.fromisoformat(value.rstrip("Z"))
+    except ValueError:
+        abort(400, f"{name} must be an ISO 8601 datetime.")
+
+
+# The full-text index of the question text, see ``create_question_search``
+question_search = table(
+    QUESTION_SEARCH_TABLE, column("rowid"), column(QUESTION_SEARCH_TABLE)
+)
+
+
+def search_filter(search):
+    """
+    Build the filter of the questions matching the search.
+
+    With the SQLite full-text index, the questions containing words starting
+    with every word of the search match, looked up in the index. Elsewhere,
+    the question text is scanned for the search as a substring.
+
+    Args:
+        search (str): The search from the "q" query parameter.
+
+    Returns:
+        ColumnElement: The condition on the questions.
+    """
+    words = re.findall(r"\w+", search)
+    if not words or not current_app.extensions.get("question_search"):
+        return Question.text.ilike(f"%{search}%")
+
+    # Quote the words, so the FTS5 query syntax in the search is not parsed.
+    match = " ".join(f'"{word}"*' for word in words)
+    return Question.id.in_(
+        db.select(question_search.c.rowid).where(
+            question_search.c[QUESTION_SEARCH_TABLE].match(match)
+        )
+    )
+
+
+@questions.route("/questions")
+def list_questions():
+    """
+    Handle the route for listing and searching the stored questions.
+
+    The questions are filtered by the optional "subject", "complexity",
+    "mcq_id", "created_after" and "created_before" query parameters, and "q"
+    searches the words of the question text. The newest questions come first.
+
+    Returns:
+        JSON: One page of questions with the pagination details.
+    """
+    # Join the quiz, the filters and the serialized questions need it.
+    query = (
+        db.select(Question)
+        .join(Question.quiz)
+        .options(contains_eager(Question.quiz))
+        .order_by(Question.id.desc())
+    )
+
+    # Apply the filters given in the query string.
+    subject = request.args.get("subject")
+    if subject:
+        query = query.where(MCQ.subject == subject)
+
+    complexity = request.args.get("complexity")
+    if complexity:
+        query = query.where(MCQ.complexity == complexity)
+
+    mcq_id = request.args.get("mcq_id", type=int)
+    if mcq_id is not None:
+        query = query.where(Question.mcq_id == mcq_id)
+
+    created_after = parse_datetime("created_after")
+    if created_after:
+        query = query.where(MCQ.created_at >= created_after)
+
+    created_before = parse_datetime("created_before")
+    if created_before:
+        query = query.where(MCQ.created_at < created_before)
+
+    search = request.args.get("q")
+    if search:
+        query = query.where(search_filter(search))
+
+    page = db.paginate(query, max_per_page=MAX_PER_PAGE)
+
+    return jsonify(
+        {
+            "items": [question.to_dict() for question in page.items],
+            "page": page.page,
+            "per_page": page.per_page,
+            "pages": page.pages,
+            "total": page.total,
+        }
+    )
+
+
+@questions.route("/questions/<int:question_id>")
+def get_question(question_id):
+    """
+    Handle the route for fetching one stored question.
+
+    Args:
+        question_id (int): The ID of the question.
+
+    Returns:
+        JSON: The question with its options and the quiz it belongs to.
+    """
+    question = db.get_or_404(Question, question_id)
+    return jsonify(question.to_dict())
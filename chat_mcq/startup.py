@@ -0,0 +1,91 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+# Run in a fresh interpreter, so the imports are timed from a cold start
+PROFILE_SCRIPT = """
+import json
+import time
+
+start = time.perf_counter()
+from chat_mcq.factory import create_app
+
+imported = time.perf_counter()
+app = create_app()
+done = time.perf_counter()
+
+print(json.dumps({
+    "import": imported - start,
+    "total": done - start,
+    "steps": app.extensions["startup_timings"],
+}))
+"""
+
+
+def parse_importtime(output):
+    """
+    Parse the report of ``python -X importtime``.
+
+    Args:
+        output (str): The standard error of the interpreter.
+
+    Returns:
+        list: The (module, self seconds, cumulative seconds) of every import,
+            in the order they finished.
+    """
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        imports.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6))
+
+    return imports
+
+
+def import_time_by_package(imports):
+    """
+    Add up the import time of the modules of every top level package.
+
+    Args:
+        imports (list): The imports returned by ``parse_importtime``.
+
+    Returns:
+        list: The (package, seconds) pairs, slowest first. The modules of
+            this project are kept apart.
+    """
+    totals = defaultdict(float)
+    for name, self_seconds, _ in imports:
+        package = name if name.startswith("chat_mcq") else name.split(".")[0]
+        totals[package] += self_seconds
+
+    return sorted(totals.items(), key=lambda item: -item[1])
+
+
+def profile_startup():
+    """
+    Create the app in a new interpreter and time its imports and init steps.
+
+    Returns:
+        dict: The seconds spent importing the factory, in every step of
+            ``create_app`` and in total, and the import time by package.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([root] + sys.path))
+
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROFILE_SCRIPT],
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=root,
+    )
+    if process.returncode != 0:
+        raise RuntimeError(f"create_app() failed:\n{process.stderr[-2000:]}")
+
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    result["packages"] = import_time_by_package(parse_importtime(process.stderr))
+    return result
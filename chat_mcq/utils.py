@@ -104,6 +104,7 @@ def generate_mcqs(
                     "subject": subject,
                     "tone": tone,
                     "response_json": json.dumps(response_json),
+                    "exclude": "",
                 }
             )
             current_app.logger.debug(
@@ -0,0 +1,120 @@
+import re
+from difflib import SequenceMatcher
+from functools import lru_cache
+
+# Model whose tokenizer measures the sections
+TOKENIZER_MODEL = "gpt-4o"
+
+# Min word level similarity ratio for two questions to count as duplicates
+DUPLICATE_THRESHOLD = 0.85
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    import tiktoken
+
+    return tiktoken.encoding_for_model(TOKENIZER_MODEL)
+
+
+def count_tokens(text):
+    """
+    Count the tokens of the text with the tokenizer of the OpenAI model.
+
+    Args:
+        text (str): The text to measure.
+
+    Returns:
+        int: The number of tokens.
+    """
+    return len(_encoding().encode(text, disallowed_special=()))
+
+
+def split_sections(text, max_tokens):
+    """
+    Split the text into sections of at most ``max_tokens`` tokens.
+
+    Args:
+        text (str): The text of the document.
+        max_tokens (int): The token budget of one section.
+
+    Returns:
+        list: The text of every section.
+    """
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        model_name=TOKENIZER_MODEL, chunk_size=max_tokens, chunk_overlap=0
+    )
+    return [section for section in splitter.split_text(text) if section.strip()]
+
+
+def distribute_count(total, sections):
+    """
+    Spread the number of questions over the sections, proportionally to their size.
+
+    Uses the largest remainder method, so the counts always add up to the
+    total, and a section gets no question only when there are more sections
+    than questions.
+
+    Args:
+        total (int): The number of questions to generate.
+        sections (list): The text of every section.
+
+    Returns:
+        list: The number of questions to generate from every section.
+    """
+    sizes = [len(section) for section in sections]
+    size_sum = sum(sizes) or 1
+    shares = [total * size / size_sum for size in sizes]
+    counts = [int(share) for share in shares]
+
+    by_remainder = sorted(
+        range(len(sections)), key=lambda i: shares[i] - counts[i], reverse=True
+    )
+    for i in by_remainder[: total - sum(counts)]:
+        counts[i] += 1
+
+    return counts
+
+
+def _normalize_question(question):
+    """Lowercase the question, drop punctuation and split it into words."""
+    return re.sub(r"[^\w\s]", " ", question.lower()).split()
+
+
+def merge_quizzes(quizzes, limit=None, threshold=DUPLICATE_THRESHOLD):
+    """
+    Merge the quizzes of the sections into one, dropping near duplicates.
+
+    The questions keep their order and are renumbered "1", "2", ... like the
+    keys of ``data/response.json``.
+
+    Args:
+        quizzes (list): The quiz dict of every section.
+        limit (int): Max number of questions to keep.
+        threshold (float): Min similarity ratio for two questions to be
+            considered duplicates.
+
+    Returns:
+        dict: The merged quiz.
+    """
+    merged = {}
+    seen = []
+    for quiz in quizzes:
+        for question in quiz.values():
+            if not isinstance(question, dict) or "mcq" not in question:
+                continue
+
+            normalized = _normalize_question(question["mcq"])
+            if any(
+                SequenceMatcher(None, normalized, other).ratio() >= threshold
+                for other in seen
+            ):
+                continue
+
+            seen.append(normalized)
+            merged[str(len(merged) + 1)] = question
+            if limit and len(merged) >= limit:
+                return merged
+
+    return merged
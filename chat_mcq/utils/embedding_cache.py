@@ -0,0 +1,190 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from ..metrics import timed
+
+# Max number of keys per SQLite "IN (...)" lookup
+SQLITE_BATCH_SIZE = 500
+
+
+def normalize_text(text):
+    """
+    Normalize the text before hashing so whitespace changes still hit the cache.
+
+    Args:
+        text (str): The text to normalize.
+
+    Returns:
+        str: The text with runs of whitespace collapsed to one space.
+    """
+    return " ".join(text.split())
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper caching the vectors in memory and on disk.
+
+    Vectors are keyed by the hash of the model name and the normalized text.
+    Lookups go through an in-memory LRU first, then the SQLite table, and all
+    the remaining misses of a call are embedded with a single
+    ``embed_documents`` call on the wrapped model.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: str,
+        path: str = None,
+        memory_size: int = 10000,
+    ):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.path = path
+        self.memory_size = memory_size
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._connection = None
+
+        if path:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+
+            # Shared by the threads of the process, every use holds the lock.
+            self._connection = sqlite3.connect(path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            self._connection.commit()
+
+    def key(self, text):
+        """
+        Build the cache key of the text.
+
+        Args:
+            text (str): The text to embed.
+
+        Returns:
+            str: The hash of the model name and the normalized text.
+        """
+        value = f"{self.model_name}\0{normalize_text(text)}"
+        return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+    def embed_documents(self, texts):
+        """
+        Embed the texts, computing only the ones missing from the cache.
+
+        Args:
+            texts (list): The texts to embed.
+
+        Returns:
+            list: The embedding of every text.
+        """
+        keys = [self.key(text) for text in texts]
+        vectors = self._lookup(keys)
+
+        # Embed every distinct miss in one forward pass.
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in missing:
+                missing[key] = text
+
+        if missing:
+            with timed("embedding"):
+                computed = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing, computed))
+            self._store(computed)
+            vectors.update(computed)
+
+        return [list(vectors[key]) for key in keys]
+
+    def embed_query(self, text):
+        """
+        Embed the query, from the cache when it was seen before.
+
+        Args:
+            text (str): The query to embed.
+
+        Returns:
+            list: The embedding of the query.
+        """
+        key = self.key(text)
+        vectors = self._lookup([key])
+        if key in vectors:
+            return list(vectors[key])
+
+        with timed("embedding"):
+            vector = self.embeddings.embed_query(text)
+        self._store({key: vector})
+        return vector
+
+    def stats(self):
+        """
+        Report the hit and miss counters of the cache.
+
+        Returns:
+            dict: The hits per tier, the misses and the size of the memory tier.
+        """
+        with self._lock:
+            return dict(self._stats, memory_entries=len(self._memory))
+
+    def _lookup(self, keys):
+        """Find the cached vectors of the keys, memory first and then disk."""
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                    self._stats["memory_hits"] += 1
+
+            remaining = list({key for key in keys if key not in found})
+            if self._connection is not None and remaining:
+                for start in range(0, len(remaining), SQLITE_BATCH_SIZE):
+                    batch = remaining[start : start + SQLITE_BATCH_SIZE]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = self._connection.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                        batch,
+                    )
+                    for key, blob in rows:
+                        vector = np.frombuffer(blob, dtype=np.float32).tolist()
+                        found[key] = vector
+                        self._remember(key, vector)
+                        self._stats["disk_hits"] += 1
+
+            self._stats["misses"] += sum(1 for key in keys if key not in found)
+        return found
+
+    def _store(self, vectors):
+        """Save the freshly computed vectors in both tiers."""
+        with self._lock:
+            for key, vector in vectors.items():
+                self._remember(key, vector)
+
+            if self._connection is not None:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [
+                        (key, np.asarray(vector, dtype=np.float32).tobytes())
+                        for key, vector in vectors.items()
+                    ],
+                )
+                self._connection.commit()
+
+    def _remember(self, key, vector):
+        """Put the vector in the memory tier, evicting the least recently used."""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
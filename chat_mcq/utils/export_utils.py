@@ -0,0 +1,158 @@
+import csv
+import io
+import json
+import zipfile
+
+
+def question_rows(mcqs):
+    """
+    Flatten a quiz into one row per question.
+
+    Args:
+        mcqs (dict): The quiz in the ``response.json`` format.
+
+    Yields:
+        tuple: The key, question, options and correct answer of every question.
+    """
+    for key, value in mcqs.items():
+        yield key, value["mcq"], value["options"], value["correct"]
+
+
+def iter_csv(mcqs):
+    """
+    Stream the quiz as CSV, one line at a time.
+
+    Args:
+        mcqs (dict): The quiz in the ``response.json`` format.
+
+    Yields:
+        bytes: The encoded header, then one encoded line per question.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        data = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    writer.writerow(["MCQ", "Choices", "Correct"])
+    yield flush()
+
+    for _, mcq, options, correct in question_rows(mcqs):
+        writer.writerow(
+            [mcq, " || ".join([f"{k} => {v}" for k, v in options.items()]), correct]
+        )
+        yield flush()
+
+
+def iter_jsonl(mcqs):
+    """
+    Stream the quiz as JSON Lines, one question per line.
+
+    Args:
+        mcqs (dict): The quiz in the ``response.json`` format.
+
+    Yields:
+        bytes: One encoded JSON object per question.
+    """
+    for key, mcq, options, correct in question_rows(mcqs):
+        line = json.dumps(
+            {"key": key, "mcq": mcq, "options": options, "correct": correct}
+        )
+        yield (line + "\n").encode("utf-8")
+
+
+def iter_parquet(mcqs):
+    """
+    Encode the quiz as a Parquet file in memory.
+
+    Parquet writes its footer last, so the file is built in a buffer and
+    yielded as a single chunk.
+
+    Args:
+        mcqs (dict): The quiz in the ``response.json`` format.
+
+    Yields:
+        bytes: The Parquet file.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema(
+        [
+            ("key", pa.string()),
+            ("mcq", pa.string()),
+            ("options", pa.map_(pa.string(), pa.string())),
+            ("correct", pa.string()),
+        ]
+    )
+    rows = [
+        {
+            "key": key,
+            "mcq": mcq,
+            "options": list(options.items()),
+            "correct": correct,
+        }
+        for key, mcq, options, correct in question_rows(mcqs)
+    ]
+
+    buffer = io.BytesIO()
+    pq.write_table(pa.Table.from_pylist(rows, schema=schema), buffer)
+    yield buffer.getvalue()
+
+
+# Supported export formats: file extension, mimetype and encoder
+EXPORT_FORMATS = {
+    "csv": ("csv", "text/csv", iter_csv),
+    "jsonl": ("jsonl", "application/x-ndjson", iter_jsonl),
+    "parquet": ("parquet", "application/vnd.apache.parquet", iter_parquet),
+}
+
+
+class _ChunkSink:
+    """Write-only file object collecting what the zip writer outputs."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_zip(entries):
+    """
+    Stream a zip archive without a temporary file.
+
+    The sink isn't seekable, so ``zipfile`` writes data descriptors after
+    every entry and the archive can be sent while it is being built.
+
+    Args:
+        entries (Iterable[tuple]): The file name and the iterable of byte
+            chunks of every entry.
+
+    Yields:
+        bytes: The archive, chunk by chunk.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, chunks in entries:
+            with archive.open(name, "w", force_zip64=True) as file:
+                for chunk in chunks:
+                    file.write(chunk)
+                    data = sink.pop()
+                    if data:
+                        yield data
+            yield sink.pop()
+
+    yield sink.pop()
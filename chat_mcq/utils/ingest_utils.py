@@ -0,0 +1,307 @@
+import hashlib
+import itertools
+import json
+import os
+import time
+
+from .opensource_utils import iter_text_split
+from .pdf_utils import iter_pdf_pages
+
+# Number of chunks embedded and upserted per vector store call
+UPSERT_BATCH_SIZE = 256
+
+
+def file_hash(path):
+    """
+    Compute the SHA-256 of the file content without reading it all at once.
+
+    Args:
+        path (str): The path of the file.
+
+    Returns:
+        str: The hex digest of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def text_hash(text):
+    """
+    Compute the SHA-256 of the text.
+
+    Args:
+        text (str): The text to hash.
+
+    Returns:
+        str: The hex digest of the UTF-8 encoded text.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_id(source, content_hash, occurrence):
+    """
+    Build the deterministic vector id of a chunk.
+
+    The id only depends on the source file, the chunk content and how many
+    identical chunks came before it in the same file, so re-ingesting the same
+    content always upserts onto the same ids.
+
+    Args:
+        source (str): The path of the file relative to the data directory.
+        content_hash (str): The hash of the chunk text.
+        occurrence (int): Index of this chunk among identical chunks of the file.
+
+    Returns:
+        str: The chunk id.
+    """
+    key = f"{source}\0{content_hash}\0{occurrence}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+def load_manifest(path):
+    """
+    Load the ingestion manifest, or an empty one if it doesn't exist yet.
+
+    Args:
+        path (str): The path of the manifest file.
+
+    Returns:
+        dict: The manifest with the hash and chunk ids of every ingested file.
+    """
+    if not os.path.exists(path):
+        return {"version": 0, "files": {}}
+
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def save_manifest(manifest, path):
+    """
+    Atomically write the ingestion manifest.
+
+    Args:
+        manifest (dict): The manifest to save.
+        path (str): The path of the manifest file.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(manifest, file)
+    os.replace(tmp_path, path)
+
+
+def get_index_version(path):
+    """
+    Read the version of the ingested index, bumped on every ingest that changes it.
+
+    Args:
+        path (str): The path of the manifest file.
+
+    Returns:
+        int: The index version, 0 if nothing was ingested yet.
+    """
+    return load_manifest(path).get("version", 0)
+
+
+def key_chunks(pages, source):
+    """
+    Split the pages of one file into chunks keyed by their deterministic ids.
+
+    Args:
+        pages (Iterable[Document]): The pages of the file, in order.
+        source (str): The path of the file relative to the data directory.
+
+    Returns:
+        dict: The chunk documents by chunk id, in document order.
+    """
+    chunks = {}
+    seen = {}
+    for chunk in iter_text_split(pages):
+        content_hash = text_hash(chunk.page_content)
+        occurrence = seen.get(content_hash, 0)
+        seen[content_hash] = occurrence + 1
+
+        chunk.metadata["source"] = source
+        chunk.metadata["content_hash"] = content_hash
+        chunks[chunk_id(source, content_hash, occurrence)] = chunk
+    return chunks
+
+
+def upsert_chunks(store, chunks):
+    """
+    Embed and upsert the chunks into the vector store in batches.
+
+    Args:
+        store (VectorStore): The vector store to write to.
+        chunks (dict): The chunk documents by chunk id.
+    """
+    items = list(chunks.items())
+    for start in range(0, len(items), UPSERT_BATCH_SIZE):
+        batch = items[start : start + UPSERT_BATCH_SIZE]
+        store.add_texts(
+            [chunk.page_content for _, chunk in batch],
+            metadatas=[chunk.metadata for _, chunk in batch],
+            ids=[id for id, _ in batch],
+        )
+
+
+def ingest_directory(
+    directory,
+    store,
+    manifest_path,
+    max_workers=None,
+    logger=None,
+    lexical_index=None,
+):
+    """
+    Bring the vector store in sync with the PDFs of the directory.
+
+    Only the files whose content hash changed since the last run are parsed
+    and split, only their new chunks are embedded and upserted, and the
+    vectors of chunks or files that disappeared are deleted. Running it twice
+    on the same directory doesn't touch the store the second time.
+
+    The changed files are parsed across a pool of processes and streamed one
+    file at a time into the splitter. A file that fails to parse is reported
+    and keeps its previous vectors.
+
+    The lexical index, when given, gets the same chunks added and deleted.
+    An empty one is filled from every file, without re-embedding the chunks
+    already in the vector store.
+
+    The returned manifest must be saved with ``save_manifest`` once the
+    store is persisted, so a crash in between only repeats idempotent work.
+
+    Args:
+        directory (str): The directory holding the PDF files.
+        store (VectorStore): The vector store to sync.
+        manifest_path (str): The path of the ingestion manifest.
+        max_workers (int): Number of PDF parsing processes, defaults to the CPUs.
+        logger (logging.Logger): Optional logger for the progress.
+        lexical_index (BM25Index): Optional BM25 index kept in sync.
+
+    Returns:
+        tuple: The updated manifest, and counts of the scanned, changed,
+            removed and failed files and of the added and deleted chunks.
+    """
+    manifest = load_manifest(manifest_path)
+    old_files = manifest["files"]
+    new_files = {}
+    changed = {}
+    failed = set()
+    stats = {
+        "files_scanned": 0,
+        "files_changed": 0,
+        "files_removed": 0,
+        "files_failed": 0,
+        "chunks_added": 0,
+        "chunks_deleted": 0,
+    }
+
+    # Split every file again to fill an empty lexical index.
+    rebuild_lexical = lexical_index is not None and not len(lexical_index)
+
+    # Hash every file to find the new and changed ones.
+    for root, _, filenames in os.walk(directory):
+        for filename in sorted(filenames):
+            if not filename.lower().endswith(".pdf"):
+                continue
+
+            path = os.path.join(root, filename)
+            source = os.path.relpath(path, directory).replace(os.sep, "/")
+            stats["files_scanned"] += 1
+
+            digest = file_hash(path)
+            previous = old_files.get(source)
+            if previous and previous["hash"] == digest and not rebuild_lexical:
+                new_files[source] = previous
+            else:
+                changed[path] = (source, digest)
+
+    def on_error(path, error):
+        failed.add(path)
+        if logger:
+            logger.warning(f"Failed to extract {path}: {error}")
+
+    # The pages come back in file order, diff the chunks of one file at a time.
+    pages = iter_pdf_pages(list(changed), max_workers=max_workers, on_error=on_error)
+    for path, file_pages in itertools.groupby(
+        pages, key=lambda page: page.metadata["source"]
+    ):
+        source, digest = changed[path]
+        chunks = key_chunks(file_pages, source)
+
+        # Errors of a file are reported before any page of the next one.
+        if path in failed:
+            continue
+
+        previous = old_files.get(source)
+        old_chunks = previous["chunks"] if previous else {}
+        added = {id: chunk for id, chunk in chunks.items() if id not in old_chunks}
+        deleted = [id for id in old_chunks if id not in chunks]
+
+        if deleted:
+            store.delete(ids=deleted)
+        upsert_chunks(store, added)
+
+        if lexical_index is not None:
+            lexical_index.delete(ids=deleted)
+            missing = {
+                id: chunk for id, chunk in chunks.items() if id not in lexical_index
+            }
+            lexical_index.add_texts(
+                [chunk.page_content for chunk in missing.values()],
+                metadatas=[chunk.metadata for chunk in missing.values()],
+                ids=list(missing),
+            )
+
+        new_files[source] = {
+            "hash": digest,
+            "chunks": {
+                id: chunk.metadata["content_hash"] for id, chunk in chunks.items()
+            },
+        }
+        if not previous or previous["hash"] != digest:
+            stats["files_changed"] += 1
+        stats["chunks_added"] += len(added)
+        stats["chunks_deleted"] += len(deleted)
+
+        if logger:
+            logger.info(
+                f"Ingested {source}: {len(added)} chunks added, {len(deleted)} deleted."
+            )
+
+    # Keep the previous vectors of the files that failed to parse.
+    for path in failed:
+        source, _ = changed[path]
+        stats["files_failed"] += 1
+        if source in old_files:
+            new_files[source] = old_files[source]
+
+    # Drop the vectors of the files that are gone.
+    for source, previous in old_files.items():
+        if source in new_files:
+            continue
+
+        store.delete(ids=list(previous["chunks"]))
+        if lexical_index is not None:
+            lexical_index.delete(ids=list(previous["chunks"]))
+        stats["files_removed"] += 1
+        stats["chunks_deleted"] += len(previous["chunks"])
+
+        if logger:
+            logger.info(f"Removed {source}: {len(previous['chunks'])} chunks deleted.")
+
+    modified = stats["files_changed"] or stats["files_removed"]
+    manifest = {
+        "version": manifest.get("version", 0) + (1 if modified else 0),
+        "updated_at": time.time() if modified else manifest.get("updated_at"),
+        "files": new_files,
+    }
+
+    return manifest, stats
@@ -0,0 +1,234 @@
+import os
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Max tokens per text, the sequence length all-MiniLM-L6-v2 was trained with
+MAX_SEQ_LENGTH = 256
+
+# Min cosine similarity between the ONNX and PyTorch vectors of a text
+PARITY_MIN_COSINE = 0.99
+
+# Texts of the parity check when none are given
+PARITY_TEXTS = [
+    "What is photosynthesis?",
+    "Newton's second law states that force equals mass times acceleration.",
+    "The mitochondria is the powerhouse of the cell, producing most of the "
+    "chemical energy needed to power the cell's biochemical reactions.",
+    "Explain the causes of the French Revolution and its effects on Europe.",
+    "a",
+    "Water boils at 100 degrees Celsius at sea level. " * 40,
+]
+
+
+def model_directory(model_name, directory):
+    """
+    Get the directory of the exported model.
+
+    Args:
+        model_name (str): The Hugging Face name of the model.
+        directory (str): The directory of the exported models.
+
+    Returns:
+        str: The directory of this model.
+    """
+    return os.path.join(directory, model_name.replace("/", "--"))
+
+
+def export_onnx(model_name, directory, quantize=True):
+    """
+    Export the transformer of a sentence-transformers model to ONNX.
+
+    The export needs torch and transformers, and only runs once: the model,
+    its int8 version and the tokenizer are kept in ``directory`` and reused.
+
+    Args:
+        model_name (str): The Hugging Face name of the model.
+        directory (str): The directory of the exported models.
+        quantize (bool): Also quantize the weights to int8.
+
+    Returns:
+        str: The path of the ONNX model, the int8 one when quantized.
+    """
+    directory = model_directory(model_name, directory)
+    model_path = os.path.join(directory, "model.onnx")
+    os.makedirs(directory, exist_ok=True)
+
+    # Export the float model and the tokenizer of the first run.
+    if not os.path.exists(model_path):
+        import torch
+        from transformers import AutoModel
+        from transformers import AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name).eval()
+        tokenizer.save_pretrained(directory)
+
+        inputs = tokenizer(["An example sentence."], return_tensors="pt")
+        # In the order of the forward arguments, the graph inputs follow it.
+        input_names = [
+            name
+            for name in ("input_ids", "attention_mask", "token_type_ids")
+            if name in inputs
+        ]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+        # Written under another name first, a partial file is never reused.
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                ({name: inputs[name] for name in input_names},),
+                model_path + ".tmp",
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+            )
+        os.replace(model_path + ".tmp", model_path)
+
+    if not quantize:
+        return model_path
+
+    # Quantize the weights of the matrix multiplications to int8.
+    quantized_path = os.path.join(directory, "model.int8.onnx")
+    if not os.path.exists(quantized_path):
+        from onnxruntime.quantization import QuantType
+        from onnxruntime.quantization import quantize_dynamic
+
+        quantize_dynamic(
+            model_path, quantized_path + ".tmp", weight_type=QuantType.QInt8
+        )
+        os.replace(quantized_path + ".tmp", quantized_path)
+
+    return quantized_path
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence embeddings computed with onnxruntime, without torch.
+
+    The texts of a call are tokenized at once, sorted by length and embedded
+    in batches padded to their longest text only, so short texts don't pay
+    for the long ones. The token vectors are mean pooled over the attention
+    mask and normalized, like the sentence-transformers pipeline.
+
+    Args:
+        model_name (str): The Hugging Face name of the model.
+        directory (str): The directory of the exported models, the model is
+            exported there when missing.
+        quantize (bool): Use the int8 model.
+        batch_size (int): Max number of texts per forward pass.
+        threads (int): Threads of a forward pass, defaults to onnxruntime's.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        directory: str,
+        quantize: bool = True,
+        batch_size: int = 32,
+        threads: int = None,
+    ):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        model_path = export_onnx(model_name, directory, quantize)
+
+        self.tokenizer = Tokenizer.from_file(
+            os.path.join(model_directory(model_name, directory), "tokenizer.json")
+        )
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.no_padding()
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = (
+            onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            model_path, options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {node.name for node in self.session.get_inputs()}
+        self.dimension = self.session.get_outputs()[0].shape[-1]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+
+        # Tokenize everything, then batch the texts of similar lengths.
+        encodings = self.tokenizer.encode_batch(list(texts))
+        order = sorted(range(len(texts)), key=lambda i: len(encodings[i].ids))
+
+        vectors = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for start in range(0, len(order), self.batch_size):
+            indices = order[start : start + self.batch_size]
+            vectors[indices] = self._embed_batch([encodings[i] for i in indices])
+
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def _embed_batch(self, encodings):
+        """Embed tokenized texts, padded to the longest of the batch."""
+        length = max(len(encoding.ids) for encoding in encodings)
+        input_ids = np.zeros((len(encodings), length), dtype=np.int64)
+        attention_mask = np.zeros((len(encodings), length), dtype=np.int64)
+        token_type_ids = np.zeros((len(encodings), length), dtype=np.int64)
+
+        for row, encoding in enumerate(encodings):
+            size = len(encoding.ids)
+            input_ids[row, :size] = encoding.ids
+            attention_mask[row, :size] = encoding.attention_mask
+            token_type_ids[row, :size] = encoding.type_ids
+
+        inputs = {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "token_type_ids": token_type_ids,
+        }
+        tokens = self.session.run(
+            ["last_hidden_state"],
+            {name: value for name, value in inputs.items() if name in self.input_names},
+        )[0]
+
+        # Mean pool the tokens of every text, then normalize.
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (tokens * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.clip(norms, 1e-12, None)
+
+
+def parity_check(embeddings, reference, texts=None):
+    """
+    Compare the vectors of two embedding models on the same texts.
+
+    Args:
+        embeddings (Embeddings): The model checked, e.g. ``OnnxEmbeddings``.
+        reference (Embeddings): The reference model, e.g. the PyTorch one.
+        texts (list): The texts to embed, defaults to ``PARITY_TEXTS``.
+
+    Returns:
+        dict: The min and mean cosine similarity and the max absolute
+            difference between the vectors of a text, and whether the min
+            cosine similarity reaches ``PARITY_MIN_COSINE``.
+    """
+    texts = texts or PARITY_TEXTS
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    expected = np.asarray(reference.embed_documents(texts), dtype=np.float32)
+
+    cosines = (vectors * expected).sum(axis=1) / (
+        np.linalg.norm(vectors, axis=1) * np.linalg.norm(expected, axis=1)
+    )
+    return {
+        "texts": len(texts),
+        "min_cosine": float(cosines.min()),
+        "mean_cosine": float(cosines.mean()),
+        "max_abs_diff": float(np.abs(vectors - expected).max()),
+        "ok": bool(cosines.min() >= PARITY_MIN_COSINE),
+    }
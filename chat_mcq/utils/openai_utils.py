@@ -1,13 +1,23 @@
+import asyncio
 import json
 import os
 import traceback
 
-import PyPDF2
 from flask import current_app
-from langchain_community.callbacks import get_openai_callback
 from werkzeug.datastructures.file_storage import FileStorage
 
-from ..model.openai_model.mcq_generator import generate_evaluate_chain
+from ..metrics import record_usage
+from ..metrics import timed
+from ..model.openai_model.mcq_generator import OPENAI_MODEL_NAME
+from ..model.openai_model.mcq_generator import get_quiz_chain
+from ..model.openai_model.mcq_generator import get_review_chain
+from .chunking_utils import count_tokens
+from .chunking_utils import distribute_count
+from .chunking_utils import merge_quizzes
+from .chunking_utils import split_sections
+
+# Status of the review of a new quiz by review mode
+REVIEW_STATUSES = {"inline": "done", "background": "pending", "skip": "skipped"}
 
 
 def read_file(file: FileStorage):
@@ -23,21 +33,24 @@ def read_file(file: FileStorage):
     Raises:
         Exception: If there is an error reading the PDF file or the file format is unsupported.
     """
-    if file.filename.endswith(".pdf"):
+    filename = file.filename.lower()
+    if filename.endswith(".pdf"):
+        # pypdf is only imported for the first PDF.
+        from .pdf_utils import iter_page_texts
+
         try:
-            # Read and extract text from the PDF file.
-            pdf_reader = PyPDF2.PdfFileReader(file)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text()
-            return text
+            # Read and extract text from the PDF file, joining the pages
+            # once instead of growing the string page by page.
+            with timed("text_extraction"):
+                return "".join(iter_page_texts(file.stream))
 
         except Exception as e:
             raise Exception("Error reading the PDF file")
 
-    elif file.filename.endswith(".txt"):
+    elif filename.endswith(".txt"):
         # Read and decode text from the text file.
-        return file.read().decode("utf-8")
+        with timed("text_extraction"):
+            return file.read().decode("utf-8")
 
     else:
         raise Exception(
@@ -58,7 +71,8 @@ def get_table_data(quiz_str):
     """
     try:
         # Convert the quiz from a string to a dictionary.
-        quiz_dict = json.loads(quiz_str)
+        with timed("json_parse"):
+            quiz_dict = json.loads(quiz_str)
         return quiz_dict
 
     except Exception as e:
@@ -66,11 +80,32 @@ def get_table_data(quiz_str):
         return {}
 
 
+def error_response(message):
+    """
+    Build the response returned when the MCQs couldn't be generated.
+
+    Args:
+        message (str): The reason of the failure.
+
+    Returns:
+        dict: A response without MCQs and with a 400 status code.
+    """
+    return {
+        "data": {},
+        "message": message,
+        "review": "NA",
+        "status_code": 400,
+    }
+
+
 def generate_mcqs(
     file,
     mcq_count,
     subject,
     tone,
+    chunked=None,
+    review_mode="inline",
+    exclude=None,
 ):
     """
     Generate MCQs from the provided file content.
@@ -80,6 +115,10 @@ def generate_mcqs(
         mcq_count (int): The number of MCQs to generate.
         subject (str): The subject of the MCQs.
         tone (str): The tone of the MCQs.
+        chunked (bool): Generate section by section, see ``generate_mcqs_from_text``.
+        review_mode (str): "inline", "background" or "skip", see
+            ``generate_mcqs_from_text``.
+        exclude (list): Questions the MCQs must not repeat.
 
     Returns:
         dict: A response containing the generated MCQs, a message, a review, and a status code.
@@ -88,59 +127,500 @@ def generate_mcqs(
         # Read the content of the file.
         text = read_file(file)
 
-        # Load the response JSON from a file.
-        response_json_file = os.path.join(
-            current_app.config["DATA_DIR"], "response.json"
-        )
-        with open(response_json_file, "r") as file:
-            response_json = json.load(file)
-
-        # Count tokens and cost of the API call.
-        with get_openai_callback() as cb:
-            response = generate_evaluate_chain(
-                {
-                    "text": text,
-                    "number": mcq_count,
-                    "subject": subject,
-                    "tone": tone,
-                    "response_json": json.dumps(response_json),
-                }
+    except Exception as e:
+        # Handle exceptions and return an error response.
+        traceback.print_exception(type(e), e, e.__traceback__)
+        return error_response(f"Error generating MCQs. Error is {str(e)}.")
+
+    return generate_mcqs_from_text(
+        text, mcq_count, subject, tone, chunked, review_mode, exclude
+    )
+
+
+def load_response_json():
+    """
+    Load the example response the LLM must follow.
+
+    Returns:
+        dict: The content of ``response.json`` in the data directory.
+    """
+    response_json_file = os.path.join(current_app.config["DATA_DIR"], "response.json")
+    with open(response_json_file, "r") as file:
+        return json.load(file)
+
+
+def openai_callback():
+    """
+    Count the tokens and cost of the OpenAI calls made in the block.
+
+    ``langchain_community`` is only imported on the first generation.
+
+    Returns:
+        ContextManager: The ``get_openai_callback`` context of the block.
+    """
+    from langchain_community.callbacks import get_openai_callback
+
+    return get_openai_callback()
+
+
+def usage_from_callback(cb):
+    """
+    Extract the token usage from an OpenAI callback handler.
+
+    Args:
+        cb (OpenAICallbackHandler): The handler of ``get_openai_callback``.
+
+    Returns:
+        dict: The prompt, completion and total tokens, and the total cost.
+    """
+    return {
+        "prompt_tokens": cb.prompt_tokens,
+        "completion_tokens": cb.completion_tokens,
+        "total_tokens": cb.total_tokens,
+        "total_cost": cb.total_cost,
+    }
+
+
+def review_batches(quiz_dict, batch_size):
+    """
+    Split the quiz into the batches of questions reviewed together.
+
+    Args:
+        quiz_dict (dict): The quiz in the ``response.json`` format.
+        batch_size (int): Max number of questions per batch, None for one batch.
+
+    Returns:
+        list: The batches, each a quiz of consecutive questions.
+    """
+    items = list(quiz_dict.items())
+    if not batch_size or len(items) <= batch_size:
+        return [quiz_dict]
+
+    return [
+        dict(items[start : start + batch_size])
+        for start in range(0, len(items), batch_size)
+    ]
+
+
+async def areview_quiz(quiz_dict, subject):
+    """
+    Review the quiz with the review chain.
+
+    Quizzes with more than ``MCQ_REVIEW_BATCH_SIZE`` questions are reviewed
+    in batches, at most ``MCQ_CHUNK_CONCURRENCY`` at once, and the reviews of
+    the batches are joined under the keys of their questions.
+
+    Args:
+        quiz_dict (dict): The quiz in the ``response.json`` format.
+        subject (str): The subject of the MCQs.
+
+    Returns:
+        str: The review of the quiz.
+    """
+    batches = review_batches(quiz_dict, current_app.config.get("MCQ_REVIEW_BATCH_SIZE"))
+    semaphore = asyncio.Semaphore(current_app.config.get("MCQ_CHUNK_CONCURRENCY", 4))
+
+    async def review_batch(batch):
+        async with semaphore:
+            with timed("review_llm"):
+                response = await get_review_chain().ainvoke(
+                    {"subject": subject, "quiz": json.dumps(batch)}
+                )
+        return response["review"]
+
+    reviews = await asyncio.gather(*[review_batch(batch) for batch in batches])
+    if len(batches) == 1:
+        return reviews[0]
+
+    return "\n\n".join(
+        f"Questions {next(iter(batch))}-{next(reversed(batch))}:\n{review}"
+        for batch, review in zip(batches, reviews)
+    )
+
+
+def review_quiz(quiz_dict, subject):
+    """
+    Review a quiz generated without its review.
+
+    See ``areview_quiz``.
+
+    Args:
+        quiz_dict (dict): The quiz in the ``response.json`` format.
+        subject (str): The subject of the MCQs.
+
+    Returns:
+        tuple: The review, and the token usage of the review.
+    """
+    # Count tokens and cost of the API calls.
+    with openai_callback() as cb:
+        review = asyncio.run(areview_quiz(quiz_dict, subject))
+
+    usage = usage_from_callback(cb)
+    record_usage(OPENAI_MODEL_NAME, usage)
+    current_app.logger.info(f"Token usage of the MCQ review: {usage}")
+    return review, usage
+
+
+def use_chunks(text, chunked=None):
+    """
+    Decide whether the MCQs are generated section by section.
+
+    Args:
+        text (str): The text to generate the MCQs from.
+        chunked (bool): The mode picked by the caller, None to decide by size.
+
+    Returns:
+        bool: The mode picked by the caller, else whether the text is longer
+            than the ``MCQ_CHUNK_TOKENS`` config.
+    """
+    if chunked is None:
+        max_tokens = current_app.config.get("MCQ_CHUNK_TOKENS")
+        chunked = bool(max_tokens) and count_tokens(text) > max_tokens
+
+    return chunked
+
+
+def exclusion_prompt(exclude):
+    """
+    Build the part of the quiz prompt listing the questions not to repeat.
+
+    Args:
+        exclude (list): The texts of the questions, None or empty for none.
+
+    Returns:
+        str: The instruction and the questions, one per line, or an empty
+            string.
+    """
+    if not exclude:
+        return ""
+
+    questions = "\n".join(f"- {question}" for question in exclude)
+    return (
+        "The quiz already has the following questions. Don't repeat them or ask "
+        f"about the same facts in other words:\n{questions}\n"
+    )
+
+
+def quiz_inputs(text, mcq_count, subject, tone, exclude=None):
+    """
+    Build the inputs of the quiz chain.
+
+    Args:
+        text (str): The text to generate the MCQs from.
+        mcq_count (int): The number of MCQs to generate.
+        subject (str): The subject of the MCQs.
+        tone (str): The tone of the MCQs.
+        exclude (list): Questions the MCQs must not repeat.
+
+    Returns:
+        dict: The prompt variables, with the example response to follow.
+    """
+    # Load the response JSON from a file and build the chain inputs.
+    with timed("prompt_build"):
+        return {
+            "text": text,
+            "number": mcq_count,
+            "subject": subject,
+            "tone": tone,
+            "response_json": json.dumps(load_response_json()),
+            "exclude": exclusion_prompt(exclude),
+        }
+
+
+def quiz_response(quiz_dict, review, review_mode, usage):
+    """
+    Build the response of a successful generation.
+
+    Args:
+        quiz_dict (dict): The generated quiz.
+        review (str): The review, empty unless it ran inline.
+        review_mode (str): "inline", "background" or "skip".
+        usage (dict): The token usage of the generation.
+
+    Returns:
+        dict: The MCQs, a message, the review and its status, the token usage
+            and a 200 status code.
+    """
+    return {
+        "data": quiz_dict,
+        "message": "Quiz created successfully!",
+        "review": review,
+        "review_status": REVIEW_STATUSES[review_mode],
+        "status_code": 200,
+        "usage": usage,
+    }
+
+
+def generate_mcqs_from_text(
+    text,
+    mcq_count,
+    subject,
+    tone,
+    chunked=None,
+    review_mode="inline",
+    exclude=None,
+):
+    """
+    Generate MCQs from already extracted text.
+
+    Args:
+        text (str): The text to generate the MCQs from.
+        mcq_count (int): The number of MCQs to generate.
+        subject (str): The subject of the MCQs.
+        tone (str): The tone of the MCQs.
+        chunked (bool): Generate section by section with
+            ``generate_mcqs_chunked``. Defaults to doing so only when the text
+            is longer than the ``MCQ_CHUNK_TOKENS`` config.
+        review_mode (str): "inline" to review the quiz before returning it,
+            "background" to leave the review to ``review_quiz`` once the quiz
+            is stored, or "skip".
+        exclude (list): Questions the MCQs must not repeat, e.g. the ones
+            already in the quiz.
+
+    Returns:
+        dict: A response containing the generated MCQs, a message, a review,
+            its status, the token usage, and a status code.
+    """
+    try:
+        # Split large texts into sections unless the caller picked the mode.
+        if use_chunks(text, chunked):
+            return generate_mcqs_chunked(
+                text, mcq_count, subject, tone, review_mode, exclude
             )
+
+        inputs = quiz_inputs(text, mcq_count, subject, tone, exclude)
+
+        # Count tokens and cost of the API calls. The review only runs here
+        # when the caller waits for it.
+        with openai_callback() as cb:
+            with timed("quiz_llm"):
+                response = get_quiz_chain().invoke(inputs)
             current_app.logger.debug(
                 f"Response for \ntext: {text}\nMCQ Count: {mcq_count}\nSubject: {subject}\nTone: {tone}\n\n\nResponse: {response}."
             )
 
+            quiz = response.get("quiz", None)
+            quiz_dict = get_table_data(quiz) if quiz else {}
+
+            review = ""
+            if quiz_dict and review_mode == "inline":
+                review = asyncio.run(areview_quiz(quiz_dict, subject))
+
     except Exception as e:
         # Handle exceptions and return an error response.
         traceback.print_exception(type(e), e, e.__traceback__)
-        return {
-            "data": {},
-            "message": f"Error generating MCQs. Error is {str(e)}.",
-            "review": "NA",
-            "status_code": 400,
-        }
+        return error_response(f"Error generating MCQs. Error is {str(e)}.")
 
-    else:
-        # Print token and cost details.
-        print(f"Total Tokens: {cb.total_tokens}")
-        print(f"Prompt Tokens: {cb.prompt_tokens}")
-        print(f"Completion Tokens: {cb.completion_tokens}")
-        print(f"Total Cost: {cb.total_cost}")
+    # Record token and cost details.
+    usage = usage_from_callback(cb)
+    record_usage(OPENAI_MODEL_NAME, usage)
+    current_app.logger.info(f"Token usage of the MCQ generation: {usage}")
+
+    if not quiz:
+        return dict(error_response("Quiz wasn't generated!"), usage=usage)
+
+    return quiz_response(quiz_dict, review, review_mode, usage)
+
+
+async def agenerate_mcqs_from_text(
+    text,
+    mcq_count,
+    subject,
+    tone,
+    chunked=None,
+    review_mode="inline",
+    exclude=None,
+):
+    """
+    Generate MCQs from already extracted text without blocking the event loop.
+
+    The async counterpart of ``generate_mcqs_from_text``, the chains are
+    awaited through their async API.
+
+    Args:
+        text (str): The text to generate the MCQs from.
+        mcq_count (int): The number of MCQs to generate.
+        subject (str): The subject of the MCQs.
+        tone (str): The tone of the MCQs.
+        chunked (bool): Generate section by section, defaults to deciding by
+            the size of the text.
+        review_mode (str): "inline", "background" or "skip".
+        exclude (list): Questions the MCQs must not repeat.
+
+    Returns:
+        dict: A response containing the generated MCQs, a message, a review,
+            its status, the token usage, and a status code.
+    """
+    try:
+        # Split large texts into sections unless the caller picked the mode.
+        # Counting the tokens and reading the example response block, they
+        # run on a thread instead of the event loop.
+        if await asyncio.to_thread(use_chunks, text, chunked):
+            return await agenerate_mcqs_chunked(
+                text, mcq_count, subject, tone, review_mode, exclude
+            )
+
+        inputs = await asyncio.to_thread(
+            quiz_inputs, text, mcq_count, subject, tone, exclude
+        )
+
+        # Count tokens and cost of the API calls.
+        with openai_callback() as cb:
+            with timed("quiz_llm"):
+                response = await get_quiz_chain().ainvoke(inputs)
 
-        if isinstance(response, dict):
             quiz = response.get("quiz", None)
-            if not quiz:
-                return {
-                    "data": {},
-                    "message": "Quiz wasn't generated!",
-                    "review": "NA",
-                    "status_code": 400,
-                }
-
-            quiz_dict = get_table_data(quiz)
-            return {
-                "data": quiz_dict,
-                "message": "Quiz created successfully!",
-                "review": response.get("review", ""),
-                "status_code": 200,
-            }
+            quiz_dict = get_table_data(quiz) if quiz else {}
+
+            review = ""
+            if quiz_dict and review_mode == "inline":
+                review = await areview_quiz(quiz_dict, subject)
+
+    except Exception as e:
+        # Handle exceptions and return an error response.
+        traceback.print_exception(type(e), e, e.__traceback__)
+        return error_response(f"Error generating MCQs. Error is {str(e)}.")
+
+    # Record token and cost details.
+    usage = usage_from_callback(cb)
+    record_usage(OPENAI_MODEL_NAME, usage)
+    current_app.logger.info(f"Token usage of the MCQ generation: {usage}")
+
+    if not quiz:
+        return dict(error_response("Quiz wasn't generated!"), usage=usage)
+
+    return quiz_response(quiz_dict, review, review_mode, usage)
+
+
+def generate_mcqs_chunked(
+    text,
+    mcq_count,
+    subject,
+    tone,
+    review_mode="inline",
+    exclude=None,
+):
+    """
+    Generate MCQs from a large text, one token bounded section at a time.
+
+    See ``agenerate_mcqs_chunked``.
+
+    Args:
+        text (str): The text to generate the MCQs from.
+        mcq_count (int): The number of MCQs to generate.
+        subject (str): The subject of the MCQs.
+        tone (str): The tone of the MCQs.
+        review_mode (str): "inline", "background" or "skip".
+        exclude (list): Questions the MCQs must not repeat.
+
+    Returns:
+        dict: A response containing the generated MCQs, a message, a review,
+            its status, the token usage, and a status code.
+    """
+    return asyncio.run(
+        agenerate_mcqs_chunked(text, mcq_count, subject, tone, review_mode, exclude)
+    )
+
+
+def section_inputs(text, mcq_count):
+    """
+    Split a large text into the sections of the chunked generation.
+
+    Args:
+        text (str): The text to generate the MCQs from.
+        mcq_count (int): The number of MCQs to generate.
+
+    Returns:
+        tuple: The example response to follow as JSON, the sections of
+            ``MCQ_CHUNK_TOKENS`` tokens, and the number of MCQs of every section.
+    """
+    with timed("prompt_build"):
+        response_json = json.dumps(load_response_json())
+        sections = split_sections(text, current_app.config["MCQ_CHUNK_TOKENS"])
+        return response_json, sections, distribute_count(mcq_count, sections)
+
+
+async def agenerate_mcqs_chunked(
+    text,
+    mcq_count,
+    subject,
+    tone,
+    review_mode="inline",
+    exclude=None,
+):
+    """
+    Generate MCQs from a large text, one token bounded section at a time.
+
+    The text is split into sections of ``MCQ_CHUNK_TOKENS`` tokens and the
+    question count is spread over them by size. The quiz chain runs on the
+    sections concurrently, at most ``MCQ_CHUNK_CONCURRENCY`` at once. The
+    section quizzes are merged without near duplicate questions, and the
+    merged quiz is reviewed with ``areview_quiz`` when the review is inline.
+
+    Args:
+        text (str): The text to generate the MCQs from.
+        mcq_count (int): The number of MCQs to generate.
+        subject (str): The subject of the MCQs.
+        tone (str): The tone of the MCQs.
+        review_mode (str): "inline", "background" or "skip".
+        exclude (list): Questions the MCQs must not repeat.
+
+    Returns:
+        dict: A response containing the generated MCQs, a message, a review,
+            its status, the token usage, and a status code.
+    """
+    try:
+        # Tokenize and split the text on a thread, not on the event loop.
+        response_json, sections, counts = await asyncio.to_thread(
+            section_inputs, text, mcq_count
+        )
+        semaphore = asyncio.Semaphore(
+            current_app.config.get("MCQ_CHUNK_CONCURRENCY", 4)
+        )
+
+        async def generate_section(section, count):
+            async with semaphore:
+                with timed("quiz_llm"):
+                    response = await get_quiz_chain().ainvoke(
+                        {
+                            "text": section,
+                            "number": count,
+                            "subject": subject,
+                            "tone": tone,
+                            "response_json": response_json,
+                            "exclude": exclusion_prompt(exclude),
+                        }
+                    )
+            return get_table_data(response["quiz"])
+
+        # Count tokens and cost of the API calls.
+        with openai_callback() as cb:
+            quizzes = await asyncio.gather(
+                *[
+                    generate_section(section, count)
+                    for section, count in zip(sections, counts)
+                    if count
+                ]
+            )
+            quiz_dict = await asyncio.to_thread(merge_quizzes, quizzes, limit=mcq_count)
+
+            review = ""
+            if quiz_dict and review_mode == "inline":
+                review = await areview_quiz(quiz_dict, subject)
+
+        current_app.logger.debug(
+            f"Chunked generation of {mcq_count} MCQs over {len(sections)} sections, "
+            f"{len(quiz_dict)} kept after merging."
+        )
+
+    except Exception as e:
+        # Handle exceptions and return an error response.
+        traceback.print_exception(type(e), e, e.__traceback__)
+        return error_response(f"Error generating MCQs. Error is {str(e)}.")
+
+    usage = usage_from_callback(cb)
+    record_usage(OPENAI_MODEL_NAME, usage)
+    if not quiz_dict:
+        return dict(error_response("Quiz wasn't generated!"), usage=usage)
+
+    return quiz_response(quiz_dict, review, review_mode, usage)
@@ -1,34 +1,58 @@
+import glob
+import os
+
 from flask import current_app
 from langchain.chains import RetrievalQA
 from langchain.prompts import PromptTemplate
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import DirectoryLoader
-from langchain_community.document_loaders import PyPDFLoader
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.llms import CTransformers
 from langchain_community.vectorstores import Pinecone as PC
 
+from .embedding_cache import CachedEmbeddings
+from .pdf_utils import iter_pdf_pages
+
 # Opensource model to generate the embeddings
 EMBEDDINGS_OPEN_SOURCE_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 
 
-def load_pdf(data):
+def load_pdf(data, max_workers=None):
     """
     Extracts data from PDF files located in the specified directory.
 
+    The pages are parsed across a pool of processes and yielded as they are
+    ready, so the whole directory is never held in memory at once.
+
     Args:
         data (str): The directory path where the PDF files are located.
+        max_workers (int): Number of worker processes, defaults to the CPUs.
 
-    Returns:
-        list: A list of documents extracted from the PDF files.
+    Yields:
+        Document: The documents extracted from the PDF files, one per page.
     """
-    # Initialize the DirectoryLoader with the directory and PDF loader class
-    loader = DirectoryLoader(data, glob="*.pdf", loader_cls=PyPDFLoader)
+    # Collect the PDF files of the directory
+    paths = sorted(glob.glob(os.path.join(data, "*.pdf")))
 
-    # Load the documents from the specified directory
-    documents = loader.load()
+    # Extract the pages in parallel and stream them to the caller
+    yield from iter_pdf_pages(paths, max_workers=max_workers)
 
-    return documents
+
+def iter_text_split(extracted_data):
+    """
+    Splits the extracted documents into chunks one document at a time.
+
+    Args:
+        extracted_data (Iterable[Document]): The extracted documents.
+
+    Yields:
+        Document: The text chunks.
+    """
+    # Initialize the text splitter with chunk size and overlap settings
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=20)
+
+    # Split every document as soon as it arrives
+    for document in extracted_data:
+        yield from text_splitter.split_documents([document])
 
 
 def text_split(extracted_data):
@@ -36,27 +60,98 @@ def text_split(extracted_data):
     Splits the extracted text data into smaller chunks for processing.
 
     Args:
-        extracted_data (list): The list of extracted documents.
+        extracted_data (Iterable[Document]): The extracted documents.
 
     Returns:
         list: A list of text chunks.
     """
-    # Initialize the text splitter with chunk size and overlap settings
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=20)
+    return list(iter_text_split(extracted_data))
 
-    # Split the documents into text chunks
-    text_chunks = text_splitter.split_documents(extracted_data)
 
-    return text_chunks
+def embeddings_cache_key(backend="torch", quantize=True):
+    """
+    Get the model name the cached vectors of an embeddings backend are keyed by.
 
+    Args:
+        backend (str): "torch" or "onnx".
+        quantize (bool): Whether the ONNX model is quantized to int8.
 
-def download_hugging_face_embeddings():
+    Returns:
+        str: The model name, tagged with the ONNX variant, so the slightly
+            different vectors of the backends are never mixed in the cache.
+    """
+    if backend == "onnx":
+        return f"{EMBEDDINGS_OPEN_SOURCE_MODEL}:onnx-{'int8' if quantize else 'fp32'}"
+
+    return EMBEDDINGS_OPEN_SOURCE_MODEL
+
+
+def download_hugging_face_embeddings(
+    cache_path=None,
+    cache_memory_size=10000,
+    backend="torch",
+    onnx_dir=None,
+    quantize=True,
+    batch_size=32,
+):
     """
     Downloads the Hugging Face embeddings model.
 
+    Args:
+        cache_path (str): Optional SQLite file caching the computed vectors.
+            When given, repeated texts skip the transformer forward pass.
+        cache_memory_size (int): Number of vectors kept in the in-memory tier
+            of the cache.
+        backend (str): "torch" runs the model with sentence-transformers,
+            "onnx" with onnxruntime, exporting it to ``onnx_dir`` once.
+        onnx_dir (str): The directory of the exported ONNX models.
+        quantize (bool): Use the ONNX model quantized to int8.
+        batch_size (int): Max number of texts per ONNX forward pass.
+
     Returns:
-        HuggingFaceEmbeddings: The Hugging Face embeddings model.
+        Embeddings: The Hugging Face embeddings model, wrapped in a
+            ``CachedEmbeddings`` when a cache path is given.
     """
-    # Initialize and return the Hugging Face embeddings model
-    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDINGS_OPEN_SOURCE_MODEL)
+    if backend == "onnx":
+        from .onnx_embeddings import OnnxEmbeddings
+
+        # Run the exported model with onnxruntime, torch is never imported
+        embeddings = OnnxEmbeddings(
+            EMBEDDINGS_OPEN_SOURCE_MODEL,
+            onnx_dir,
+            quantize=quantize,
+            batch_size=batch_size,
+        )
+    elif backend == "torch":
+        # Initialize the Hugging Face embeddings model
+        embeddings = HuggingFaceEmbeddings(model_name=EMBEDDINGS_OPEN_SOURCE_MODEL)
+    else:
+        raise ValueError(f"Unsupported embeddings backend {backend!r}.")
+
+    if cache_path:
+        embeddings = CachedEmbeddings(
+            embeddings,
+            embeddings_cache_key(backend, quantize),
+            path=cache_path,
+            memory_size=cache_memory_size,
+        )
+
     return embeddings
+
+
+def embeddings_options(config):
+    """
+    Get the embeddings backend settings of the application config.
+
+    Args:
+        config (dict): The application config.
+
+    Returns:
+        dict: The backend arguments of ``download_hugging_face_embeddings``.
+    """
+    return {
+        "backend": config.get("EMBEDDINGS_BACKEND", "torch"),
+        "onnx_dir": config.get("ONNX_MODEL_DIR"),
+        "quantize": config.get("ONNX_QUANTIZE", True),
+        "batch_size": config.get("EMBEDDINGS_BATCH_SIZE", 32),
+    }
@@ -0,0 +1,121 @@
+import logging
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from langchain_core.documents import Document
+from pypdf import PdfReader
+
+# Number of pages parsed by one task of the process pool
+PAGES_PER_TASK = 16
+
+logger = logging.getLogger(__name__)
+
+
+def _extract_pages(path, start, stop):
+    """
+    Extract the text of a page range, runs inside a worker process.
+
+    Args:
+        path (str): The path of the PDF file.
+        start (int): The first page to extract.
+        stop (int): The page after the last one to extract.
+
+    Returns:
+        list: The text of every page of the range.
+    """
+    reader = PdfReader(path)
+    return [reader.pages[page].extract_text() or "" for page in range(start, stop)]
+
+
+def _log_error(path, error):
+    """Default error callback, report the file and keep going."""
+    logger.warning(f"Failed to extract {path}: {error}")
+
+
+def iter_page_texts(stream):
+    """
+    Yield the text of every page of a PDF, one page at a time.
+
+    Args:
+        stream: The path or binary file object of the PDF.
+
+    Yields:
+        str: The text of each page.
+    """
+    for page in PdfReader(stream).pages:
+        yield page.extract_text() or ""
+
+
+def iter_pdf_pages(paths, max_workers=None, on_error=None):
+    """
+    Extract the pages of the PDF files across a pool of processes.
+
+    Every file is cut into ranges of ``PAGES_PER_TASK`` pages which are parsed
+    in parallel. Pages are yielded as soon as their range is parsed, in file
+    and page order, and at most two ranges per worker are in flight, so the
+    memory used is bounded by the pool size and not by the corpus size.
+
+    A file that can't be parsed is reported to ``on_error`` and skipped,
+    along with the rest of its pages, without aborting the batch.
+
+    Args:
+        paths (Iterable[str]): The paths of the PDF files.
+        max_workers (int): Number of worker processes, defaults to the CPUs.
+        on_error (Callable): Called with the path and the exception of a
+            failed file. Defaults to logging a warning.
+
+    Yields:
+        Document: One document per page with the source and page number.
+    """
+    on_error = on_error or _log_error
+    max_workers = max_workers or os.cpu_count() or 1
+    failed = set()
+
+    def tasks():
+        for path in paths:
+            try:
+                # Only the page tree is parsed here, the text is extracted
+                # in the workers.
+                page_count = len(PdfReader(path).pages)
+            except Exception as e:
+                on_error(path, e)
+                continue
+
+            for start in range(0, page_count, PAGES_PER_TASK):
+                yield path, start, min(start + PAGES_PER_TASK, page_count)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = deque()
+        pending = tasks()
+
+        def submit_next():
+            for path, start, stop in pending:
+                if path in failed:
+                    continue
+                future = executor.submit(_extract_pages, path, start, stop)
+                in_flight.append((path, start, future))
+                return
+
+        for _ in range(2 * max_workers):
+            submit_next()
+
+        while in_flight:
+            path, start, future = in_flight.popleft()
+            try:
+                texts = future.result()
+            except Exception as e:
+                if path not in failed:
+                    failed.add(path)
+                    on_error(path, e)
+                texts = []
+            submit_next()
+
+            if path in failed:
+                continue
+
+            for offset, text in enumerate(texts):
+                yield Document(
+                    page_content=text,
+                    metadata={"source": path, "page": start + offset},
+                )
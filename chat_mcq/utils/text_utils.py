@@ -0,0 +1,6 @@
+# Words ignored when matching a question against the passages, by the context
+# packing and the BM25 index
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how in is it its of on or "
+    "that the their this to was were what when where which who why will with".split()
+)
@@ -0,0 +1,140 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from flask import Request
+from flask import current_app
+from werkzeug.datastructures.file_storage import FileStorage
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.exceptions import UnsupportedMediaType
+
+from ..generation_cache import hash_stream
+
+# Accepted upload extensions and the bytes their content starts with
+UPLOAD_SIGNATURES = {".pdf": b"%PDF-", ".txt": b""}
+
+
+def upload_extension(filename):
+    """
+    Get the lowercase extension of an uploaded file name.
+
+    Args:
+        filename (str): The name of the uploaded file.
+
+    Returns:
+        str: The extension with its dot, empty when there is none.
+    """
+    return os.path.splitext(filename or "")[1].lower()
+
+
+class UploadBuffer:
+    """
+    Buffer of one uploaded file, hashed and checked while it is written.
+
+    The body is written once by the form parser into a spooled temporary
+    file, kept in memory up to ``max_memory`` bytes and moved to disk above.
+    The extraction, the generation cache and the archive all read this one
+    buffer, so an upload is never copied again to be hashed or saved.
+    """
+
+    def __init__(self, extension, max_memory, max_size=None):
+        self.signature = UPLOAD_SIGNATURES[extension]
+        self.max_size = max_size
+        self.size = 0
+        self._head = b""
+        self._digest = hashlib.sha256()
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_memory, mode="w+b")
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_size and self.size > self.max_size:
+            raise RequestEntityTooLarge()
+
+        # Reject a mislabeled file as soon as its first bytes are in.
+        if len(self._head) < len(self.signature):
+            self._head += data[: len(self.signature) - len(self._head)]
+            if not self.signature.startswith(self._head):
+                raise UnsupportedMediaType("The file content doesn't match its type.")
+
+        self._digest.update(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        """
+        Get the SHA-256 of the content written so far.
+
+        Returns:
+            str: The hex digest of the content.
+        """
+        return self._digest.hexdigest()
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+
+class UploadRequest(Request):
+    """
+    Request buffering the uploaded files in an ``UploadBuffer``.
+
+    Files of an unsupported type are rejected before any of their content is
+    buffered, and requests over ``MAX_CONTENT_LENGTH`` before the body is read.
+    """
+
+    def _get_file_stream(
+        self, total_content_length, content_type, filename=None, content_length=None
+    ):
+        extension = upload_extension(filename)
+        if extension not in UPLOAD_SIGNATURES:
+            raise UnsupportedMediaType(
+                "Unsupported file format. Only PDF and text files are supported."
+            )
+
+        return UploadBuffer(
+            extension,
+            current_app.config.get("UPLOAD_MAX_MEMORY_SIZE", 1024 * 1024),
+            current_app.config.get("MAX_CONTENT_LENGTH"),
+        )
+
+
+def upload_hash(file: FileStorage):
+    """
+    Get the SHA-256 of an uploaded file.
+
+    Args:
+        file (FileStorage): The uploaded file.
+
+    Returns:
+        str: The hex digest computed while the file was buffered, or hashed
+            now when the file was buffered elsewhere.
+    """
+    if isinstance(file.stream, UploadBuffer):
+        return file.stream.hexdigest()
+
+    return hash_stream(file.stream)
+
+
+def archive_upload(file: FileStorage, folder):
+    """
+    Keep a copy of the uploaded file, named after its content.
+
+    A file uploaded before is not written again.
+
+    Args:
+        file (FileStorage): The uploaded file.
+        folder (str): The directory of the archived uploads.
+
+    Returns:
+        str: The path of the archived file.
+    """
+    path = os.path.join(folder, upload_hash(file) + upload_extension(file.filename))
+    if not os.path.exists(path):
+        file.stream.seek(0)
+        with open(path, "wb") as archive:
+            shutil.copyfileobj(file.stream, archive)
+
+    file.stream.seek(0)
+    return path
@@ -0,0 +1,51 @@
+from ..vectorstores.local_store import LocalVectorStore
+
+
+def get_vector_store(embeddings, config):
+    """
+    Opens the vector store selected by the ``VECTOR_STORE_BACKEND`` config.
+
+    Args:
+        embeddings (Embeddings): The embeddings model used to embed the texts.
+        config (Mapping): The application configuration, either the Flask
+            ``app.config`` or the variables of ``chat_mcq.config``.
+
+    Returns:
+        VectorStore: The Pinecone index or the local on-disk store.
+
+    Raises:
+        ValueError: If the configured backend is unknown.
+    """
+    backend = config.get("VECTOR_STORE_BACKEND", "pinecone")
+
+    if backend == "pinecone":
+        from langchain_community.vectorstores import Pinecone as PC
+
+        # Load the Pinecone index using the embeddings
+        return PC.from_existing_index(config["PINECONE_INDEX_NAME"], embeddings)
+
+    elif backend == "local":
+        # Memory map the vectors saved on disk, nothing is re-embedded.
+        return LocalVectorStore.load(
+            config["LOCAL_VECTOR_STORE_DIR"],
+            embeddings,
+            hnsw_threshold=config.get("LOCAL_VECTOR_STORE_HNSW_THRESHOLD", 50000),
+            hnsw_ef_search=config.get("LOCAL_VECTOR_STORE_HNSW_EF_SEARCH", 64),
+        )
+
+    else:
+        raise ValueError(
+            f"Unsupported vector store backend {backend!r}. "
+            "Only 'pinecone' and 'local' are supported."
+        )
+
+
+def save_vector_store(store):
+    """
+    Persists the vector store if the backend keeps its data locally.
+
+    Args:
+        store (VectorStore): The vector store to save.
+    """
+    if isinstance(store, LocalVectorStore):
+        store.save()
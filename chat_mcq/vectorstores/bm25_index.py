@@ -0,0 +1,371 @@
+import json
+import math
+import os
+import re
+import threading
+import uuid
+from collections import Counter
+
+import numpy as np
+from langchain_core.documents import Document
+
+from ..utils.text_utils import STOPWORDS
+
+# File names inside the index directory
+POSTINGS_FILE = "postings.npz"
+DOCSTORE_FILE = "docstore.jsonl"
+META_FILE = "meta.json"
+
+# Max term frequency stored in the uint16 postings
+MAX_FREQUENCY = 65535
+
+
+def tokenize(text):
+    """
+    Split the text into the terms indexed by BM25.
+
+    Args:
+        text (str): The text to tokenize.
+
+    Returns:
+        list: The lowercase words of the text, without the stopwords, in order.
+    """
+    return [term for term in re.findall(r"\w+", text.lower()) if term not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Inverted index of the chunks, scored with Okapi BM25.
+
+    The postings are kept as compressed sparse rows: one array of document
+    rows and one of term frequencies, sliced by the offsets of every term,
+    saved together in ``postings.npz``. Searching a term only touches the
+    documents containing it. Chunks added by id between two saves are
+    tokenized once into postings searched next to the saved ones, deleted
+    chunks are masked, and the document frequencies and total length are
+    updated as the chunks come and go. Saving merges the added postings and
+    drops the deleted rows without tokenizing the other chunks again.
+    """
+
+    def __init__(self, path: str = None, k1: float = 1.2, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+
+        self._lock = threading.RLock()
+        self._ids = []
+        self._texts = []
+        self._metadatas = []
+        self._id_to_row = {}
+        self._deleted = set()
+
+        self._terms = {}
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._rows = np.zeros(0, dtype=np.int32)
+        self._frequencies = np.zeros(0, dtype=np.uint16)
+        self._lengths = np.zeros(0, dtype=np.int32)
+
+        # Postings of the rows added since the last save: rows and frequencies
+        # by term
+        self._added = {}
+        # Number of live documents containing every term, and their total length
+        self._document_frequencies = Counter()
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._ids) - len(self._deleted)
+
+    def __contains__(self, id):
+        return id in self._id_to_row
+
+    @classmethod
+    def load(cls, path: str, **kwargs):
+        """
+        Open the index saved in the directory, or an empty one if it is missing.
+
+        Args:
+            path (str): The directory of the index.
+
+        Returns:
+            BM25Index: The loaded index.
+        """
+        index = cls(path=path, **kwargs)
+        if not os.path.exists(os.path.join(path, META_FILE)):
+            return index
+
+        with open(os.path.join(path, META_FILE), "r") as file:
+            meta = json.load(file)
+        index.k1, index.b = meta["k1"], meta["b"]
+
+        with np.load(os.path.join(path, POSTINGS_FILE)) as postings:
+            index._offsets = postings["offsets"]
+            index._rows = postings["rows"]
+            index._frequencies = postings["frequencies"]
+            index._lengths = postings["lengths"]
+        index._terms = {term: number for number, term in enumerate(meta["terms"])}
+        index._document_frequencies = Counter(
+            dict(zip(meta["terms"], np.diff(index._offsets).tolist()))
+        )
+        index._total_length = int(index._lengths.sum())
+
+        with open(os.path.join(path, DOCSTORE_FILE), "r", encoding="utf-8") as file:
+            for row, line in enumerate(file):
+                record = json.loads(line)
+                index._ids.append(record["id"])
+                index._texts.append(record["text"])
+                index._metadatas.append(record["metadata"])
+                index._id_to_row[record["id"]] = row
+
+        return index
+
+    def add_texts(self, texts, metadatas=None, ids=None):
+        """
+        Add the texts to the index, replacing existing ids.
+
+        Only the added texts are tokenized.
+
+        Args:
+            texts (Iterable[str]): The texts to add.
+            metadatas (list): Optional metadata for every text.
+            ids (list): Optional ids for every text.
+
+        Returns:
+            list: The ids of the added texts.
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [uuid.uuid4().hex for _ in texts]
+
+        with self._lock:
+            # Upsert: the old rows of re-added ids are deleted.
+            self.delete([id for id in ids if id in self._id_to_row])
+
+            lengths = []
+            for id, text, metadata in zip(ids, texts, metadatas):
+                row = len(self._ids)
+                terms = tokenize(text)
+                for term, frequency in Counter(terms).items():
+                    rows, frequencies = self._added.setdefault(term, ([], []))
+                    rows.append(row)
+                    frequencies.append(min(frequency, MAX_FREQUENCY))
+                    self._document_frequencies[term] += 1
+                lengths.append(len(terms))
+
+                self._id_to_row[id] = row
+                self._ids.append(id)
+                self._texts.append(text)
+                self._metadatas.append(dict(metadata))
+
+            self._lengths = np.concatenate(
+                [self._lengths, np.array(lengths, dtype=np.int32)]
+            )
+            self._total_length += sum(lengths)
+
+        return list(ids)
+
+    def delete(self, ids=None):
+        """
+        Delete the texts with the given ids.
+
+        The rows are masked until the next save, only the deleted texts are
+        tokenized to update the document frequencies.
+
+        Args:
+            ids (list): The ids to delete, unknown ids are skipped.
+        """
+        with self._lock:
+            for id in ids or []:
+                row = self._id_to_row.pop(id, None)
+                if row is None:
+                    continue
+
+                self._deleted.add(row)
+                self._document_frequencies.subtract(set(tokenize(self._texts[row])))
+                self._total_length -= int(self._lengths[row])
+
+    def save(self, path: str = None):
+        """
+        Persist the index, dropping the deleted texts.
+
+        Args:
+            path (str): The directory to save to. Defaults to the load path.
+        """
+        path = path or self.path
+        if not path:
+            raise ValueError("No path given to save the BM25 index to.")
+
+        with self._lock:
+            self._compact()
+            os.makedirs(path, exist_ok=True)
+
+            # Write next to the target and swap in, like the vector store.
+            tmp_postings = os.path.join(path, POSTINGS_FILE + ".tmp")
+            with open(tmp_postings, "wb") as file:
+                np.savez_compressed(
+                    file,
+                    offsets=self._offsets,
+                    rows=self._rows,
+                    frequencies=self._frequencies,
+                    lengths=self._lengths,
+                )
+
+            tmp_docstore = os.path.join(path, DOCSTORE_FILE + ".tmp")
+            with open(tmp_docstore, "w", encoding="utf-8") as file:
+                for id, text, metadata in zip(self._ids, self._texts, self._metadatas):
+                    file.write(
+                        json.dumps({"id": id, "text": text, "metadata": metadata})
+                        + "\n"
+                    )
+
+            os.replace(tmp_postings, os.path.join(path, POSTINGS_FILE))
+            os.replace(tmp_docstore, os.path.join(path, DOCSTORE_FILE))
+
+            tmp_meta = os.path.join(path, META_FILE + ".tmp")
+            with open(tmp_meta, "w") as file:
+                json.dump(
+                    {
+                        "count": len(self._ids),
+                        "k1": self.k1,
+                        "b": self.b,
+                        "terms": sorted(self._terms, key=self._terms.get),
+                    },
+                    file,
+                )
+            os.replace(tmp_meta, os.path.join(path, META_FILE))
+            self.path = path
+
+    def search(self, query, k=4):
+        """
+        Find the chunks best matching the words of the query.
+
+        Args:
+            query (str): The user's question.
+            k (int): Number of documents to return.
+
+        Returns:
+            tuple: The (Document, BM25 score) pairs, best match first, and the
+                confidence of the best match: its score over the highest score
+                the query could reach, in [0, 1].
+        """
+        terms = Counter(tokenize(query))
+
+        with self._lock:
+            count = len(self)
+            if not terms or not count:
+                return [], 0.0
+
+            average_length = np.float32(self._total_length / count or 1.0)
+
+            scores = np.zeros(len(self._ids), dtype=np.float32)
+            best_possible = 0.0
+            for term, repeats in terms.items():
+                frequency = self._document_frequencies.get(term, 0)
+                idf = math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+                best_possible += repeats * idf * (self.k1 + 1)
+                if not frequency:
+                    continue
+
+                rows, tf = self._postings(term)
+                norms = self.k1 * (
+                    1 - self.b + self.b * self._lengths[rows] / average_length
+                )
+                scores[rows] += repeats * idf * tf * (self.k1 + 1) / (tf + norms)
+
+            # The deleted rows stay in the postings until the next save.
+            if self._deleted:
+                scores[list(self._deleted)] = 0
+
+            matched = np.flatnonzero(scores)
+            if not matched.size:
+                return [], 0.0
+
+            # Partial sort: only the top k matches are ordered.
+            k = min(k, matched.size)
+            top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+            top = top[np.argsort(-scores[top])]
+            hits = [(self._document(row), float(scores[row])) for row in top]
+
+        return hits, hits[0][1] / best_possible
+
+    def _document(self, row):
+        """Build the Document for the row."""
+        metadata = dict(self._metadatas[row])
+        metadata.setdefault("id", self._ids[row])
+        return Document(page_content=self._texts[row], metadata=metadata)
+
+    def _postings(self, term):
+        """Get the rows containing the term, saved and added, and its frequencies."""
+        rows = []
+        frequencies = []
+
+        number = self._terms.get(term)
+        if number is not None:
+            start, end = self._offsets[number], self._offsets[number + 1]
+            rows.append(self._rows[start:end])
+            frequencies.append(self._frequencies[start:end])
+
+        if term in self._added:
+            added_rows, added_frequencies = self._added[term]
+            rows.append(np.array(added_rows, dtype=np.int32))
+            frequencies.append(np.array(added_frequencies, dtype=np.uint16))
+
+        return np.concatenate(rows), np.concatenate(frequencies).astype(np.float32)
+
+    def _compact(self):
+        """Merge the added postings into the saved ones and drop the deleted rows."""
+        if not self._added and not self._deleted:
+            return
+
+        # One (term, row, frequency) entry per posting, the saved ones first.
+        terms = sorted(self._terms, key=self._terms.get)
+        numbers = [np.repeat(np.arange(len(terms)), np.diff(self._offsets))]
+        rows = [self._rows]
+        frequencies = [self._frequencies]
+
+        term_numbers = dict(self._terms)
+        for term, (added_rows, added_frequencies) in self._added.items():
+            if term not in term_numbers:
+                term_numbers[term] = len(terms)
+                terms.append(term)
+            numbers.append(np.full(len(added_rows), term_numbers[term]))
+            rows.append(np.array(added_rows, dtype=np.int32))
+            frequencies.append(np.array(added_frequencies, dtype=np.uint16))
+
+        numbers = np.concatenate(numbers)
+        rows = np.concatenate(rows)
+        frequencies = np.concatenate(frequencies)
+
+        # Drop the postings of the deleted rows and renumber the others.
+        keep = np.ones(len(self._ids), dtype=bool)
+        keep[list(self._deleted)] = False
+        new_rows = np.cumsum(keep) - 1
+        live = keep[rows]
+        numbers, rows, frequencies = (
+            numbers[live],
+            new_rows[rows[live]],
+            frequencies[live],
+        )
+
+        # Group the postings by term, the terms without documents are dropped.
+        order = np.argsort(numbers, kind="stable")
+        numbers, rows, frequencies = numbers[order], rows[order], frequencies[order]
+        used, sizes = np.unique(numbers, return_counts=True)
+        self._terms = {terms[number]: position for position, number in enumerate(used)}
+        self._offsets = np.zeros(len(used) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=self._offsets[1:])
+        self._rows = rows.astype(np.int32)
+        self._frequencies = frequencies.astype(np.uint16)
+        self._added = {}
+        self._document_frequencies = +self._document_frequencies
+
+        if self._deleted:
+            kept = np.flatnonzero(keep)
+            self._ids = [self._ids[row] for row in kept]
+            self._texts = [self._texts[row] for row in kept]
+            self._metadatas = [self._metadatas[row] for row in kept]
+            self._id_to_row = {id: row for row, id in enumerate(self._ids)}
+            self._lengths = self._lengths[keep]
+            self._deleted = set()
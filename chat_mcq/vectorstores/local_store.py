@@ -0,0 +1,487 @@
+import json
+import os
+import threading
+import uuid
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+# File names inside the store directory
+VECTORS_FILE = "vectors.npy"
+DOCSTORE_FILE = "docstore.jsonl"
+HNSW_FILE = "hnsw.bin"
+META_FILE = "meta.json"
+
+
+def _normalize(vectors):
+    """L2-normalize the rows so that the dot product is the cosine similarity."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _matches(metadata, filter):
+    """Check if the metadata has every key/value of the filter."""
+    for key, value in filter.items():
+        if isinstance(value, (list, tuple, set)):
+            if metadata.get(key) not in value:
+                return False
+        elif metadata.get(key) != value:
+            return False
+    return True
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process vector store persisted to a local directory.
+
+    Vectors are kept as one float32 matrix which is memory-mapped from
+    ``vectors.npy`` on load, so opening a large store costs no copy and no
+    re-embedding. Small stores are searched exactly with a single matrix
+    product; once the store holds ``hnsw_threshold`` vectors an HNSW graph is
+    built and used for approximate search instead.
+    """
+
+    def __init__(
+        self,
+        embedding,
+        path: str = None,
+        hnsw_threshold: int = 50000,
+        hnsw_m: int = 16,
+        hnsw_ef_construction: int = 200,
+        hnsw_ef_search: int = 64,
+    ):
+        self.embedding = embedding
+        self.path = path
+        self.hnsw_threshold = hnsw_threshold
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construction = hnsw_ef_construction
+        self.hnsw_ef_search = hnsw_ef_search
+
+        self._lock = threading.RLock()
+        self._vectors = None
+        self._pending = []
+        self._ids = []
+        self._texts = []
+        self._metadatas = []
+        self._id_to_row = {}
+        self._deleted = set()
+        self._hnsw = None
+
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    def __len__(self):
+        return len(self._ids) - len(self._deleted)
+
+    @classmethod
+    def load(cls, path: str, embedding, **kwargs):
+        """
+        Open the store saved in the directory, or an empty one if it is missing.
+
+        Args:
+            path (str): The directory of the store.
+            embedding (Embeddings): The embeddings model used for the queries.
+
+        Returns:
+            LocalVectorStore: The loaded store.
+        """
+        store = cls(embedding, path=path, **kwargs)
+        if not os.path.exists(os.path.join(path, META_FILE)):
+            return store
+
+        with open(os.path.join(path, META_FILE), "r") as file:
+            meta = json.load(file)
+
+        # Memory map the matrix so the OS pages it in on demand.
+        store._vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+
+        with open(os.path.join(path, DOCSTORE_FILE), "r", encoding="utf-8") as file:
+            for row, line in enumerate(file):
+                record = json.loads(line)
+                store._ids.append(record["id"])
+                store._texts.append(record["text"])
+                store._metadatas.append(record["metadata"])
+                store._id_to_row[record["id"]] = row
+
+        if meta.get("hnsw"):
+            store._hnsw = store._load_hnsw(meta["dim"], len(store._ids))
+
+        return store
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, **kwargs):
+        """
+        Create a store from the texts and save it if a path is given.
+
+        Args:
+            texts (list): The texts to embed and store.
+            embedding (Embeddings): The embeddings model.
+            metadatas (list): Optional metadata for every text.
+            ids (list): Optional ids for every text.
+
+        Returns:
+            LocalVectorStore: The new store.
+        """
+        store = cls(embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        if store.path:
+            store.save()
+        return store
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        """
+        Embed the texts and add them to the store, replacing existing ids.
+
+        Args:
+            texts (Iterable[str]): The texts to add.
+            metadatas (list): Optional metadata for every text.
+            ids (list): Optional ids for every text.
+
+        Returns:
+            list: The ids of the added texts.
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+
+        vectors = self.embedding.embed_documents(texts)
+        return self.add_vectors(vectors, texts, metadatas=metadatas, ids=ids)
+
+    def add_vectors(self, vectors, texts, metadatas=None, ids=None):
+        """
+        Add already embedded texts to the store, replacing existing ids.
+
+        Args:
+            vectors (list): The embedding of every text.
+            texts (list): The texts to add.
+            metadatas (list): Optional metadata for every text.
+            ids (list): Optional ids for every text.
+
+        Returns:
+            list: The ids of the added texts.
+        """
+        if not len(texts):
+            return []
+
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [uuid.uuid4().hex for _ in texts]
+        vectors = _normalize(vectors)
+
+        with self._lock:
+            # Upsert: the old rows of re-added ids become tombstones.
+            self.delete([id for id in ids if id in self._id_to_row])
+
+            first_row = len(self._ids)
+            for offset, (id, text, metadata) in enumerate(zip(ids, texts, metadatas)):
+                self._ids.append(id)
+                self._texts.append(text)
+                self._metadatas.append(dict(metadata))
+                self._id_to_row[id] = first_row + offset
+            self._pending.append(vectors)
+
+            if self._hnsw is not None:
+                needed = len(self._ids)
+                if needed > self._hnsw.get_max_elements():
+                    self._hnsw.resize_index(
+                        max(needed, 2 * self._hnsw.get_max_elements())
+                    )
+                self._hnsw.add_items(vectors, np.arange(first_row, needed))
+
+        return list(ids)
+
+    def delete(self, ids=None, **kwargs):
+        """
+        Delete the vectors with the given ids.
+
+        The rows are only tombstoned, they are dropped from disk on ``save``.
+
+        Args:
+            ids (list): The ids to delete.
+
+        Returns:
+            bool: True once deleted.
+        """
+        with self._lock:
+            for id in ids or []:
+                row = self._id_to_row.pop(id, None)
+                if row is None:
+                    continue
+                self._deleted.add(row)
+                if self._hnsw is not None:
+                    self._hnsw.mark_deleted(row)
+        return True
+
+    def get_by_ids(self, ids):
+        """
+        Get the stored documents for the given ids.
+
+        Args:
+            ids (list): The ids to look up, unknown ids are skipped.
+
+        Returns:
+            list: The documents in the order of the ids.
+        """
+        with self._lock:
+            return [
+                self._document(self._id_to_row[id])
+                for id in ids
+                if id in self._id_to_row
+            ]
+
+    def save(self, path: str = None):
+        """
+        Persist the store, dropping deleted rows and (re)building HNSW if needed.
+
+        Args:
+            path (str): The directory to save to. Defaults to the load path.
+        """
+        path = path or self.path
+        if not path:
+            raise ValueError("No path given to save the vector store to.")
+
+        with self._lock:
+            compacted = bool(self._deleted)
+            self._compact()
+            matrix = self._matrix()
+            os.makedirs(path, exist_ok=True)
+
+            # Write next to the target and swap in, so that a crash never
+            # leaves a half written store behind.
+            tmp_vectors = os.path.join(path, VECTORS_FILE + ".tmp")
+            with open(tmp_vectors, "wb") as file:
+                np.save(file, matrix)
+
+            tmp_docstore = os.path.join(path, DOCSTORE_FILE + ".tmp")
+            with open(tmp_docstore, "w", encoding="utf-8") as file:
+                for id, text, metadata in zip(self._ids, self._texts, self._metadatas):
+                    file.write(
+                        json.dumps({"id": id, "text": text, "metadata": metadata})
+                        + "\n"
+                    )
+
+            use_hnsw = len(self._ids) >= self.hnsw_threshold
+            if use_hnsw and (self._hnsw is None or compacted):
+                self._hnsw = self._build_hnsw(matrix)
+            elif not use_hnsw:
+                self._hnsw = None
+
+            if self._hnsw is not None:
+                tmp_hnsw = os.path.join(path, HNSW_FILE + ".tmp")
+                self._hnsw.save_index(tmp_hnsw)
+                os.replace(tmp_hnsw, os.path.join(path, HNSW_FILE))
+
+            os.replace(tmp_vectors, os.path.join(path, VECTORS_FILE))
+            os.replace(tmp_docstore, os.path.join(path, DOCSTORE_FILE))
+
+            tmp_meta = os.path.join(path, META_FILE + ".tmp")
+            with open(tmp_meta, "w") as file:
+                json.dump(
+                    {
+                        "dim": int(matrix.shape[1]) if matrix.size else 0,
+                        "count": len(self._ids),
+                        "hnsw": self._hnsw is not None,
+                    },
+                    file,
+                )
+            os.replace(tmp_meta, os.path.join(path, META_FILE))
+
+            self.path = path
+            self._vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None):
+        """
+        Find the most similar documents to the query vector.
+
+        Args:
+            embedding (list): The query vector.
+            k (int): Number of documents to return.
+            filter (dict): Optional metadata the documents must match, a list
+                value matches any of its items.
+
+        Returns:
+            list: (Document, cosine similarity) tuples, best match first.
+        """
+        return self.batch_similarity_search_with_score_by_vector(
+            [embedding], k=k, filter=filter
+        )[0]
+
+    def batch_similarity_search_with_score_by_vector(
+        self, embeddings, k=4, filter=None
+    ):
+        """
+        Run the similarity search for several query vectors at once.
+
+        Args:
+            embeddings (list): The query vectors.
+            k (int): Number of documents to return per query.
+            filter (dict): Optional metadata the documents must match.
+
+        Returns:
+            list: One list of (Document, score) tuples per query.
+        """
+        queries = _normalize(embeddings)
+
+        with self._lock:
+            if len(self) == 0:
+                return [[] for _ in range(len(queries))]
+
+            if filter:
+                allowed = [
+                    row
+                    for row, metadata in enumerate(self._metadatas)
+                    if row not in self._deleted and _matches(metadata, filter)
+                ]
+            else:
+                allowed = None
+
+            if self._hnsw is not None:
+                hits = self._search_hnsw(queries, k, allowed)
+            else:
+                hits = self._search_exact(queries, k, allowed)
+
+            return [
+                [(self._document(row), float(score)) for row, score in query_hits]
+                for query_hits in hits
+            ]
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        docs_and_scores = self.similarity_search_with_score_by_vector(
+            embedding, k=k, filter=filter
+        )
+        return [doc for doc, _ in docs_and_scores]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        embedding = self.embedding.embed_query(query)
+        return self.similarity_search_with_score_by_vector(
+            embedding, k=k, filter=filter
+        )
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        docs_and_scores = self.similarity_search_with_score(query, k=k, filter=filter)
+        return [doc for doc, _ in docs_and_scores]
+
+    def _similarity_search_with_relevance_scores(self, query, k=4, **kwargs):
+        # Map the cosine similarity from [-1, 1] to [0, 1].
+        return [
+            (doc, (score + 1) / 2)
+            for doc, score in self.similarity_search_with_score(query, k=k, **kwargs)
+        ]
+
+    def _document(self, row):
+        """Build the Document for the row."""
+        metadata = dict(self._metadatas[row])
+        metadata.setdefault("id", self._ids[row])
+        return Document(page_content=self._texts[row], metadata=metadata)
+
+    def _matrix(self):
+        """Return the vector matrix, merging the vectors added since the load."""
+        if self._pending:
+            # A store saved empty has a (0, 0) matrix, without a dimension.
+            blocks = [
+                block
+                for block in [self._vectors] + self._pending
+                if block is not None and block.size
+            ]
+            self._vectors = np.vstack(blocks)
+            self._pending = []
+
+        if self._vectors is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        return self._vectors
+
+    def _compact(self):
+        """Drop the tombstoned rows."""
+        if not self._deleted:
+            return
+
+        keep = [row for row in range(len(self._ids)) if row not in self._deleted]
+        self._vectors = np.ascontiguousarray(self._matrix()[keep])
+        self._ids = [self._ids[row] for row in keep]
+        self._texts = [self._texts[row] for row in keep]
+        self._metadatas = [self._metadatas[row] for row in keep]
+        self._id_to_row = {id: row for row, id in enumerate(self._ids)}
+        self._deleted = set()
+
+    def _search_exact(self, queries, k, allowed):
+        """Brute force search with one matrix product over every row."""
+        matrix = self._matrix()
+        if allowed is not None:
+            rows = np.asarray(allowed, dtype=np.int64)
+            if rows.size == 0:
+                return [[] for _ in range(len(queries))]
+            scores = queries @ matrix[rows].T
+        else:
+            rows = None
+            scores = queries @ matrix.T
+            if self._deleted:
+                scores[:, list(self._deleted)] = -np.inf
+
+        k = min(k, scores.shape[1])
+        # Partial sort: only the top k columns are ordered.
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for query_scores, query_top in zip(scores, top):
+            query_top = query_top[np.argsort(-query_scores[query_top])]
+            results.append(
+                [
+                    (
+                        int(rows[col]) if rows is not None else int(col),
+                        query_scores[col],
+                    )
+                    for col in query_top
+                    if np.isfinite(query_scores[col])
+                ]
+            )
+        return results
+
+    def _search_hnsw(self, queries, k, allowed):
+        """Approximate search through the HNSW graph."""
+        if allowed is not None:
+            if not allowed:
+                return [[] for _ in range(len(queries))]
+            allowed_set = set(allowed)
+            k = min(k, len(allowed_set))
+            labels, distances = self._hnsw.knn_query(
+                queries, k=k, filter=lambda label: label in allowed_set
+            )
+        else:
+            k = min(k, len(self))
+            labels, distances = self._hnsw.knn_query(queries, k=k)
+
+        # hnswlib returns the cosine distance, 1 - similarity.
+        return [
+            [
+                (int(label), 1.0 - distance)
+                for label, distance in zip(row_labels, row_distances)
+            ]
+            for row_labels, row_distances in zip(labels, distances)
+        ]
+
+    def _build_hnsw(self, matrix):
+        """Build the HNSW graph over every row of the matrix."""
+        import hnswlib
+
+        index = hnswlib.Index(space="cosine", dim=matrix.shape[1])
+        index.init_index(
+            max_elements=max(len(matrix), 1),
+            ef_construction=self.hnsw_ef_construction,
+            M=self.hnsw_m,
+        )
+        index.add_items(matrix, np.arange(len(matrix)))
+        index.set_ef(self.hnsw_ef_search)
+        return index
+
+    def _load_hnsw(self, dim, count):
+        """Load the HNSW graph saved next to the vectors."""
+        import hnswlib
+
+        index = hnswlib.Index(space="cosine", dim=dim)
+        index.load_index(os.path.join(self.path, HNSW_FILE), max_elements=count)
+        index.set_ef(self.hnsw_ef_search)
+        return index
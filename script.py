@@ -1,30 +1,51 @@
+import logging
 import os
 
 from dotenv import load_dotenv
-from langchain.vectorstores import Pinecone as PC
 
+from chat_mcq import config
+from chat_mcq.utils.ingest_utils import ingest_directory
+from chat_mcq.utils.ingest_utils import save_manifest
 from chat_mcq.utils.opensource_utils import download_hugging_face_embeddings
-from chat_mcq.utils.opensource_utils import load_pdf
-from chat_mcq.utils.opensource_utils import text_split
+from chat_mcq.utils.opensource_utils import embeddings_options
+from chat_mcq.utils.vectorstore_utils import get_vector_store
+from chat_mcq.utils.vectorstore_utils import save_vector_store
+from chat_mcq.vectorstores.bm25_index import BM25Index
 
 load_dotenv()
+logging.basicConfig(level=logging.INFO)
 
 PINECONE_API_KEY = os.environ.get("PINECONE_API_KEY")
 DATA_TO_EXTRACT_DIR = os.environ.get("DATA_TO_EXTRACT_DIR")
 
-# Extract the data from the PDF source
-extracted_data = load_pdf(DATA_TO_EXTRACT_DIR)
-
-# Divides the data into chunks, so we can create the embeddings
-text_chunks = text_split(extracted_data)
-
 # Embeddings method for embedding
-embeddings = download_hugging_face_embeddings()
-
-# Pinecone index name
-index_name = "chat-bot"
+embeddings = download_hugging_face_embeddings(
+    cache_path=config.EMBEDDING_CACHE_PATH,
+    cache_memory_size=config.EMBEDDING_CACHE_MEMORY_SIZE,
+    **embeddings_options(vars(config)),
+)
 
-# Creating Embeddings for Each of The Text Chunks & storing
-docsearch = PC.from_texts(
-    [t.page_content for t in text_chunks], embeddings, index_name=index_name
+# Vector store selected by VECTOR_STORE_BACKEND in chat_mcq/config.py
+docsearch = get_vector_store(embeddings, vars(config))
+
+# BM25 index of the same chunks, for the lexical and hybrid retrieval modes
+lexical_index = None
+if config.BM25_INDEX_DIR:
+    lexical_index = BM25Index.load(config.BM25_INDEX_DIR)
+
+# Embed and store only the chunks of the new or changed PDFs, and delete the
+# vectors of the removed ones
+manifest, stats = ingest_directory(
+    DATA_TO_EXTRACT_DIR,
+    docsearch,
+    config.INGEST_MANIFEST_PATH,
+    max_workers=config.PDF_EXTRACT_WORKERS,
+    logger=logging.getLogger("ingest"),
+    lexical_index=lexical_index,
 )
+save_vector_store(docsearch)
+if lexical_index is not None:
+    lexical_index.save()
+save_manifest(manifest, config.INGEST_MANIFEST_PATH)
+
+logging.getLogger("ingest").info(f"Ingestion finished: {stats}")
@@ -6,5 +6,5 @@ setup(
     version="0.0.1",
     author="Himanshu Suthar",
     author_email="h9714348433@gmail.com",
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmarks", "benchmarks.*"]),
 )
@@ -0,0 +1,26 @@
+import os
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """The Flask app with its database and uploads in a scratch directory."""
+    from chat_mcq import config
+    from chat_mcq.factory import create_app
+
+    monkeypatch.setattr(
+        config, "SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'mcqs.db'}"
+    )
+    monkeypatch.setattr(config, "UPLOAD_FOLDER", str(tmp_path / "uploads"))
+    monkeypatch.setattr(config, "EMBEDDING_CACHE_PATH", None)
+
+    app = create_app()
+    yield app
+
+    with app.app_context():
+        from chat_mcq.extensions import db
+
+        db.engine.dispose()
@@ -0,0 +1,77 @@
+import pytest
+
+from benchmarks.fakes import FakeEmbeddings
+from chat_mcq.model.llama_model import llama_qa
+from chat_mcq.model.llama_model.qa_engine import QAEngine
+from chat_mcq.vectorstores.bm25_index import BM25Index
+from chat_mcq.vectorstores.local_store import LocalVectorStore
+
+CHUNKS = [
+    "Photosynthesis turns light, water and carbon dioxide into glucose.",
+    "Chlorophyll absorbs the light used by photosynthesis in the leaves.",
+    "Ohm's law relates the voltage, current and resistance of a circuit.",
+]
+
+
+class CountingEmbeddings(FakeEmbeddings):
+    """Fake embeddings counting the embedded texts."""
+
+    def __init__(self):
+        super().__init__(dim=16)
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += len(texts)
+        return super().embed_documents(texts)
+
+
+@pytest.fixture
+def engine(app, tmp_path, monkeypatch):
+    """A QA engine retrieving in hybrid mode from the chunks."""
+    embeddings = CountingEmbeddings()
+    store = LocalVectorStore.from_texts(CHUNKS, FakeEmbeddings(dim=16))
+    index = BM25Index()
+    index.add_texts(CHUNKS, ids=[str(number) for number in range(len(CHUNKS))])
+    index.save(str(tmp_path / "bm25"))
+
+    monkeypatch.setattr(llama_qa, "get_embeddings", lambda: embeddings)
+    monkeypatch.setattr(llama_qa, "get_docsearch", lambda _: store)
+    app.config.update(
+        RETRIEVAL_MODE="hybrid",
+        BM25_INDEX_DIR=str(tmp_path / "bm25"),
+        HYBRID_FAST_PATH_CONFIDENCE=0.2,
+        RETRIEVAL_BATCHING=False,
+        ANSWER_CACHE_ENABLED=True,
+        CONTEXT_TOKEN_BUDGET=None,
+    )
+    engine = QAEngine(app)
+    engine.counting = embeddings
+    return engine
+
+
+def test_fast_path_questions_skip_the_embedding(engine):
+    """A confident BM25 question is cached and answered without MiniLM."""
+    question = "What does photosynthesis turn light into?"
+
+    cached, vector = engine.cached_answer(question)
+    assert cached is None and vector is None
+    assert engine.retrieve(question)
+    engine.remember_answer(question, vector, "Glucose.", [])
+
+    cached, _ = engine.cached_answer("what does  photosynthesis turn light into?")
+    assert cached["result"] == "Glucose."
+    assert engine.counting.calls == 0
+
+
+def test_other_questions_are_embedded_once(engine):
+    """A question BM25 can't answer is embedded for the similarity lookup."""
+    question = "Tell me about nothing in particular"
+
+    cached, vector = engine.cached_answer(question)
+    assert cached is None and vector is not None
+    assert engine.counting.calls == 1
+
+    engine.remember_answer(question, vector, "Nothing.", [])
+    cached, _ = engine.cached_answer(question)
+    assert cached["result"] == "Nothing."
+    assert engine.counting.calls == 1
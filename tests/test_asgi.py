@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+import threading
+
+import httpx
+import pytest
+
+from benchmarks.run import DATA_DIR
+from chat_mcq.asgi import create_asgi_app
+from chat_mcq.extensions import db
+from chat_mcq.models import MCQ
+from chat_mcq.utils.upload_utils import upload_hash
+
+from .test_questions import quiz
+
+# Multipart boundary of the hand built request bodies
+BOUNDARY = "chat-mcq-boundary"
+
+
+def multipart(filename, content):
+    """A multipart form uploading the file with the generation fields."""
+    fields = {"num_mcqs": "3", "subject": "science", "complexity": "simple"}
+    parts = [
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'
+        f"{value}\r\n".encode()
+        for name, value in fields.items()
+    ]
+    parts.append(
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; '
+        f'filename="{filename}"\r\nContent-Type: text/plain\r\n\r\n'.encode()
+        + content
+        + f"\r\n--{BOUNDARY}--\r\n".encode()
+    )
+    return b"".join(parts)
+
+
+def post(app, body, chunked=False):
+    """POST the body to the async /generate_mcqs route."""
+
+    async def send():
+        async def chunks():
+            for start in range(0, len(body), 1024):
+                yield body[start : start + 1024]
+
+        transport = httpx.ASGITransport(app=create_asgi_app(app))
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            return await c.post(
+                "/generate_mcqs",
+                content=chunks() if chunked else body,
+                headers={"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"},
+            )
+
+    return asyncio.run(send())
+
+
+@pytest.fixture
+def small_uploads(app):
+    """The app accepting requests of at most 4 KB."""
+    app.config["MAX_CONTENT_LENGTH"] = 4096
+    return app
+
+
+def test_declared_length_over_the_limit_is_rejected(small_uploads):
+    """A Content-Length over MAX_CONTENT_LENGTH is a 413."""
+    response = post(small_uploads, multipart("notes.txt", b"x" * 8192))
+    assert response.status_code == 413
+
+
+def test_undeclared_length_is_cut_off_at_the_limit(small_uploads):
+    """A chunked body without Content-Length is a 413 once over the limit."""
+    response = post(small_uploads, multipart("notes.txt", b"x" * 8192), chunked=True)
+    assert response.status_code == 413
+
+
+def test_unsupported_type_is_rejected(small_uploads):
+    """A file of an unsupported type is a 415, whatever its length."""
+    response = post(small_uploads, multipart("notes.doc", b"x" * 8192), chunked=True)
+    assert response.status_code == 415
+
+    response = post(small_uploads, multipart("notes.doc", b"x"))
+    assert response.status_code == 415
+
+
+def test_upload_is_hashed_once_on_the_executor(app, monkeypatch):
+    """The event loop doesn't hash the upload, the executor hashes it once."""
+    from chat_mcq import asgi
+    from chat_mcq.routes import mcq_generator
+
+    threads = []
+
+    def recording_hash(file):
+        threads.append(threading.current_thread())
+        return upload_hash(file)
+
+    async def generate(*args):
+        return dict(quiz("Where do plants grow?"), status_code=200, usage={})
+
+    # Every module hashing uploads, asgi only did before this was fixed.
+    for module in (asgi, mcq_generator):
+        monkeypatch.setattr(module, "upload_hash", recording_hash, raising=False)
+    monkeypatch.setattr(asgi, "agenerate_mcqs_from_text", generate)
+    app.config["DATA_DIR"] = DATA_DIR
+
+    response = post(app, multipart("notes.txt", b"Plants grow in soil."))
+
+    assert len(threads) == 1
+    assert threads[0] is not threading.main_thread()
+    with app.app_context():
+        mcq_entry = db.session.get(MCQ, response.json()["mcq_id"])
+        assert (
+            mcq_entry.document_hash
+            == hashlib.sha256(b"Plants grow in soil.").hexdigest()
+        )
@@ -0,0 +1,81 @@
+import pytest
+
+from benchmarks.fakes import make_words
+from chat_mcq.vectorstores import bm25_index
+from chat_mcq.vectorstores.bm25_index import BM25Index
+
+
+def results(index, query):
+    """The rounded score of every match of the query, and the confidence."""
+    hits, confidence = index.search(query, k=100)
+    scores = {doc.metadata["id"]: round(score, 4) for doc, score in hits}
+    return scores, round(confidence, 4)
+
+
+def test_texts_without_ids_get_generated_ids():
+    """Adding texts without ids works like the local vector store."""
+    index = BM25Index()
+    ids = index.add_texts(["alpha beta", "gamma delta"])
+
+    assert len(set(ids)) == 2
+    assert index.search("gamma")[0][0][0].metadata["id"] == ids[1]
+    assert index.add_texts([]) == []
+
+
+def test_incremental_changes_match_a_fresh_index(tmp_path):
+    """Adds, upserts and deletes score like an index built from the live texts."""
+    texts = {f"doc{i}": make_words(30, i) for i in range(40)}
+    index = BM25Index()
+    index.add_texts(list(texts.values())[:30], ids=list(texts)[:30])
+    index.save(str(tmp_path / "saved"))
+
+    index = BM25Index.load(str(tmp_path / "saved"))
+    index.add_texts(list(texts.values())[30:], ids=list(texts)[30:])
+    index.delete(["doc3", "doc35", "missing"])
+    texts["doc7"] = make_words(12, 99)
+    index.add_texts([texts["doc7"]], ids=["doc7"])
+    del texts["doc3"], texts["doc35"]
+
+    fresh = BM25Index()
+    fresh.add_texts(list(texts.values()), ids=list(texts))
+    queries = [make_words(3, seed) for seed in (1, 7, 35, 99)]
+    expected = [results(fresh, query) for query in queries]
+
+    assert len(index) == len(texts)
+    assert [results(index, query) for query in queries] == expected
+
+    index.save()
+    reloaded = BM25Index.load(str(tmp_path / "saved"))
+    assert [results(index, query) for query in queries] == expected
+    assert [results(reloaded, query) for query in queries] == expected
+
+
+def test_changes_only_tokenize_the_changed_texts(tmp_path, monkeypatch):
+    """Adding, deleting, searching and saving don't re-tokenize the corpus."""
+    index = BM25Index()
+    index.add_texts([make_words(30, i) for i in range(20)], ids=list(range(20)))
+    index.save(str(tmp_path))
+
+    tokenized = []
+    tokenize = bm25_index.tokenize
+
+    def counting_tokenize(text):
+        tokenized.append(text)
+        return tokenize(text)
+
+    monkeypatch.setattr(bm25_index, "tokenize", counting_tokenize)
+    index = BM25Index.load(str(tmp_path))
+    index.add_texts(["new chunk"], ids=["new"])
+    index.delete([0])
+    index.search("new chunk")
+    index.save()
+
+    assert tokenized == ["new chunk", make_words(30, 0), "new chunk"]
+
+
+@pytest.mark.parametrize("query", ["", "the of and"])
+def test_query_without_terms_has_no_match(query):
+    """Queries of stopwords only don't match anything."""
+    index = BM25Index()
+    index.add_texts(["the theory of everything"], ids=["a"])
+    assert index.search(query) == ([], 0.0)
@@ -0,0 +1,80 @@
+import threading
+from concurrent.futures import Future
+
+from chat_mcq.extensions import db
+from chat_mcq.extensions import group_commit_writer
+from chat_mcq.models import MCQ
+from chat_mcq.models import Question
+from chat_mcq.persistence import build_questions
+from chat_mcq.persistence import save_mcqs
+
+from .test_questions import quiz
+
+
+def quiz_row(question):
+    """An unsaved quiz with its question rows."""
+    data = quiz(question)["data"]
+    return MCQ(mcqs="{}", review="", questions=build_questions(data))
+
+
+def test_failed_group_is_retried_row_by_row(app, monkeypatch):
+    """A bad row only fails its own future, the others get fresh ids."""
+    good, bad = Future(), Future()
+
+    with app.app_context():
+        # A request saves its quiz directly while the group is rolled back,
+        # taking the id the failed flush gave to the good row.
+        rollback = db.session.rollback
+
+        def rollback_then_save():
+            rollback()
+            monkeypatch.setattr(db.session, "rollback", rollback)
+            with db.engine.begin() as connection:
+                connection.execute(MCQ.__table__.insert().values(mcqs="{}", review=""))
+
+        monkeypatch.setattr(db.session, "rollback", rollback_then_save)
+
+        # The quizzes are inserted before the questions, the bad question
+        # fails the group once the quizzes got their ids.
+        bad_row = quiz_row("?")
+        bad_row.questions[0].text = None
+        group_commit_writer._commit(
+            [(quiz_row("Who wrote Hamlet?"), good), (bad_row, bad)]
+        )
+
+        assert bad.exception() is not None
+        saved = db.session.get(MCQ, good.result())
+        assert saved.id == 2
+        assert [question.text for question in saved.questions] == ["Who wrote Hamlet?"]
+        assert db.session.scalar(db.select(db.func.count(Question.id))) == 1
+
+
+def test_quiz_not_taken_by_the_writer_is_saved_directly(app, monkeypatch):
+    """A save timing out in the queue is committed once, by the request."""
+    # The writer thread isn't running, the quiz stays in the queue.
+    monkeypatch.setattr(group_commit_writer, "enabled", True)
+    monkeypatch.setattr(group_commit_writer, "timeout", 0.01)
+
+    with app.app_context():
+        mcq_entry = save_mcqs(quiz("Who wrote Hamlet?"), "literature")
+        assert mcq_entry.id is not None
+
+        # The writer skips the quiz once it gets to it.
+        group_commit_writer._commit([group_commit_writer._queue.get_nowait()])
+        assert db.session.scalar(db.select(db.func.count(MCQ.id))) == 1
+
+
+def test_new_app_replaces_the_writer_thread(app, monkeypatch):
+    """Binding the writer to another app stops the thread of the previous one."""
+    from chat_mcq import config
+    from chat_mcq.factory import create_app
+
+    monkeypatch.setattr(config, "MCQ_WRITE_BEHIND", True)
+    create_app()
+    create_app()
+
+    writers = [
+        thread for thread in threading.enumerate() if thread.name == "group-commit"
+    ]
+    group_commit_writer.close()
+    assert len(writers) == 1
@@ -0,0 +1,30 @@
+import threading
+
+import pytest
+from flask import current_app
+
+from chat_mcq.extensions import job_runner
+
+
+def test_new_app_shuts_the_previous_workers_down(app):
+    """Binding the runner again stops the old pool after its queued tasks."""
+    from chat_mcq.factory import create_app
+
+    started = threading.Event()
+    release = threading.Event()
+
+    def task():
+        started.set()
+        release.wait(5)
+        return current_app._get_current_object()
+
+    previous = job_runner.executor
+    future = job_runner.submit(task)
+    started.wait(5)
+    create_app()
+    release.set()
+
+    assert future.result(5) is app
+    assert job_runner.executor is not previous
+    with pytest.raises(RuntimeError):
+        previous.submit(print)
@@ -0,0 +1,32 @@
+from benchmarks.fakes import FakeEmbeddings
+from chat_mcq.vectorstores.local_store import LocalVectorStore
+
+
+def test_empty_store_reloads_and_grows(tmp_path):
+    """A store saved before any text was ingested can be reopened and filled."""
+    path = str(tmp_path / "store")
+    embeddings = FakeEmbeddings(dim=16)
+
+    # The first script.py run on an empty data directory saves an empty store.
+    LocalVectorStore.from_texts([], embeddings, path=path)
+    assert LocalVectorStore.load(path, embeddings).similarity_search("alpha") == []
+
+    store = LocalVectorStore.load(path, embeddings)
+    store.add_texts(["alpha beta", "gamma delta"], ids=["a", "b"])
+    assert store.similarity_search("alpha beta", k=1)[0].page_content == "alpha beta"
+
+    store.save()
+    reloaded = LocalVectorStore.load(path, embeddings)
+    assert len(reloaded) == 2
+    assert reloaded.similarity_search("gamma delta", k=1)[0].metadata["id"] == "b"
+
+
+def test_add_no_vectors_is_a_no_op(tmp_path):
+    """Adding an empty batch leaves the store empty and searchable."""
+    store = LocalVectorStore(FakeEmbeddings(dim=16), path=str(tmp_path))
+    assert store.add_vectors([], []) == []
+    assert len(store) == 0
+
+    store.save()
+    store.add_texts(["alpha"], ids=["a"])
+    assert [doc.metadata["id"] for doc in store.similarity_search("alpha")] == ["a"]
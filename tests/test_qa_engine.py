@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+
+from chat_mcq.model.llama_model import llama_qa
+from chat_mcq.model.llama_model.qa_engine import QAEngine
+
+
+@pytest.fixture
+def engine(app, monkeypatch):
+    """A QA engine waiting forever for a free instance, without the models."""
+    engine = QAEngine(app)
+    engine.timeout = None
+    monkeypatch.setattr(engine, "_load_shared", lambda: None)
+    monkeypatch.setattr(llama_qa, "get_llm", lambda: None)
+    return engine
+
+
+def borrow(engine):
+    """Borrow an instance and give it back."""
+    with engine.acquire() as qa:
+        return qa
+
+
+def test_failed_build_is_reported_and_reset(app, engine, monkeypatch):
+    """A build failing leaves the engine "failed" until it is bound again."""
+
+    def build_qa(llm, docsearch, retriever):
+        raise RuntimeError("No model weights.")
+
+    monkeypatch.setattr(llama_qa, "build_qa", build_qa)
+
+    with pytest.raises(RuntimeError):
+        borrow(engine)
+
+    status = engine.status()
+    assert (status["state"], status["error"]) == ("failed", "No model weights.")
+    assert status["instances_loaded"] == 0
+
+    engine.init_app(app)
+    assert (engine.status()["state"], engine.status()["error"]) == ("cold", None)
+
+
+def test_failed_build_wakes_a_waiter(engine, monkeypatch):
+    """A request waiting for the failed instance builds it instead of hanging."""
+    building = threading.Event()
+    fail = threading.Event()
+
+    def build_qa(llm, docsearch, retriever):
+        if not building.is_set():
+            building.set()
+            fail.wait(5)
+            raise RuntimeError("No model weights.")
+        return "qa"
+
+    monkeypatch.setattr(llama_qa, "build_qa", build_qa)
+
+    errors = []
+    borrowed = []
+
+    def first():
+        try:
+            borrow(engine)
+        except RuntimeError as e:
+            errors.append(e)
+
+    first_thread = threading.Thread(target=first)
+    first_thread.start()
+    building.wait(5)
+    assert engine.status()["state"] == "warming"
+
+    # The pool is full while the first instance loads, the next one waits.
+    waiter = threading.Thread(target=lambda: borrowed.append(borrow(engine)))
+    waiter.start()
+    while engine.status()["waiting"] != 1:
+        time.sleep(0.01)
+
+    fail.set()
+    first_thread.join(5)
+    waiter.join(5)
+
+    assert len(errors) == 1
+    assert borrowed == ["qa"]
+    assert engine.status()["state"] == "warm"
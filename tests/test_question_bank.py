@@ -0,0 +1,155 @@
+import io
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from benchmarks.fakes import FakeChatOpenAI
+from benchmarks.run import DATA_DIR
+from chat_mcq import question_bank
+from chat_mcq.extensions import job_runner
+from chat_mcq.model.openai_model.mcq_generator import get_quiz_chain
+from chat_mcq.persistence import save_mcqs
+from chat_mcq.question_bank import generate_mcqs_from_bank
+from chat_mcq.utils import openai_utils
+from chat_mcq.utils.openai_utils import generate_mcqs_from_text
+from chat_mcq.utils.upload_utils import hash_stream
+
+from .test_questions import quiz
+
+DOCUMENT = b"Plants turn light into sugar."
+
+USAGE = {
+    "prompt_tokens": 1,
+    "completion_tokens": 1,
+    "total_tokens": 2,
+    "total_cost": 0.5,
+}
+
+
+def upload():
+    """The uploaded document."""
+    return FileStorage(stream=io.BytesIO(DOCUMENT), filename="plants.txt")
+
+
+def fake_generation(*batches):
+    """Replace the LLM with the batches of questions, and record the calls."""
+    calls = []
+
+    def generate(text, mcq_count, subject, tone, chunked, review_mode, exclude):
+        calls.append({"text": text, "count": mcq_count, "exclude": list(exclude)})
+        return dict(quiz(*batches[len(calls) - 1]), status_code=200, usage=USAGE)
+
+    return calls, generate
+
+
+def test_top_up_excludes_and_retries_the_duplicates(app, monkeypatch):
+    """Repeated questions are excluded from the prompt and generated again."""
+    calls, generate = fake_generation(
+        ["What is photosynthesis?", "Why are leaves green?"],
+        ["What do roots absorb?"],
+    )
+    monkeypatch.setattr(question_bank, "generate_mcqs_from_text", generate)
+
+    with app.app_context():
+        document_hash = hash_stream(io.BytesIO(DOCUMENT))
+        save_mcqs(quiz("What is photosynthesis?"), "bio", "simple", document_hash)
+
+        response = generate_mcqs_from_bank(upload(), 3, "bio", "simple", None, "skip")
+
+    assert [call["count"] for call in calls] == [2, 1]
+    assert calls[0]["text"] == DOCUMENT.decode()
+    assert calls[0]["exclude"] == ["What is photosynthesis?"]
+    assert calls[1]["exclude"] == [
+        "What is photosynthesis?",
+        "Why are leaves green?",
+    ]
+    assert [mcq["mcq"] for mcq in response["data"].values()] == [
+        "What is photosynthesis?",
+        "Why are leaves green?",
+        "What do roots absorb?",
+    ]
+    assert (response["requested"], response["returned"]) == (3, 3)
+    assert response["reused"] == 1
+    assert response["usage"]["total_cost"] == 1.0
+
+
+def test_short_quiz_is_reported(app, monkeypatch):
+    """A quiz still short after every attempt says how many were returned."""
+    calls, generate = fake_generation(*[["What is photosynthesis?"]] * 3)
+    monkeypatch.setattr(question_bank, "generate_mcqs_from_text", generate)
+    app.config["MCQ_BANK_TOP_UP_ATTEMPTS"] = 3
+
+    with app.app_context():
+        document_hash = hash_stream(io.BytesIO(DOCUMENT))
+        save_mcqs(quiz("What is photosynthesis?"), "bio", "simple", document_hash)
+
+        response = generate_mcqs_from_bank(upload(), 2, "bio", "simple", None, "skip")
+
+    assert len(calls) == 3
+    assert response["status_code"] == 200
+    assert (response["requested"], response["returned"]) == (2, 1)
+    assert response["message"].startswith("Only 1 of the 2 MCQs")
+
+
+class RecordingChatOpenAI(FakeChatOpenAI):
+    """The fake OpenAI model, keeping the prompts it was sent."""
+
+    prompts: list = []
+
+    def _respond(self, messages):
+        self.prompts.append("\n".join(str(message.content) for message in messages))
+        return super()._respond(messages)
+
+
+@pytest.mark.parametrize("chunked", [False, True])
+def test_exclusions_reach_the_prompt(app, monkeypatch, chunked):
+    """The questions to exclude are rendered in the prompt sent to the LLM."""
+    model = RecordingChatOpenAI()
+    monkeypatch.setattr(get_quiz_chain(), "llm", model)
+    monkeypatch.setattr(get_quiz_chain(), "verbose", False)
+    app.config["DATA_DIR"] = DATA_DIR
+    # Two sections without the tokenizer, every section prompt gets the list.
+    monkeypatch.setattr(openai_utils, "split_sections", lambda text, _: [text] * 2)
+
+    with app.app_context():
+        response = generate_mcqs_from_text(
+            DOCUMENT.decode(),
+            2,
+            "bio",
+            "simple",
+            chunked,
+            "skip",
+            ["What is photosynthesis?"],
+        )
+
+    assert response["status_code"] == 200
+    assert len(model.prompts) == (2 if chunked else 1)
+    for prompt in model.prompts:
+        assert "Don't repeat them" in prompt
+        assert "- What is photosynthesis?" in prompt
+
+
+def test_job_route_reuses_the_question_bank(app, monkeypatch):
+    """The "reuse" field of the form's job route tops up the stored questions."""
+    calls, generate = fake_generation(["Why are leaves green?"])
+    monkeypatch.setattr(question_bank, "generate_mcqs_from_text", generate)
+    # Run the job in the request instead of the worker pool.
+    monkeypatch.setattr(job_runner, "submit", lambda fn, *args: fn(*args))
+    app.config["DATA_DIR"] = DATA_DIR
+
+    with app.app_context():
+        document_hash = hash_stream(io.BytesIO(DOCUMENT))
+        save_mcqs(quiz("What is photosynthesis?"), "bio", "simple", document_hash)
+
+    client = app.test_client()
+    form = {"num_mcqs": "2", "subject": "bio", "complexity": "simple"}
+    form.update(review="skip", reuse="true", file=(io.BytesIO(DOCUMENT), "a.txt"))
+    job = client.post("/generate_mcqs/jobs", data=form).get_json()
+    status = client.get(job["status_url"]).get_json()
+
+    assert calls[0]["exclude"] == ["What is photosynthesis?"]
+    assert status["status"] == "done"
+    assert [mcq["mcq"] for mcq in status["data"].values()] == [
+        "What is photosynthesis?",
+        "Why are leaves green?",
+    ]
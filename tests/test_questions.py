@@ -0,0 +1,54 @@
+from sqlalchemy import text
+
+from chat_mcq.extensions import db
+from chat_mcq.persistence import save_mcqs
+
+
+def quiz(*questions):
+    """A generation response holding the questions."""
+    return {
+        "data": {
+            str(number): {
+                "mcq": question,
+                "options": {"a": "Yes", "b": "No"},
+                "correct": "a",
+            }
+            for number, question in enumerate(questions, start=1)
+        },
+        "review": "",
+    }
+
+
+def search(client, query, **params):
+    """The texts of the questions found by the search."""
+    response = client.get("/questions", query_string=dict(params, q=query))
+    return [item["mcq"] for item in response.get_json()["items"]]
+
+
+def test_search_uses_the_full_text_index(app):
+    """Saved questions are indexed on insert and found by word prefix."""
+    with app.app_context():
+        assert app.extensions["question_search"]
+        save_mcqs(quiz("What is photosynthesis?", "Where do plants grow?"), "bio")
+        save_mcqs(quiz("Who wrote Hamlet?"), "literature")
+
+        indexed = db.session.execute(
+            text("SELECT count(*) FROM questions_fts")
+        ).scalar()
+        assert indexed == 3
+
+    client = app.test_client()
+    assert search(client, "photo") == ["What is photosynthesis?"]
+    assert search(client, "PLANTS grow") == ["Where do plants grow?"]
+    assert search(client, "hamlet", subject="bio") == []
+    assert search(client, 'wrote" (hamlet*') == ["Who wrote Hamlet?"]
+
+
+def test_deleted_questions_leave_the_index(app):
+    """Deleting a quiz removes its questions from the search."""
+    with app.app_context():
+        mcq_entry = save_mcqs(quiz("What is photosynthesis?"))
+        db.session.delete(mcq_entry)
+        db.session.commit()
+
+    assert search(app.test_client(), "photosynthesis") == []
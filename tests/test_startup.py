@@ -0,0 +1,21 @@
+from chat_mcq import config
+from chat_mcq.startup import profile_startup
+
+# Packages only the first request needing them may import
+LAZY_PACKAGES = (
+    "langchain",
+    "langchain_core",
+    "langchain_community",
+    "openai",
+    "pypdf",
+)
+
+
+def test_create_app_fits_the_startup_budget():
+    """create_app() in a fresh interpreter stays within STARTUP_TIME_BUDGET."""
+    result = profile_startup()
+
+    assert result["total"] <= config.STARTUP_TIME_BUDGET, result["steps"]
+
+    imported = {package for package, _ in result["packages"]}
+    assert not imported.intersection(LAZY_PACKAGES)